@@ -2,20 +2,37 @@ from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 from config import config
+from app.database import RoutingSession, configure_binds, configure_engines
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 csrf = CSRFProtect()
 
 
-def create_app(config_name='default'):
-    """Application factory"""
+def create_app(config_name='default', settings=None):
+    """Application factory; settings override the named config"""
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    if settings:
+        app.config.update(settings)
     
-    # Initialize extensions
+    # Initialize extensions (SQLite concurrency mode: see app/database.py)
+    configure_binds(app)
     db.init_app(app)
+    configure_engines(app, db)
     csrf.init_app(app)
     
+    from app.scheduler.occupancy import init_occupancy
+    init_occupancy(app)
+    
+    from app.jobs import init_jobs
+    init_jobs(app)
+    
+    from app.metrics import init_metrics
+    init_metrics(app, db)
+    
+    from app.sqltrace import init_sqltrace
+    init_sqltrace(app, db)
+    
     # Ensure upload and export directories exist
     import os
     os.makedirs(app.config.get('UPLOAD_FOLDER', 'uploads'), exist_ok=True)
@@ -43,9 +60,11 @@ def create_app(config_name='default'):
     # Register API routes
     register_api_routes(app)
     
-    # Create database tables
+    # Create database tables, then bring existing ones up to date
     with app.app_context():
         db.create_all()
+        from app.migrations import upgrade
+        upgrade()
     
     return app
 
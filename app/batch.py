@@ -0,0 +1,238 @@
+"""Batch generation - scheduling many sections without the web server
+
+`python run.py generate` schedules the selected sections in one go. Each
+section becomes a generation job (app/jobs.py) run by the pool of
+JOB_WORKERS processes, so a batch run is recorded, timed and listed like a
+run started from the UI, and every timetable is saved under its job's new
+generation_id. Once all jobs have finished the sections are validated
+together, since clashes between sections only show once all are saved,
+and the results are written back to the jobs.
+
+A run only sees the timetables saved before it starts, so two sections
+scheduled at the same time can book the same teacher or room. The
+sections are therefore split into independent partitions: sections that
+share a faculty member or a room they could be given (same kind, large
+enough) end up in the same partition. Partitions run in parallel; within
+one, sections run one after the other, each seeing the ones before it.
+Since most sections can use most rooms, a typical institution is a single
+partition and the batch runs sequentially; the workers help only where
+groups of sections really are independent.
+
+A dry run does the same against a throwaway copy of the (SQLite) database
+and writes the new timetables to a JSON file; the real database is never
+written.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from app import db
+from app.models import Section, Course, Room, Batch, Timetable, GenerationLog, FacultyCourse
+from app.jobs import FINISHED, get_jobs, cancel
+
+
+def select_sections(all_sections=False, semesters=None, sections=None):
+    """
+    Active sections to schedule: all of them, or those in the given
+    semesters plus the given sections (database ids or section codes).
+    Raises ValueError for an unknown section.
+    """
+    query = Section.query.filter_by(is_active=True).order_by(Section.semester, Section.name)
+    if all_sections:
+        return query.all()
+    
+    chosen = {s.id: s for s in query.filter(Section.semester.in_(semesters)).all()} if semesters else {}
+    for key in sections or ():
+        section = Section.query.filter_by(section_id=key).first()
+        if section is None and str(key).isdigit():
+            section = db.session.get(Section, int(key))
+        if section is None:
+            raise ValueError(f"Section {key} not found")
+        chosen[section.id] = section
+    return sorted(chosen.values(), key=lambda s: (s.semester, s.name))
+
+
+def partition_sections(sections):
+    """
+    Split sections into partitions that share no faculty and no candidate
+    room: a list of lists of sections, each in the given order, partitions
+    ordered by their first section.
+    """
+    section_ids = [s.id for s in sections]
+    rooms = db.session.execute(
+        select(Room.id, (Room.room_type == 'Lab').label('is_lab'), Room.capacity)
+        .where(Room.is_available == True)
+    ).all()
+    mappings = db.session.execute(
+        select(FacultyCourse.section_id, FacultyCourse.faculty_id, Course.is_lab,
+               func.coalesce(Batch.strength, Section.strength).label('strength'))
+        .join(Course, FacultyCourse.course_id == Course.id)
+        .join(Section, FacultyCourse.section_id == Section.id)
+        .outerjoin(Batch, FacultyCourse.batch_id == Batch.id)
+        .where(FacultyCourse.section_id.in_(section_ids))
+    ).all()
+    
+    # Union-find over sections, faculty and rooms
+    parent = {}
+    
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    
+    def union(a, b):
+        parent[find(a)] = find(b)
+    
+    for m in mappings:
+        union(('section', m.section_id), ('faculty', m.faculty_id))
+        for room in rooms:
+            # The rooms the solvers may pick for the class (see CSPSolver)
+            if bool(room.is_lab) == bool(m.is_lab) and (room.capacity or 0) >= (m.strength or 0):
+                union(('section', m.section_id), ('room', room.id))
+    
+    partitions = {}
+    for section in sections:
+        partitions.setdefault(find(('section', section.id)), []).append(section)
+    return list(partitions.values())
+
+
+def run_batch(sections, config=None, seed=None, poll=0.5, on_finish=None, partitions=None):
+    """
+    Schedule the sections as generation jobs and wait for all of them:
+    partitions (partition_sections() by default) in parallel, the sections
+    of each one at a time. With a seed, section N runs with seed + N.
+    on_finish(job) is called as each job ends. Returns one result dict per
+    section, with the institution-wide validation of the saved timetables.
+    """
+    jobs = get_jobs()
+    config = dict(config or {}, validate=False)
+    queues = [list(partition) for partition in (partitions or partition_sections(sections))]
+    submitted = {}   # section id -> generation id
+    running = {}     # generation id -> queue of the partition it belongs to
+    
+    def submit_next(queue):
+        if not queue:
+            return
+        section = queue.pop(0)
+        section_config = dict(config)
+        if seed is not None:
+            section_config['seed'] = seed + section.id
+        job = jobs.submit(section.id, section_config)
+        submitted[section.id] = job.generation_id
+        running[job.generation_id] = queue
+    
+    for queue in queues:
+        submit_next(queue)
+    try:
+        while running:
+            db.session.rollback()  # see the workers' commits
+            finished = db.session.execute(
+                select(GenerationLog).where(
+                    GenerationLog.generation_id.in_(running),
+                    GenerationLog.status.in_(FINISHED)
+                )
+            ).scalars().all()
+            for job in finished:
+                if on_finish:
+                    on_finish(job)
+                submit_next(running.pop(job.generation_id))
+            if running and not finished:
+                time.sleep(poll)
+    except KeyboardInterrupt:
+        for generation_id in running:
+            cancel(generation_id)
+        raise
+    finally:
+        jobs.shutdown(wait=not running)
+    
+    return _validate({submitted[s.id]: s for s in sections})
+
+
+def _validate(submitted):
+    """Validate the saved timetables together and record the results on the jobs"""
+    from app.scheduler.constraints import InstitutionValidator
+    
+    db.session.rollback()
+    counts = dict(db.session.execute(
+        select(Timetable.generation_id, func.count())
+        .where(Timetable.generation_id.in_(submitted))
+        .group_by(Timetable.generation_id)
+    ).all())
+    validator = InstitutionValidator() if counts else None
+    
+    results = []
+    for generation_id, section in submitted.items():
+        job = db.session.execute(
+            select(GenerationLog).where(GenerationLog.generation_id == generation_id)
+        ).scalar_one()
+        result = {
+            'section_id': section.id,
+            'section': section.display_name,
+            'semester': section.semester,
+            'generation_id': generation_id,
+            'status': job.status,
+            'entries': counts.get(generation_id, 0),
+            'hard_violations': None,
+            'soft_violations': None,
+            'fitness_score': None,
+            'seconds': job.time_taken_seconds,
+            'message': job.error_message
+        }
+        # Only a section whose new generation is active was saved
+        if result['entries'] and section.active_generation_id == generation_id:
+            validation = validator.for_section(section.id)
+            job.fitness_score = validation['score']
+            job.hard_violations = len(validation['hard'])
+            job.soft_violations = len(validation['soft'])
+            result.update(
+                fitness_score=job.fitness_score,
+                hard_violations=job.hard_violations,
+                soft_violations=job.soft_violations
+            )
+        results.append(result)
+    db.session.commit()
+    return results
+
+
+@contextmanager
+def scratch_copy(database):
+    """A throwaway copy of a SQLite database file (consistent, WAL included)"""
+    handle, path = tempfile.mkstemp(prefix='timetable-dry-run-', suffix='.db')
+    os.close(handle)
+    source, target = sqlite3.connect(database), sqlite3.connect(path)
+    try:
+        with target:
+            source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    try:
+        yield path
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def export_solutions(results, path, meta=None):
+    """Write the batch's results and new timetable entries to a JSON file"""
+    entries = {}
+    rows = Timetable.query.filter(
+        Timetable.generation_id.in_([r['generation_id'] for r in results])
+    ).order_by(Timetable.section_id, Timetable.timeslot_id).all()
+    for row in rows:
+        entries.setdefault(row.generation_id, []).append(row.to_dict())
+    
+    with open(path, 'w') as f:
+        json.dump({
+            'meta': dict(meta or {}, created_at=datetime.utcnow().isoformat()),
+            'sections': [dict(r, timetable=entries.get(r['generation_id'], [])) for r in results]
+        }, f, indent=2, default=str)
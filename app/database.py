@@ -0,0 +1,105 @@
+"""Database - SQLite concurrency mode and read/write engine routing
+
+With SQLite, a generation run writing the timetable used to make page
+loads wait for (or fail on) the database lock. In concurrency mode:
+
+- the database is switched to WAL journaling, so readers never block the
+  writer and the writer never blocks readers;
+- every connection gets a busy timeout, synchronous=NORMAL (safe with WAL)
+  and a memory-mapped I/O window;
+- reads made while handling GET/HEAD requests go through a separate pooled,
+  query-only 'reader' engine, leaving the writer's connection to writes.
+
+All of it is driven by the SQLITE_* settings in config.py and only applies
+to file-backed SQLite databases.
+"""
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+READER = 'reader'  # bind key of the read-only engine
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+class RoutingSession(Session):
+    """
+    db.session class that sends reads made during GET/HEAD requests to the
+    reader engine, when one is configured. Once the session writes (a flush
+    or an INSERT/UPDATE/DELETE statement) everything else in that
+    transaction uses the writer, so it reads its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_reader(clause):
+            return self._db.engines[READER]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_reader(self, clause):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+        if self.info.get('wrote') or READER not in self._db.engines:
+            return False
+        return has_request_context() and request.method in ('GET', 'HEAD')
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _forget_writes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
+
+
+def configure_binds(app):
+    """Add the reader bind to the app config (call before db.init_app)"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not (app.config.get('SQLITE_READ_ENGINE') and is_sqlite_file(uri)):
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds.setdefault(READER, {
+        'url': uri,
+        'pool_size': app.config.get('SQLITE_READ_POOL_SIZE', 10),
+        'max_overflow': app.config.get('SQLITE_READ_POOL_SIZE', 10)
+    })
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA statements run on every new connection"""
+    pragmas = []
+    if config.get('SQLITE_WAL') and not read_only:
+        # Persistent for the database file; set by the writer
+        pragmas.append('PRAGMA journal_mode=WAL')
+    if config.get('SQLITE_BUSY_TIMEOUT_MS') is not None:
+        pragmas.append(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    if config.get('SQLITE_SYNCHRONOUS'):
+        pragmas.append(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    if config.get('SQLITE_MMAP_SIZE') is not None:
+        pragmas.append(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    if read_only:
+        pragmas.append('PRAGMA query_only=ON')
+    return pragmas
+
+
+def configure_engines(app, db):
+    """Install the connection pragmas on the app's SQLite engines (after db.init_app)"""
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if not is_sqlite_file(str(engine.url)):
+                continue
+            pragmas = sqlite_pragmas(app.config, read_only=key == READER)
+            if pragmas:
+                event.listen(engine, 'connect', _run_pragmas(pragmas))
+
+
+def _run_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
@@ -0,0 +1,416 @@
+"""Jobs - Background timetable generation in a pool of worker processes
+
+A generation request no longer runs inside the web request. It is recorded
+as a GenerationLog row (the job; its generation_id is the job id) and handed
+to a pool of worker processes, each with its own app and database
+connections. The worker runs the HybridScheduler and writes the job's
+status, progress, latest progress event and final results back to the row,
+so any web process can report on or stream a job by reading it.
+
+Progress reaches viewers as GenerationEvent rows numbered 1, 2, ... per job.
+The scheduler coalesces GA progress to at most JOB_PROGRESS_RATE events a
+second, each persisted event carries its number as the SSE event id, and a
+client that reconnects with Last-Event-ID is replayed what it missed.
+
+A job can be cancelled while queued (it never starts) or while running: the
+worker polls the row at the solvers' checkpoints (CSP nodes, GA evaluations)
+and stops within a fraction of a second. Cancelling is always explicit; a
+job does not end when its viewers disconnect, since batch and API jobs have
+none. Runs are also bounded by GA_TIME_LIMIT_SECONDS (or the job's
+time_limit_seconds); a run that hits it saves the best timetable found so far
+and the job ends as timed_out. A job whose config has "profile": true runs
+under the profilers of app/profiling.py.
+
+    JOB_WORKERS            worker processes; 0 runs jobs inline on submit
+    JOB_PROGRESS_RATE      maximum progress events per second and job
+    JOB_POLL_INTERVAL      seconds between event reads while streaming
+    SSE_HEARTBEAT_SECONDS  idle seconds before a stream sends a heartbeat
+"""
+import json
+import logging
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+
+from flask import current_app
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Section, GenerationLog, GenerationEvent
+from app.metrics import observe_run
+from app.profiling import profiled
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('pending', 'running', 'cancelling')
+FINISHED = ('completed', 'failed', 'cancelled', 'timed_out')
+
+_worker_app = None  # the app of a worker process
+
+
+class JobQueue:
+    """Submits generation jobs to a lazily started process pool"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or getattr(self._executor, '_broken', False):
+                # spawn: workers must not inherit the parent's engines and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(_worker_settings(self.app.config),)
+                )
+            return self._executor
+    
+    def submit(self, section_id, config=None):
+        """
+        Queue a generation for a section and return its GenerationLog. A
+        section that already has a pending or running job gets that job.
+        """
+        existing = active_job(section_id)
+        if existing is not None:
+            return existing
+        
+        section = db.session.get(Section, section_id)
+        if section is None:
+            raise ValueError(f"Section {section_id} not found")
+        
+        config = dict(config or {})
+        config.pop('generation_id', None)
+        log = GenerationLog(
+            generation_id=GenerationLog.generate_id(),
+            semester=section.semester,
+            section_id=section_id,
+            population_size=config.get('population_size'),
+            status='pending',
+            progress=0,
+            config=json.dumps(config)
+        )
+        db.session.add(log)
+        db.session.commit()
+        
+        if self.workers <= 0:
+            run_job(log.generation_id)
+            db.session.refresh(log)
+            observe_run(log.run_stats)
+        else:
+            future = self._pool().submit(run_job, log.generation_id)
+            future.add_done_callback(partial(self._finished, log.generation_id))
+        return log
+    
+    def _finished(self, generation_id, future):
+        """Pool callback: record crashed workers and the run's metrics"""
+        error = None if future.cancelled() else future.exception()
+        with self.app.app_context():
+            if future.cancelled() or error is not None:
+                logger.error("Generation job %s failed: %s", generation_id, error or 'cancelled')
+                finish(generation_id, {
+                    'type': 'error', 'success': False,
+                    'message': f"Worker failed: {error}" if error else 'Job cancelled'
+                })
+            else:
+                # The worker's save bumped the occupancy version, so every
+                # process's index (this one's included) rebuilds on its next
+                # check; nothing to refresh here
+                job = get_job(generation_id)
+                if job is not None:
+                    observe_run(job.run_stats)
+            db.session.remove()
+    
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+def init_jobs(app):
+    """Attach a job queue to the app"""
+    app.extensions['jobs'] = JobQueue(app)
+
+
+def get_jobs():
+    """The current app's job queue"""
+    return current_app.extensions['jobs']
+
+
+def get_job(generation_id):
+    return db.session.execute(
+        select(GenerationLog).where(GenerationLog.generation_id == generation_id)
+    ).scalar_one_or_none()
+
+
+def active_job(section_id):
+    """The section's pending or running job, if any"""
+    return db.session.execute(
+        select(GenerationLog)
+        .where(GenerationLog.section_id == section_id, GenerationLog.status.in_(ACTIVE))
+        .order_by(GenerationLog.id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+# ----------------------------------------------------------------------
+# Worker side
+# ----------------------------------------------------------------------
+
+def _worker_settings(config):
+    """The parent app's config, minus anything that cannot cross processes"""
+    settings = {}
+    for key, value in config.items():
+        if not key.isupper():
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        settings[key] = value
+    return settings
+
+
+def _init_worker(settings):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app('default', settings)
+
+
+def run_job(generation_id):
+    """Execute a queued job (in a worker process, or inline)"""
+    app = _worker_app or current_app._get_current_object()
+    with app.app_context():
+        try:
+            _run(generation_id)
+        finally:
+            db.session.remove()
+
+
+def _run(generation_id):
+    from app.scheduler.hybrid_scheduler import HybridScheduler
+    
+    log = get_job(generation_id)
+    if log is None:
+        return
+    section_id = log.section_id
+    rate = current_app.config.get('JOB_PROGRESS_RATE', 4)
+    config = dict(
+        json.loads(log.config or '{}'),
+        generation_id=generation_id,
+        progress_interval=1.0 / rate if rate else 0
+    )
+    db.session.rollback()
+    
+    # Claim the job; a job cancelled while queued is no longer pending
+    started = time.monotonic()
+    if not _write(generation_id, GenerationLog.status == 'pending',
+                  status='running', started_at=datetime.utcnow()):
+        return
+    result = None
+    profile = nullcontext({})
+    if config.get('profile'):
+        profile = profiled(
+            generation_id, current_app.config['PROFILE_FOLDER'],
+            current_app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005)
+        )
+    with profile as profile_files:
+        try:
+            scheduler = HybridScheduler(section_id, config, cancelled=partial(cancel_requested, generation_id))
+            for event in scheduler.generate():
+                result = event
+                if event.get('type') == 'progress':
+                    _write(generation_id, event=event, progress=event.get('progress'))
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Generation job %s raised", generation_id)
+            result = {'type': 'error', 'success': False, 'message': str(e)}
+    if profile_files and result is not None:
+        result.setdefault('stats', {})['profile'] = profile_files
+    
+    finish(generation_id, result, time.monotonic() - started)
+
+
+def finish(generation_id, result, seconds=None):
+    """Record a job's final event and results"""
+    result = result or {'type': 'error', 'success': False, 'message': 'No result'}
+    stopped = result.get('stopped')
+    values = {
+        'status': stopped or ('completed' if result.get('success') else 'failed'),
+        'completed_at': datetime.utcnow()
+    }
+    if result.get('success'):
+        values.update(
+            progress=100,
+            fitness_score=result.get('fitness_score'),
+            hard_violations=result.get('hard_violations'),
+            soft_violations=result.get('soft_violations'),
+            generations_run=result.get('generations')
+        )
+    else:
+        values['error_message'] = result.get('message')
+    stats = result.get('stats')
+    if stats:
+        values['stats'] = _dump(stats)
+        if 'ga' in stats:
+            values['population_size'] = stats['ga']['population_size']
+    if seconds is not None:
+        values['time_taken_seconds'] = round(seconds, 2)
+    _write(generation_id, event=result, **values)
+
+
+def cancel_requested(generation_id):
+    """Whether the job has been asked to stop (read outside the scheduler's session)"""
+    with db.engine.connect() as connection:
+        status = connection.execute(
+            select(GenerationLog.status).where(GenerationLog.generation_id == generation_id)
+        ).scalar()
+    return status == 'cancelling'
+
+
+def _write(generation_id, *conditions, event=None, **values):
+    """
+    Update the job row, and append `event` as its next numbered event, on
+    one short transaction of its own, leaving the scheduler's session
+    alone; returns the number of job rows updated. Progress is
+    best-effort; a locked database skips the write rather than failing the
+    job.
+    """
+    if event is not None:
+        values['last_event'] = _dump(event)
+    statement = (
+        update(GenerationLog)
+        .where(GenerationLog.generation_id == generation_id, *conditions)
+        .values(**values)
+    )
+    try:
+        with db.engine.begin() as connection:
+            updated = connection.execute(statement).rowcount
+            if updated and event is not None:
+                # Numbered inside the write transaction, so the worker, the
+                # pool callback and cancel() never hand out the same number
+                seq = (
+                    select(func.coalesce(func.max(GenerationEvent.seq), 0) + 1)
+                    .where(GenerationEvent.generation_id == generation_id)
+                    .scalar_subquery()
+                )
+                connection.execute(insert(GenerationEvent).values(
+                    generation_id=generation_id, seq=seq, type=event.get('type', 'progress'),
+                    data=values['last_event'], created_at=datetime.utcnow()
+                ))
+            return updated
+    except OperationalError:
+        if 'status' in values:
+            raise
+        logger.warning("Skipped progress update for job %s", generation_id)
+        return 0
+
+
+def cancel(generation_id):
+    """
+    Stop a job: a queued one is cancelled at once, a running one is flagged
+    'cancelling' and stops at the worker's next checkpoint. Returns the new
+    status, or None when the job is not queued or running.
+    """
+    event = {'type': 'error', 'success': False, 'stopped': 'cancelled', 'message': 'Generation cancelled'}
+    if _write(generation_id, GenerationLog.status == 'pending', event=event, status='cancelled',
+              error_message=event['message'], completed_at=datetime.utcnow()):
+        return 'cancelled'
+    if _write(generation_id, GenerationLog.status == 'running', status='cancelling'):
+        return 'cancelling'
+    return None
+
+
+def _dump(event):
+    return json.dumps(event, default=str)
+
+
+# ----------------------------------------------------------------------
+# Following a job
+# ----------------------------------------------------------------------
+
+def read_events(generation_id, after=0):
+    """
+    A job's events numbered above `after`, as (seq, event) pairs, and
+    whether the job is over (its final event is among them or was already
+    read). One read; callers poll it.
+    """
+    job = db.session.execute(
+        select(GenerationLog.status, GenerationLog.last_event)
+        .where(GenerationLog.generation_id == generation_id)
+    ).first()
+    rows = db.session.execute(
+        select(GenerationEvent.seq, GenerationEvent.data)
+        .where(GenerationEvent.generation_id == generation_id, GenerationEvent.seq > after)
+        .order_by(GenerationEvent.seq)
+    ).all()
+    # Each poll must see the worker's latest commit
+    db.session.rollback()
+    if job is None:
+        return [(None, {'type': 'error', 'success': False, 'message': f"Unknown job {generation_id}"})], True
+    
+    events = [(seq, json.loads(data)) for seq, data in rows]
+    if events and events[-1][1].get('type') in ('complete', 'error'):
+        return events, True
+    if not events and job.status in FINISHED:
+        # Nothing left to replay; a job logged before events were recorded
+        # still gets an ending
+        if after:
+            return [], True
+        return [(None, json.loads(job.last_event) if job.last_event else {
+            'type': 'error', 'success': False, 'message': f"Job {job.status}"
+        })], True
+    return events, False
+
+
+def watch(generation_id, after=0, poll=None, heartbeat=None):
+    """
+    Yield (seq, event) for a job's events numbered above `after`, as the
+    worker persists them, ending after its final event (type complete or
+    error). Yields (None, None) as a heartbeat when nothing has arrived for
+    `heartbeat` seconds.
+    """
+    config = current_app.config
+    poll = poll or config.get('JOB_POLL_INTERVAL', 0.5)
+    heartbeat = heartbeat or config.get('SSE_HEARTBEAT_SECONDS', 15)
+    quiet_since = time.monotonic()
+    while True:
+        events, finished = read_events(generation_id, after)
+        for seq, event in events:
+            after = seq or after
+            yield seq, event
+        if finished:
+            return
+        if events:
+            quiet_since = time.monotonic()
+        elif time.monotonic() - quiet_since >= heartbeat:
+            quiet_since = time.monotonic()
+            yield None, None
+        time.sleep(poll)
+
+
+def event_id(value):
+    """The event number in a Last-Event-ID header (0 when absent or invalid)"""
+    try:
+        return max(0, int(value or 0))
+    except ValueError:
+        return 0
+
+
+def sse_message(seq, event):
+    """One server-sent event: a job event (with its id when numbered), or a heartbeat for None"""
+    if event is None:
+        return ": heartbeat\n\n"
+    data = f"data: {json.dumps(event)}\n\n"
+    return data if seq is None else f"id: {seq}\n{data}"
@@ -0,0 +1,216 @@
+"""Metrics - Request, SQL, job and solver metrics in the Prometheus text format
+
+GET /metrics serves, in the Prometheus text exposition format (version
+0.0.4), so any scraper can read it without an agent or external service:
+
+    timetable_http_request_duration_seconds   histogram per endpoint, method, status
+    timetable_db_statements_per_request       histogram per endpoint
+    timetable_db_seconds_per_request          histogram per endpoint
+    timetable_db_statements_total             counter, all statements
+    timetable_generation_jobs                 gauge per job status (pending = queue depth)
+    timetable_job_workers                     gauge, size of the worker pool
+    timetable_solver_phase_seconds            histogram per phase of finished runs
+    timetable_export_render_seconds           histogram per export
+
+Request and SQL metrics are kept in memory per process (each web worker
+reports its own; sum them in the scraper). Job counts are read from the
+database at scrape time, so every process reports the same numbers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event, func, select
+
+from app.models import GenerationLog
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Metric:
+    """A counter, gauge or histogram family, keyed by label values"""
+    
+    def __init__(self, name, description, kind, labels=(), buckets=None):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets or ())
+        self.values = {}  # label values -> number, or [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+    
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+    
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+    
+    def set(self, value, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = value
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            labels = list(zip(self.labels, key))
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{_labels(labels)} {_number(value)}")
+                continue
+            for bound, count in zip(self.buckets, value):
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {value[-1]}")
+        return '\n'.join(lines)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+REQUEST_SECONDS = Metric(
+    'timetable_http_request_duration_seconds', 'Request latency in seconds',
+    'histogram', ('endpoint', 'method', 'status'), LATENCY_BUCKETS
+)
+REQUEST_STATEMENTS = Metric(
+    'timetable_db_statements_per_request', 'SQL statements executed per request',
+    'histogram', ('endpoint',), STATEMENT_BUCKETS
+)
+REQUEST_SQL_SECONDS = Metric(
+    'timetable_db_seconds_per_request', 'Time spent executing SQL per request',
+    'histogram', ('endpoint',), LATENCY_BUCKETS
+)
+STATEMENTS = Metric('timetable_db_statements_total', 'SQL statements executed', 'counter')
+JOBS = Metric('timetable_generation_jobs', 'Generation jobs by status', 'gauge', ('status',))
+WORKERS = Metric('timetable_job_workers', 'Generation worker processes', 'gauge')
+SOLVER_PHASE_SECONDS = Metric(
+    'timetable_solver_phase_seconds', 'Solver phase durations of finished generation runs',
+    'histogram', ('phase',), PHASE_BUCKETS
+)
+EXPORT_SECONDS = Metric(
+    'timetable_export_render_seconds', 'Time to render an export document',
+    'histogram', ('export',), LATENCY_BUCKETS
+)
+
+REGISTRY = (
+    REQUEST_SECONDS, REQUEST_STATEMENTS, REQUEST_SQL_SECONDS, STATEMENTS,
+    JOBS, WORKERS, SOLVER_PHASE_SECONDS, EXPORT_SECONDS
+)
+
+
+def init_metrics(app, db):
+    """Time requests and count their SQL (after db.init_app), and serve /metrics"""
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+    
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=endpoint, method=request.method, status=response.status_code
+            )
+            REQUEST_STATEMENTS.observe(g.get('sql_statements', 0), endpoint=endpoint)
+            REQUEST_SQL_SECONDS.observe(g.get('sql_seconds', 0.0), endpoint=endpoint)
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        for status, count in job_counts(db).items():
+            JOBS.set(count, status=status)
+        WORKERS.set(current_app.extensions['jobs'].workers)
+        return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['metrics_started'].pop()
+    STATEMENTS.inc()
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += seconds
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('metrics_started'):
+        conn.info['metrics_started'].pop()
+
+
+def observe_run(stats):
+    """Record the phase durations of a finished generation run (its stats dict)"""
+    for phase, seconds in (stats or {}).get('phases', {}).items():
+        SOLVER_PHASE_SECONDS.observe(seconds, phase=phase)
+
+
+@contextmanager
+def export_timer(name):
+    """Time the rendering of an export document, e.g. with export_timer('section_pdf')"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        EXPORT_SECONDS.observe(time.perf_counter() - started, export=name)
+
+
+def job_counts(db):
+    """Generation jobs per status, from the database"""
+    from app.jobs import ACTIVE, FINISHED
+    
+    counts = dict.fromkeys(ACTIVE + FINISHED, 0)
+    counts.update(db.session.execute(
+        select(GenerationLog.status, func.count()).group_by(GenerationLog.status)
+    ).all())
+    return counts
+
+
+def render():
+    """All metrics in the text exposition format"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
@@ -0,0 +1,166 @@
+"""Schema migrations - Versioned, idempotent upgrades applied after db.create_all()
+
+db.create_all() only creates missing tables, so changes to existing tables
+(new indexes, new columns) are applied here. Each migration runs once, in
+version order, and is recorded in the schema_version table. Migrations must
+be idempotent: on a fresh database create_all has already built the current
+schema and they only have to notice that.
+"""
+from app import db
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, inspect, or_
+
+
+_metadata = MetaData()
+
+schema_version = Table(
+    'schema_version', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []  # (version, description, function(connection))
+
+
+def migration(version, description):
+    """Register a migration function"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def create_indexes(connection, table, names):
+    """Create the named indexes declared on a model table, unless they exist"""
+    existing = {ix['name'] for ix in inspect(connection).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(connection)
+
+
+def add_column(connection, table, column):
+    """Add a model column to an existing table if it is missing (must be nullable)"""
+    existing = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    if column.name in existing:
+        return False
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}"
+    for fk in column.foreign_keys:
+        ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+    connection.exec_driver_sql(ddl)
+    return True
+
+
+# ----------------------------------------------------------------------
+# Migrations
+# ----------------------------------------------------------------------
+
+@migration(1, 'Composite indexes for timetable and faculty_courses hot queries')
+def _timetable_indexes(connection):
+    from app.models import Timetable, FacultyCourse
+    create_indexes(connection, Timetable.__table__, {
+        'ix_timetable_section_slot_batch', 'ix_timetable_room_slot',
+        'ix_timetable_faculty_course_slot', 'ix_timetable_slot_room'
+    })
+    create_indexes(connection, FacultyCourse.__table__, {'ix_faculty_courses_section'})
+
+
+@migration(2, 'Denormalized faculty_id and course_id on timetable')
+def _timetable_faculty_course_ids(connection):
+    from app.models import Timetable, FacultyCourse
+    timetable, mappings = Timetable.__table__, FacultyCourse.__table__
+    add_column(connection, timetable, timetable.c.faculty_id)
+    add_column(connection, timetable, timetable.c.course_id)
+    
+    # Backfill from the mapping each entry points at
+    mapping = select(mappings).where(mappings.c.id == timetable.c.faculty_course_id)
+    connection.execute(
+        timetable.update()
+        .where(or_(timetable.c.faculty_id.is_(None), timetable.c.course_id.is_(None)))
+        .values(
+            faculty_id=mapping.with_only_columns(mappings.c.faculty_id).scalar_subquery(),
+            course_id=mapping.with_only_columns(mappings.c.course_id).scalar_subquery()
+        )
+    )
+    create_indexes(connection, timetable, {'ix_timetable_faculty_slot', 'ix_timetable_course'})
+
+
+@migration(3, 'Per-section active generation pointer')
+def _active_generation(connection):
+    from app.models import Timetable, Section
+    timetable, sections = Timetable.__table__, Section.__table__
+    if add_column(connection, sections, sections.c.active_generation_id):
+        # Before versioning every row was live: point each section at its
+        # newest generation and bring all of its rows under that id
+        newest = (
+            select(timetable.c.generation_id)
+            .where(timetable.c.section_id == sections.c.id)
+            .order_by(timetable.c.id.desc())
+            .limit(1)
+        )
+        connection.execute(sections.update().values(active_generation_id=newest.scalar_subquery()))
+        active = select(sections.c.active_generation_id).where(sections.c.id == timetable.c.section_id)
+        connection.execute(timetable.update().values(generation_id=active.scalar_subquery()))
+    create_indexes(connection, timetable, {'ix_timetable_section_generation'})
+
+
+@migration(4, 'Generation job config, progress and last event')
+def _generation_jobs(connection):
+    from app.models import GenerationLog
+    logs = GenerationLog.__table__
+    for column in (logs.c.config, logs.c.progress, logs.c.last_event, logs.c.started_at):
+        add_column(connection, logs, column)
+    create_indexes(connection, logs, {'ix_generation_logs_section_status'})
+
+
+@migration(5, 'Generation run statistics')
+def _generation_stats(connection):
+    from app.models import GenerationLog
+    logs = GenerationLog.__table__
+    add_column(connection, logs, logs.c.stats)
+
+
+@migration(6, 'Occupancy version counter')
+def _occupancy_version(connection):
+    from app.scheduler.occupancy import occupancy_version
+    occupancy_version.create(connection, checkfirst=True)
+    if connection.execute(select(occupancy_version.c.id)).first() is None:
+        connection.execute(occupancy_version.insert().values(id=1, version=0))
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def applied_versions(connection):
+    """Versions already recorded in schema_version"""
+    return set(connection.execute(select(schema_version.c.version)).scalars())
+
+
+def upgrade(engine=None):
+    """Apply pending migrations; returns the (version, description) pairs applied"""
+    engine = engine or db.engine
+    _metadata.create_all(engine)
+    
+    applied = []
+    for version, description, func in MIGRATIONS:
+        with engine.begin() as connection:
+            # Re-checked inside the transaction in case another process
+            # applied it meanwhile
+            if version in applied_versions(connection):
+                continue
+            func(connection)
+            connection.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append((version, description))
+    return applied
+
+
+def current_version(engine=None):
+    """Highest applied migration version (0 for none)"""
+    engine = engine or db.engine
+    _metadata.create_all(engine)
+    with engine.connect() as connection:
+        return max(applied_versions(connection), default=0)
@@ -4,7 +4,7 @@ from app.models.room import Room
 from app.models.section import Section, Batch
 from app.models.timeslot import TimeSlot
 from app.models.faculty_course import FacultyCourse
-from app.models.timetable import Timetable, GenerationLog
+from app.models.timetable import Timetable, GenerationLog, GenerationEvent
 
 __all__ = [
     'Course',
@@ -15,5 +15,6 @@ __all__ = [
     'TimeSlot',
     'FacultyCourse',
     'Timetable',
-    'GenerationLog'
+    'GenerationLog',
+    'GenerationEvent'
 ]
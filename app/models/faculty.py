@@ -1,8 +1,50 @@
 from app import db
+from app.models.timeslot import slot_mask, slot_bit, parse_slot_key, mask_to_slot_keys, normalize_slot_key
 from datetime import datetime
 import json
 
 
+# faculty id -> (preferred raw, unavailable raw, preferred mask, unavailable mask)
+_slot_mask_cache = {}
+
+
+def _load_slot_keys(raw):
+    """Slot keys from stored JSON - either a list of keys or a key -> flag dict"""
+    if not raw:
+        return []
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    if isinstance(data, dict):
+        return [key for key, flag in data.items() if flag]
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def faculty_slot_masks(faculty_id, preferred_raw, unavailable_raw):
+    """(preferred, unavailable) bitmasks for raw stored JSON, cached per faculty id"""
+    cached = _slot_mask_cache.get(faculty_id)
+    if cached and cached[0] == preferred_raw and cached[1] == unavailable_raw:
+        return cached[2], cached[3]
+    
+    preferred = slot_mask(_load_slot_keys(preferred_raw))
+    unavailable = slot_mask(_load_slot_keys(unavailable_raw))
+    if faculty_id is not None:
+        _slot_mask_cache[faculty_id] = (preferred_raw, unavailable_raw, preferred, unavailable)
+    return preferred, unavailable
+
+
+def _dump_slot_keys(slots):
+    """Store slot keys as a JSON list of canonical keys"""
+    if isinstance(slots, dict):
+        slots = [key for key, flag in slots.items() if flag]
+    keys = {normalize_slot_key(key) for key in (slots or [])}
+    keys.discard(None)
+    return json.dumps(mask_to_slot_keys(slot_mask(keys)))
+
+
 class Faculty(db.Model):
     """Faculty model with time preferences"""
     __tablename__ = 'faculty'
@@ -17,8 +59,8 @@ class Faculty(db.Model):
     max_hours_per_day = db.Column(db.Integer, default=6)
     max_hours_per_week = db.Column(db.Integer, default=18)
     
-    # Time preferences stored as JSON
-    # Format: {"MON-1": "preferred", "MON-2": "unavailable", ...}
+    # Time preferences stored as JSON lists of canonical slot keys
+    # Format: ["MON-1", "TUE-3", ...] (older {"key": flag} dicts are still read)
     preferred_slots = db.Column(db.Text, default='{}')
     unavailable_slots = db.Column(db.Text, default='{}')
     
@@ -29,37 +71,45 @@ class Faculty(db.Model):
     # Relationships
     course_mappings = db.relationship('FacultyCourse', backref='faculty', lazy='dynamic', cascade='all, delete-orphan')
     
+    def _slot_masks(self):
+        """Parsed (preferred, unavailable) bitmasks, cached per faculty row"""
+        return faculty_slot_masks(self.id, self.preferred_slots, self.unavailable_slots)
+    
+    @property
+    def preferred_mask(self):
+        """Bitmask of preferred slots (see TimeSlot.bit)"""
+        return self._slot_masks()[0]
+    
+    @property
+    def unavailable_mask(self):
+        """Bitmask of unavailable slots (see TimeSlot.bit)"""
+        return self._slot_masks()[1]
+    
     def get_preferred_slots(self):
-        """Get preferred slots as list"""
-        try:
-            return json.loads(self.preferred_slots) if self.preferred_slots else {}
-        except:
-            return {}
+        """Get preferred slots as a list of canonical slot keys"""
+        return mask_to_slot_keys(self.preferred_mask)
     
-    def set_preferred_slots(self, slots_dict):
-        """Set preferred slots from dictionary"""
-        self.preferred_slots = json.dumps(slots_dict)
+    def set_preferred_slots(self, slots):
+        """Set preferred slots from a list of slot keys (or a key -> flag dict)"""
+        self.preferred_slots = _dump_slot_keys(slots)
     
     def get_unavailable_slots(self):
-        """Get unavailable slots as list"""
-        try:
-            return json.loads(self.unavailable_slots) if self.unavailable_slots else {}
-        except:
-            return {}
+        """Get unavailable slots as a list of canonical slot keys"""
+        return mask_to_slot_keys(self.unavailable_mask)
     
-    def set_unavailable_slots(self, slots_dict):
-        """Set unavailable slots from dictionary"""
-        self.unavailable_slots = json.dumps(slots_dict)
+    def set_unavailable_slots(self, slots):
+        """Set unavailable slots from a list of slot keys (or a key -> flag dict)"""
+        self.unavailable_slots = _dump_slot_keys(slots)
     
     def is_slot_preferred(self, slot_id):
         """Check if a slot is preferred"""
-        prefs = self.get_preferred_slots()
-        return prefs.get(slot_id, False)
+        parsed = parse_slot_key(slot_id)
+        return bool(parsed and self.preferred_mask & slot_bit(*parsed))
     
     def is_slot_unavailable(self, slot_id):
         """Check if a slot is unavailable"""
-        unavail = self.get_unavailable_slots()
-        return unavail.get(slot_id, False)
+        parsed = parse_slot_key(slot_id)
+        return bool(parsed and self.unavailable_mask & slot_bit(*parsed))
     
     def to_dict(self):
         return {
@@ -79,3 +129,10 @@ class Faculty(db.Model):
     
     def __repr__(self):
         return f'<Faculty {self.faculty_id}: {self.name}>'
+
+
+@db.event.listens_for(Faculty, 'after_update')
+@db.event.listens_for(Faculty, 'after_delete')
+def _invalidate_slot_masks(mapper, connection, target):
+    """Drop cached slot masks when the faculty row changes"""
+    _slot_mask_cache.pop(target.id, None)
@@ -24,6 +24,8 @@ class FacultyCourse(db.Model):
     __table_args__ = (
         db.UniqueConstraint('faculty_id', 'course_id', 'section_id', 'session_type', 'batch_id', 'academic_year',
                           name='uq_faculty_course_section_session'),
+        # faculty_id lookups use the unique constraint's index (leading column)
+        db.Index('ix_faculty_courses_section', 'section_id'),
     )
     
     @property
@@ -65,3 +67,16 @@ class FacultyCourse(db.Model):
     
     def __repr__(self):
         return f'<FacultyCourse {self.faculty.name if self.faculty else "?"} -> {self.course.code if self.course else "?"}>'
+
+
+@db.event.listens_for(FacultyCourse, 'after_update')
+def _sync_timetable_copies(mapper, connection, target):
+    """Keep Timetable's denormalized faculty_id/course_id in step with the mapping"""
+    from app.models.timetable import Timetable
+    
+    table = Timetable.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.faculty_course_id == target.id)
+        .values(faculty_id=target.faculty_id, course_id=target.course_id)
+    )
@@ -15,6 +15,9 @@ class Section(db.Model):
     batch_year = db.Column(db.Integer, nullable=False)  # e.g., 2024
     academic_year = db.Column(db.String(10), nullable=False)  # e.g., 2024-25
     is_active = db.Column(db.Boolean, default=True)
+    # generation_id of the timetable rows readers see; flipped in the same
+    # commit that saves a new generation (see app/scheduler/generations.py)
+    active_generation_id = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -35,6 +38,11 @@ class Section(db.Model):
     def batch_g2_strength(self):
         return self.strength - self.batch_g1_strength
     
+    @property
+    def active_timetable_entries(self):
+        """Query over this section's entries in its active generation"""
+        return self.timetable_entries.filter_by(generation_id=self.active_generation_id)
+    
     def get_batches(self):
         """Get G1 and G2 batches"""
         return self.batches.all()
@@ -50,6 +58,7 @@ class Section(db.Model):
             'batch_year': self.batch_year,
             'academic_year': self.academic_year,
             'is_active': self.is_active,
+            'active_generation_id': self.active_generation_id,
             'display_name': self.display_name,
             'batch_g1_strength': self.batch_g1_strength,
             'batch_g2_strength': self.batch_g2_strength
@@ -1,5 +1,69 @@
 from app import db
 from datetime import datetime, time
+import re
+
+
+# Canonical slot keys are "<DAY>-<period>" (e.g. MON-1), the same format as
+# TimeSlot.slot_id. Older data also uses "Monday_1" and "MON_1".
+DAY_CODES = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+SLOT_BITS_PER_DAY = 16
+
+_SLOT_KEY_RE = re.compile(r'^\s*([A-Za-z]+)\s*[-_ ]\s*(\d+)\s*$')
+
+
+def slot_key(day, period):
+    """Canonical key for a day name/code and period"""
+    return f"{str(day)[:3].upper()}-{int(period)}"
+
+
+def parse_slot_key(key):
+    """Parse any supported slot key into (day_index, period), or None"""
+    match = _SLOT_KEY_RE.match(str(key))
+    if not match:
+        return None
+    day_code = match.group(1)[:3].upper()
+    if day_code not in DAY_CODES:
+        return None
+    period = int(match.group(2))
+    if not 1 <= period <= SLOT_BITS_PER_DAY:
+        return None
+    return DAY_CODES.index(day_code), period
+
+
+def normalize_slot_key(key):
+    """Canonical form of a slot key, or None if it cannot be parsed"""
+    parsed = parse_slot_key(key)
+    if parsed is None:
+        return None
+    return f"{DAY_CODES[parsed[0]]}-{parsed[1]}"
+
+
+def slot_bit(day_index, period):
+    """Bit for a slot in a slot bitmask"""
+    return 1 << (day_index * SLOT_BITS_PER_DAY + period - 1)
+
+
+def slot_mask(keys):
+    """Bitmask for an iterable of slot keys (unparseable keys are ignored)"""
+    mask = 0
+    for key in keys:
+        parsed = parse_slot_key(key)
+        if parsed is not None:
+            mask |= slot_bit(*parsed)
+    return mask
+
+
+def mask_to_slot_keys(mask):
+    """Canonical slot keys set in a bitmask, in day/period order"""
+    keys = []
+    bit_index = 0
+    while mask:
+        if mask & 1:
+            day_index, period_index = divmod(bit_index, SLOT_BITS_PER_DAY)
+            keys.append(f"{DAY_CODES[day_index]}-{period_index + 1}")
+        mask >>= 1
+        bit_index += 1
+    return keys
 
 
 class TimeSlot(db.Model):
@@ -28,6 +92,16 @@ class TimeSlot(db.Model):
     def display_name(self):
         return f"{self.day} P{self.period} ({self.display_time})"
     
+    @property
+    def key(self):
+        """Canonical slot key (e.g. MON-1)"""
+        return slot_key(self.day, self.period)
+    
+    @property
+    def bit(self):
+        """Bit for this slot in faculty preference/unavailability masks"""
+        return slot_bit(self.day_index, self.period)
+    
     @property
     def is_morning(self):
         """Periods 1-4 are morning (before lunch)"""
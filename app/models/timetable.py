@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+import json
 import uuid
 
 
@@ -14,17 +15,49 @@ class Timetable(db.Model):
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
     section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
     batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), nullable=True)  # For labs only
+    # Copies of faculty_course.faculty_id/course_id so faculty and course
+    # timetables are single index scans; kept in sync on write and by
+    # FacultyCourse updates
+    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=True)
     is_lab_slot = db.Column(db.Boolean, default=False)
     is_second_slot = db.Column(db.Boolean, default=False)  # Second period of a 2-period lab
     linked_slot_id = db.Column(db.Integer, nullable=True)  # ID of first/second slot for labs
     is_locked = db.Column(db.Boolean, default=False)  # Manually locked slots
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relationships
+    faculty = db.relationship('Faculty')
+    course = db.relationship('Course')
+    
+    # Composite indexes for the hot lookups (section views and checks, room
+    # and faculty conflict checks); existing databases get them from
+    # app/migrations.py
+    __table_args__ = (
+        db.Index('ix_timetable_section_slot_batch', 'section_id', 'timeslot_id', 'batch_id'),
+        db.Index('ix_timetable_room_slot', 'room_id', 'timeslot_id'),
+        db.Index('ix_timetable_faculty_course_slot', 'faculty_course_id', 'timeslot_id'),
+        db.Index('ix_timetable_slot_room', 'timeslot_id', 'room_id'),
+        db.Index('ix_timetable_faculty_slot', 'faculty_id', 'timeslot_id'),
+        db.Index('ix_timetable_course', 'course_id'),
+        db.Index('ix_timetable_section_generation', 'section_id', 'generation_id'),
+    )
+    
+    @classmethod
+    def active(cls):
+        """Query over the entries of each section's active generation"""
+        from app.models.section import Section
+        return cls.query.join(Section, cls.section_id == Section.id).filter(
+            cls.generation_id == Section.active_generation_id
+        )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'generation_id': self.generation_id,
             'faculty_course_id': self.faculty_course_id,
+            'faculty_id': self.faculty_id,
+            'course_id': self.course_id,
             'faculty_name': self.faculty_course.faculty.name if self.faculty_course else None,
             'course_code': self.faculty_course.course.code if self.faculty_course else None,
             'course_name': self.faculty_course.course.name if self.faculty_course else None,
@@ -66,15 +99,35 @@ class GenerationLog(db.Model):
     hard_violations = db.Column(db.Integer, default=0)
     soft_violations = db.Column(db.Integer, default=0)
     time_taken_seconds = db.Column(db.Float, nullable=True)
-    status = db.Column(db.String(20), default='pending')  # pending, running, success, failed
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
     error_message = db.Column(db.Text, nullable=True)
+    # Generation jobs (see app/jobs.py): the requested config, percent done
+    # and the latest progress event, all as written by the worker
+    config = db.Column(db.Text, nullable=True)  # JSON
+    progress = db.Column(db.Integer, nullable=True)
+    last_event = db.Column(db.Text, nullable=True)  # JSON
+    # Phase timings and solver counters of the run (app/scheduler/stats.py)
+    stats = db.Column(db.Text, nullable=True)  # JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
     
+    # Relationships
+    section = db.relationship('Section')
+    
+    __table_args__ = (
+        db.Index('ix_generation_logs_section_status', 'section_id', 'status'),
+    )
+    
     @staticmethod
     def generate_id():
         return f"GEN-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6].upper()}"
     
+    @property
+    def run_stats(self):
+        """The run statistics as a dict (empty for runs logged before they were recorded)"""
+        return json.loads(self.stats) if self.stats else {}
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,9 +144,32 @@ class GenerationLog(db.Model):
             'time_taken_seconds': self.time_taken_seconds,
             'status': self.status,
             'error_message': self.error_message,
+            'progress': self.progress,
+            'event': json.loads(self.last_event) if self.last_event else None,
+            'stats': self.run_stats,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
     
     def __repr__(self):
         return f'<GenerationLog {self.generation_id}: {self.status}>'
+
+
+class GenerationEvent(db.Model):
+    """Progress events of a generation job, numbered per job for SSE replay"""
+    __tablename__ = 'generation_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    generation_id = db.Column(db.String(50), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # 1, 2, ... within the job; the SSE event id
+    type = db.Column(db.String(20), nullable=False)  # progress, complete, error
+    data = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('generation_id', 'seq', name='uq_generation_events_seq'),
+    )
+    
+    def __repr__(self):
+        return f'<GenerationEvent {self.generation_id}#{self.seq}: {self.type}>'
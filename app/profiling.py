@@ -0,0 +1,116 @@
+"""Profiling - On-demand profiles of generation runs
+
+A job submitted with "profile": true in its config runs under cProfile and,
+at the same time, a sampling profiler that records the running thread's
+stack every PROFILE_SAMPLE_INTERVAL seconds. Three files are written to
+PROFILE_FOLDER under the job's generation id:
+
+    <generation_id>.pstats   cProfile data (pstats.Stats, snakeviz, ...)
+    <generation_id>.txt      the top functions by cumulative time
+    <generation_id>.folded   collapsed stacks, one "a;b;c count" line per
+                             stack, for flamegraph.pl or speedscope
+
+They are downloaded from /timetable/api/jobs/<generation_id>/profile/<kind>
+and linked from the generation history.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+PROFILE_FILES = {
+    'pstats': '.pstats',
+    'text': '.txt',
+    'flamegraph': '.folded'
+}
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval, in a daemon thread"""
+    
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()  # root-first tuple of frame names -> samples
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+    
+    def folded(self):
+        """Collapsed stacks, heaviest first"""
+        return ''.join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def frame_name(code):
+    """'function (path:line)', with paths inside the project made relative"""
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ',')
+
+
+def profile_path(folder, generation_id, kind):
+    """Where a job's profile file of the given kind is kept"""
+    return os.path.join(folder, f"{generation_id}{PROFILE_FILES[kind]}")
+
+
+@contextmanager
+def profiled(generation_id, folder, interval=0.005, top=60):
+    """
+    Profile the block and write its files; yields a dict that is filled in
+    with {kind: file name} once the block is over.
+    """
+    files = {}
+    sampler = StackSampler(interval=interval).start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield files
+    finally:
+        profiler.disable()
+        sampler.stop()
+        
+        os.makedirs(folder, exist_ok=True)
+        profiler.dump_stats(profile_path(folder, generation_id, 'pstats'))
+        
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats('cumulative').print_stats(top)
+        with open(profile_path(folder, generation_id, 'text'), 'w') as f:
+            f.write(text.getvalue())
+        
+        with open(profile_path(folder, generation_id, 'flamegraph'), 'w') as f:
+            f.write(sampler.folded())
+        
+        files.update({
+            kind: os.path.basename(profile_path(folder, generation_id, kind))
+            for kind in PROFILE_FILES
+        })
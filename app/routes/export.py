@@ -1,7 +1,9 @@
 """Export routes blueprint - PDF and Excel export"""
 from flask import Blueprint, render_template, request, send_file, jsonify
 from app.models import Section, Timetable, TimeSlot, Faculty, Room, Course
+from app.models.timeslot import slot_bit
 from app import db
+from app.metrics import export_timer
 from io import BytesIO
 import json
 
@@ -30,7 +32,7 @@ def export_section_pdf(section_id):
     from reportlab.lib.enums import TA_CENTER
     
     section = Section.query.get_or_404(section_id)
-    entries = Timetable.query.filter_by(section_id=section_id).all()
+    entries = Timetable.active().filter(Timetable.section_id == section_id).all()
     # Order by day_index (0-4) then period (1-8)
     timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
     
@@ -126,7 +128,8 @@ def export_section_pdf(section_id):
     elements.append(table)
     
     # Build PDF
-    doc.build(elements)
+    with export_timer('section_pdf'):
+        doc.build(elements)
     buffer.seek(0)
     
     return send_file(
@@ -146,7 +149,7 @@ def export_section_excel(section_id):
     from openpyxl.utils.dataframe import dataframe_to_rows
     
     section = Section.query.get_or_404(section_id)
-    entries = Timetable.query.filter_by(section_id=section_id).all()
+    entries = Timetable.active().filter(Timetable.section_id == section_id).all()
     # Order by day_index (0-4) then period (1-8)
     timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
     
@@ -234,7 +237,8 @@ def export_section_excel(section_id):
     
     # Save to buffer
     buffer = BytesIO()
-    wb.save(buffer)
+    with export_timer('section_excel'):
+        wb.save(buffer)
     buffer.seek(0)
     
     return send_file(
@@ -256,7 +260,12 @@ def export_faculty_pdf(faculty_id):
     from reportlab.lib.enums import TA_CENTER
     
     faculty = Faculty.query.get_or_404(faculty_id)
-    entries = Timetable.query.filter_by(faculty_id=faculty_id).all()
+    entries = Timetable.active().filter(Timetable.faculty_id == faculty_id).options(
+        db.joinedload(Timetable.timeslot),
+        db.joinedload(Timetable.course),
+        db.joinedload(Timetable.section),
+        db.joinedload(Timetable.room)
+    ).all()
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
@@ -290,18 +299,25 @@ def export_faculty_pdf(faculty_id):
     header = ['Day/Period'] + [f'P{p}' for p in periods]
     table_data = [header]
     
-    for day in days:
+    # Mark slots the faculty is unavailable for
+    unavailable = faculty.unavailable_mask
+    unavailable_cells = []
+    
+    for row_idx, day in enumerate(days, 1):
         row = [day]
-        for period in periods:
+        for col_idx, period in enumerate(periods, 1):
             entries_at_slot = entry_map.get((day, period), [])
             if entries_at_slot:
                 cell_text = []
                 for e in entries_at_slot:
-                    course_code = e.faculty_course.course.code if e.faculty_course and e.faculty_course.course else ''
+                    course_code = e.course.code if e.course else ''
                     section_label = f"Sem{e.section.semester}-{e.section.name}" if e.section else ''
                     room_code = e.room.room_id if e.room else ''
                     cell_text.append(f"{course_code}\n{section_label}\n{room_code}")
                 row.append('\n'.join(cell_text))
+            elif unavailable & slot_bit(row_idx - 1, period):
+                row.append('N/A')
+                unavailable_cells.append((col_idx, row_idx))
             else:
                 row.append('')
         table_data.append(row)
@@ -320,16 +336,23 @@ def export_faculty_pdf(faculty_id):
         ('BACKGROUND', (0, 1), (0, -1), colors.HexColor('#f1f5f9')),
     ]))
     
+    for cell in unavailable_cells:
+        table.setStyle(TableStyle([
+            ('BACKGROUND', cell, cell, colors.HexColor('#e2e8f0')),
+            ('TEXTCOLOR', cell, cell, colors.HexColor('#94a3b8'))
+        ]))
+    
     elements.append(table)
     
-    doc.build(elements)
+    with export_timer('faculty_pdf'):
+        doc.build(elements)
     buffer.seek(0)
     
     return send_file(
         buffer,
         mimetype='application/pdf',
         as_attachment=True,
-        download_name=f'timetable_faculty_{faculty.code}.pdf'
+        download_name=f'timetable_faculty_{faculty.faculty_id}.pdf'
     )
 
 
@@ -343,7 +366,7 @@ def export_room_pdf(room_id):
     from reportlab.lib.enums import TA_CENTER
     
     room = Room.query.get_or_404(room_id)
-    entries = Timetable.query.filter_by(room_id=room_id).all()
+    entries = Timetable.active().filter(Timetable.room_id == room_id).all()
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
@@ -407,7 +430,8 @@ def export_room_pdf(room_id):
     
     elements.append(table)
     
-    doc.build(elements)
+    with export_timer('room_pdf'):
+        doc.build(elements)
     buffer.seek(0)
     
     return send_file(
@@ -438,7 +462,7 @@ def export_master_excel():
     wb.remove(wb.active)  # Remove default sheet
     
     for section in sections:
-        entries = Timetable.query.filter_by(section_id=section.id).all()
+        entries = Timetable.active().filter(Timetable.section_id == section.id).all()
         if not entries:
             continue
         
@@ -479,7 +503,8 @@ def export_master_excel():
         ws['A1'] = "No timetables generated yet"
     
     buffer = BytesIO()
-    wb.save(buffer)
+    with export_timer('master_excel'):
+        wb.save(buffer)
     buffer.seek(0)
     
     return send_file(
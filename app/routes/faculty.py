@@ -2,11 +2,38 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.models import Faculty, FacultyCourse, Course, Section
 from app import db
-import json
 
 faculty_bp = Blueprint('faculty', __name__, url_prefix='/faculty')
 
 
+def _form_slot_preferences(form):
+    """
+    Collect (preferred, unavailable) slot keys from a submitted form.
+    Accepts checkbox lists (preferred/unavailable, preferred_slots/unavailable_slots)
+    and per-slot selects named slot_<key> with value preferred/unavailable/neutral.
+    """
+    preferred = form.getlist('preferred_slots') + form.getlist('preferred')
+    unavailable = form.getlist('unavailable_slots') + form.getlist('unavailable')
+    
+    for field, value in form.items():
+        if not field.startswith('slot_'):
+            continue
+        if value == 'preferred':
+            preferred.append(field[len('slot_'):])
+        elif value == 'unavailable':
+            unavailable.append(field[len('slot_'):])
+    
+    return preferred, unavailable
+
+
+def _has_slot_preferences(form):
+    """Whether the form carries slot preference fields at all"""
+    return any(
+        field in ('preferred_slots', 'unavailable_slots', 'preferred', 'unavailable') or field.startswith('slot_')
+        for field in form.keys()
+    )
+
+
 @faculty_bp.route('/')
 def list_faculty():
     """List all faculty members"""
@@ -29,8 +56,7 @@ def add_faculty():
             max_hours_per_day = int(request.form.get('max_hours_per_day', 6))
             
             # Parse preferred slots
-            preferred_slots = request.form.getlist('preferred_slots')
-            unavailable_slots = request.form.getlist('unavailable_slots')
+            preferred_slots, unavailable_slots = _form_slot_preferences(request.form)
             
             # Check if code already exists
             if Faculty.query.filter_by(code=code).first():
@@ -45,10 +71,10 @@ def add_faculty():
                 department=department,
                 designation=designation,
                 max_hours_per_week=max_hours_per_week,
-                max_hours_per_day=max_hours_per_day,
-                preferred_slots=json.dumps(preferred_slots) if preferred_slots else None,
-                unavailable_slots=json.dumps(unavailable_slots) if unavailable_slots else None
+                max_hours_per_day=max_hours_per_day
             )
+            faculty.set_preferred_slots(preferred_slots)
+            faculty.set_unavailable_slots(unavailable_slots)
             
             db.session.add(faculty)
             db.session.commit()
@@ -82,11 +108,11 @@ def edit_faculty(id):
             faculty.max_hours_per_day = int(request.form.get('max_hours_per_day', 6))
             faculty.is_active = request.form.get('is_active') == 'on'
             
-            # Parse preferred slots
-            preferred_slots = request.form.getlist('preferred_slots')
-            unavailable_slots = request.form.getlist('unavailable_slots')
-            faculty.preferred_slots = json.dumps(preferred_slots) if preferred_slots else None
-            faculty.unavailable_slots = json.dumps(unavailable_slots) if unavailable_slots else None
+            # Parse preferred slots (the edit form may not include them)
+            if _has_slot_preferences(request.form):
+                preferred_slots, unavailable_slots = _form_slot_preferences(request.form)
+                faculty.set_preferred_slots(preferred_slots)
+                faculty.set_unavailable_slots(unavailable_slots)
             
             db.session.commit()
             
@@ -144,7 +170,7 @@ def faculty_preferences(id):
     faculty = Faculty.query.get_or_404(id)
     
     from app.models import TimeSlot
-    timeslots = TimeSlot.query.order_by(TimeSlot.day_code, TimeSlot.period).all()
+    timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
     
     # Group timeslots by day
     slots_by_day = {}
@@ -155,11 +181,10 @@ def faculty_preferences(id):
     
     if request.method == 'POST':
         try:
-            preferred = request.form.getlist('preferred_slots')
-            unavailable = request.form.getlist('unavailable_slots')
+            preferred, unavailable = _form_slot_preferences(request.form)
             
-            faculty.preferred_slots = json.dumps(preferred) if preferred else None
-            faculty.unavailable_slots = json.dumps(unavailable) if unavailable else None
+            faculty.set_preferred_slots(preferred)
+            faculty.set_unavailable_slots(unavailable)
             
             db.session.commit()
             flash('Preferences updated successfully!', 'success')
@@ -169,15 +194,18 @@ def faculty_preferences(id):
             db.session.rollback()
             flash(f'Error updating preferences: {str(e)}', 'danger')
     
-    # Get current preferences
-    preferred = json.loads(faculty.preferred_slots) if faculty.preferred_slots else []
-    unavailable = json.loads(faculty.unavailable_slots) if faculty.unavailable_slots else []
+    # Get current preferences (canonical slot key -> state)
+    preferred = faculty.get_preferred_slots()
+    unavailable = faculty.get_unavailable_slots()
+    preferences = {key: 'preferred' for key in preferred}
+    preferences.update({key: 'unavailable' for key in unavailable})
     
     return render_template('faculty/preferences.html', 
                          faculty=faculty, 
                          slots_by_day=slots_by_day,
                          preferred=preferred,
-                         unavailable=unavailable)
+                         unavailable=unavailable,
+                         preferences=preferences)
 
 
 @faculty_bp.route('/api/list')
@@ -207,6 +235,6 @@ def api_get_faculty(id):
         'designation': faculty.designation,
         'max_hours_per_week': faculty.max_hours_per_week,
         'max_hours_per_day': faculty.max_hours_per_day,
-        'preferred_slots': json.loads(faculty.preferred_slots) if faculty.preferred_slots else [],
-        'unavailable_slots': json.loads(faculty.unavailable_slots) if faculty.unavailable_slots else []
+        'preferred_slots': faculty.get_preferred_slots(),
+        'unavailable_slots': faculty.get_unavailable_slots()
     })
@@ -4,6 +4,7 @@ from app.models import Course, Faculty, Room, Section, FacultyCourse, Timetable,
 from app import db
 import json
 import os
+import time
 
 main_bp = Blueprint('main', __name__)
 
@@ -19,9 +20,15 @@ def dashboard():
         'section_count': Section.query.count(),
         'course_count': Course.query.count(),
         'mapping_count': FacultyCourse.query.count(),
-        'timetable_count': db.session.query(db.func.count(db.distinct(Timetable.section_id))).scalar() or 0
+        'timetable_count': Timetable.active().with_entities(db.func.count(db.distinct(Timetable.section_id))).scalar() or 0
     }
     
+    # Institution-wide timetable health (one pass over all entries),
+    # recomputed only when the timetable has changed
+    from app.scheduler.constraints import InstitutionValidator
+    from app.scheduler.occupancy import get_occupancy
+    health = get_occupancy().derived('health', lambda: InstitutionValidator().summary())
+    
     # Get recent generation logs
     recent_logs = GenerationLog.query.order_by(GenerationLog.created_at.desc()).limit(5).all()
     
@@ -42,6 +49,7 @@ def dashboard():
     
     return render_template('dashboard.html',
                          stats=stats,
+                         health=health,
                          recent_logs=recent_logs,
                          courses=courses,
                          semester_theory=semester_theory,
@@ -57,7 +65,7 @@ def get_stats():
         'section_count': Section.query.count(),
         'course_count': Course.query.count(),
         'mapping_count': FacultyCourse.query.count(),
-        'timetable_count': db.session.query(db.func.count(db.distinct(Timetable.section_id))).scalar() or 0
+        'timetable_count': Timetable.active().with_entities(db.func.count(db.distinct(Timetable.section_id))).scalar() or 0
     }
     return jsonify(stats)
 
@@ -165,10 +173,33 @@ def init_database():
 
 @main_bp.route('/health')
 def health_check():
-    """Health check endpoint"""
+    """Health check: a timed database ping and the generation worker pool's load"""
+    from app.jobs import get_jobs
+    from app.metrics import job_counts
+    
+    started = time.perf_counter()
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        ping_ms = round((time.perf_counter() - started) * 1000, 2)
+        counts = job_counts(db)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'status': 'unhealthy',
+            'database': {'status': 'error', 'error': str(e)}
+        }), 503
+    
+    workers = get_jobs().workers
+    busy = counts['running'] + counts['cancelling']
     return jsonify({
         'status': 'healthy',
-        'database': 'connected'
+        'database': {'status': 'connected', 'ping_ms': ping_ms},
+        'workers': {
+            'size': workers,
+            'busy': busy,
+            'queued': counts['pending'],
+            'saturation': round(min(busy / workers, 1.0), 2) if workers > 0 else None
+        }
     })
 
 
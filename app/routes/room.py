@@ -120,7 +120,7 @@ def view_room(id):
     room = Room.query.get_or_404(id)
     
     # Get timetable entries for this room
-    entries = Timetable.query.filter_by(room_id=id).all()
+    entries = Timetable.active().filter(Timetable.room_id == id).all()
     
     return render_template('room/view.html', room=room, entries=entries)
 
@@ -174,22 +174,22 @@ def api_available_rooms():
     section_id = request.args.get('section_id', type=int)
     is_lab = request.args.get('is_lab', 'false').lower() == 'true'
     
-    from app.models import TimeSlot
+    from app.scheduler.occupancy import get_occupancy
     
-    # Get timeslot
-    timeslot = TimeSlot.query.filter_by(day=day, period=period).first()
+    # Timeslot and bookings come from the live occupancy index
+    occupancy = get_occupancy()
+    timeslot = occupancy.slot_at(day, period)
     if not timeslot:
         return jsonify([])
     
     # Get all rooms of required type
-    query = Room.query.filter_by(is_active=True, is_lab=is_lab)
+    query = Room.query.filter_by(is_available=True).filter(
+        (Room.room_type == 'Lab') if is_lab else (Room.room_type != 'Lab')
+    )
     all_rooms = query.all()
     
     # Get rooms already booked at this timeslot
-    booked_rooms = db.session.query(Timetable.room_id).filter(
-        Timetable.timeslot_id == timeslot.id
-    ).all()
-    booked_ids = [r[0] for r in booked_rooms]
+    booked_ids = occupancy.booked_rooms(timeslot.id)
     
     # Filter available rooms
     available = [r for r in all_rooms if r.id not in booked_ids]
@@ -197,6 +197,6 @@ def api_available_rooms():
     return jsonify([{
         'id': r.id,
         'name': r.name,
-        'code': r.code,
+        'code': r.room_id,
         'capacity': r.capacity
     } for r in available])
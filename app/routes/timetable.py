@@ -1,12 +1,17 @@
 """Timetable routes blueprint - Generation and viewing"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file
 from app.models import (
     Section, Course, Faculty, Room, FacultyCourse, 
     Timetable, TimeSlot, GenerationLog, Batch
 )
 from app import db
+from app.scheduler.occupancy import get_occupancy, entry_clashes
+from app.scheduler.generations import activate, active_generation, generations, rollback
+from app.jobs import get_jobs, get_job, watch, cancel, event_id, sse_message
+from app.profiling import PROFILE_FILES, profile_path
 from datetime import datetime
 import json
+import os
 
 timetable_bp = Blueprint('timetable', __name__, url_prefix='/timetable')
 
@@ -17,25 +22,45 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 
 @timetable_bp.route('/generate-stream')
 def generate_stream():
-    """Stream generation progress via SSE"""
-    section_id = request.args.get('section_id', type=int)
-    config_str = request.args.get('config', '{}')
-    try:
-        config = json.loads(config_str)
-    except:
-        config = {}
-    
-    if not section_id:
-        return jsonify({'error': 'Section ID required'}), 400
+    """Stream a generation job's progress via SSE"""
+    job_id = request.args.get('job_id')
+    if job_id:
+        if get_job(job_id) is None:
+            return jsonify({'error': f'Unknown job {job_id}'}), 404
+    else:
+        section_id = request.args.get('section_id', type=int)
+        config_str = request.args.get('config', '{}')
+        try:
+            config = json.loads(config_str)
+        except:
+            config = {}
+        
+        if not section_id:
+            return jsonify({'error': 'Job ID or section ID required'}), 400
+        
+        # Attach to the section's queued or running job, or queue one
+        try:
+            job_id = get_jobs().submit(section_id, config).generation_id
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 404
 
+    return _event_stream(job_id)
+
+
+def _event_stream(job_id):
+    """SSE response following a job (app/streaming.py serves the same without a worker thread)"""
+    # A reconnecting EventSource sends the id of the last event it got
+    after = event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    
     def generate():
-        from app.scheduler.hybrid_scheduler import HybridScheduler
-        scheduler = HybridScheduler(section_id, config)
-        
-        for progress in scheduler.generate():
-            yield f"data: {json.dumps(progress)}\n\n"
+        yield f"retry: {current_app.config.get('SSE_RETRY_MS', 3000)}\n\n"
+        for seq, progress in watch(job_id, after):
+            yield sse_message(seq, progress)
             
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    return Response(
+        stream_with_context(generate()), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @timetable_bp.route('/generate', methods=['GET', 'POST'])
@@ -45,62 +70,28 @@ def generate():
         try:
             # Handle JSON or Form data
             if request.is_json:
-                data = request.json
-                section_id = int(data.get('section_id'))
-                algorithm = data.get('algorithm', 'hybrid')
-                config = data
+                config = dict(request.json or {})
+                section_id = int(config.pop('section_id', None))
             else:
                 section_id = int(request.form.get('section_id'))
-                algorithm = request.form.get('algorithm', 'hybrid')
                 config = {}
-            
-            # Start generation log
-            log = GenerationLog(
-                section_id=section_id,
-                algorithm=algorithm,
-                status='running'
-            )
-            db.session.add(log)
-            db.session.commit()
-            
-            # Import and run scheduler
-            from app.scheduler.hybrid_scheduler import HybridScheduler
-            
-            scheduler = HybridScheduler(section_id, config)
-            
-            # Consume generator to get final result
-            final_result = None
-            for progress in scheduler.generate():
-                final_result = progress
-            
-            if final_result and final_result.get('success'):
-                log.status = 'completed'
-                log.fitness_score = final_result.get('fitness_score', 0)
-                log.generations_run = final_result.get('generations', 0)
-                log.hard_constraint_violations = final_result.get('hard_violations', 0)
-                log.soft_constraint_violations = final_result.get('soft_violations', 0)
-                log.completed_at = datetime.utcnow()
-                
-                db.session.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Timetable generated successfully!',
-                    'log_id': log.id,
-                    'fitness': final_result.get('fitness_score', 0),
-                    'redirect': url_for('timetable.view', section_id=section_id),
-                    'section_id': section_id
-                })
-            else:
-                log.status = 'failed'
-                log.error_message = final_result.get('message', 'Unknown error') if final_result else 'Unknown error'
-                db.session.commit()
-                
-                return jsonify({
-                    'success': False,
-                    'message': final_result.get('message', 'Failed to generate timetable') if final_result else 'Failed to generate timetable'
-                }), 400
-                
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Section ID required'}), 400
+        
+        try:
+            # Runs in a worker process; poll status_url or follow stream_url
+            job = get_jobs().submit(section_id, config)
+            return jsonify({
+                'success': True,
+                'message': 'Timetable generation queued',
+                'job_id': job.generation_id,
+                'status': job.status,
+                'section_id': section_id,
+                'status_url': url_for('timetable.job_status', job_id=job.generation_id),
+                'stream_url': url_for('timetable.job_events', job_id=job.generation_id)
+            }), 202
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 404
         except Exception as e:
             db.session.rollback()
             return jsonify({
@@ -129,7 +120,7 @@ def view(section_id):
             slots_by_day[slot.day].append(slot)
     
     # Get timetable entries for this section
-    entries = Timetable.query.filter_by(section_id=section_id).all()
+    entries = Timetable.active().filter(Timetable.section_id == section_id).all()
     
     # Get batches for lab view
     batches = Batch.query.filter_by(section_id=section_id).all()
@@ -149,7 +140,8 @@ def view_all():
     """View all generated timetables"""
     # Get sections with timetables
     sections_with_tt = db.session.query(Section).join(
-        Timetable, Section.id == Timetable.section_id
+        Timetable, (Section.id == Timetable.section_id)
+        & (Timetable.generation_id == Section.active_generation_id)
     ).distinct().order_by(Section.semester, Section.name).all()
     
     # Get recent logs
@@ -165,9 +157,9 @@ def edit(section_id):
     
     # Get all required data
     timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
-    rooms = Room.query.filter_by(is_active=True).order_by(Room.name).all()
+    rooms = Room.query.filter_by(is_available=True).order_by(Room.name).all()
     mappings = FacultyCourse.query.filter_by(section_id=section_id).all()
-    entries = Timetable.query.filter_by(section_id=section_id).all()
+    entries = Timetable.active().filter(Timetable.section_id == section_id).all()
     
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
     
@@ -184,8 +176,11 @@ def edit(section_id):
 def delete(section_id):
     """Delete timetable for a section"""
     try:
-        Timetable.query.filter_by(section_id=section_id).delete()
+        # The rows stay as a stored generation that can be rolled back to
+        # until compaction removes it
+        activate(section_id, None)
         db.session.commit()
+        get_occupancy(load=False).remove_section(section_id)
         
         return jsonify({
             'success': True,
@@ -226,15 +221,27 @@ def add_entry():
         entry = Timetable(
             section_id=section_id,
             faculty_course_id=mapping.id,
+            faculty_id=mapping.faculty_id,
+            course_id=mapping.course_id,
             room_id=room_id,
             timeslot_id=timeslot_id,
             batch_id=batch_id,
             is_lab_slot=mapping.course.is_lab,
-            generation_id=GenerationLog.generate_id()
+            generation_id=active_generation(section_id, create=True)
         )
         
         db.session.add(entry)
+        db.session.flush()
+        
+        # The index can lag writes made by other processes: re-check the
+        # slot in the database, inside the write transaction
+        clashes = entry_clashes([entry.id])
+        if clashes:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': clash_message(clashes, timeslot_id)}), 400
+        
         db.session.commit()
+        get_occupancy(load=False).refresh_entries([entry.id])
         
         return jsonify({
             'success': True,
@@ -254,6 +261,7 @@ def delete_entry(id):
         entry = Timetable.query.get_or_404(id)
         db.session.delete(entry)
         db.session.commit()
+        get_occupancy(load=False).remove_entries([id])
         
         return jsonify({'success': True, 'message': 'Entry deleted!'})
         
@@ -262,10 +270,96 @@ def delete_entry(id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@timetable_bp.route('/api/entries/bulk', methods=['POST'])
+def bulk_edit_entries():
+    """
+    Apply a batch of edits in one transaction. Body:
+    {add: [{section_id, mapping_id, timeslot_id, room_id, batch_id}],
+     move: [{entry_id, timeslot_id, room_id}], delete: [entry_id, ...]}
+    Nothing is saved if any item conflicts.
+    """
+    from app.scheduler.bulk_edit import BulkEdit
+    
+    data = request.json or {}
+    return _apply_bulk_edit(BulkEdit(
+        get_occupancy(),
+        adds=data.get('add', []),
+        moves=data.get('move', []),
+        deletes=data.get('delete', [])
+    ))
+
+
+@timetable_bp.route('/update-entries', methods=['POST'])
+def update_entries():
+    """Save the edit page's drag-and-drop changes (unassigned entries are removed)"""
+    from app.scheduler.bulk_edit import BulkEdit
+    
+    changes = (request.json or {}).get('changes', [])
+    return _apply_bulk_edit(BulkEdit(
+        get_occupancy(),
+        moves=[{'entry_id': c['entryId'], 'timeslot_id': c['timeslotId']}
+               for c in changes if c.get('timeslotId')],
+        deletes=[c['entryId'] for c in changes if not c.get('timeslotId')]
+    ))
+
+
+@timetable_bp.route('/add-entry', methods=['POST'])
+def add_entry_form():
+    """Add a class from the edit page's form (labs get their full two-period block)"""
+    from app.scheduler.bulk_edit import BulkEdit
+    
+    data = request.json or {}
+    try:
+        section_id = int(data.get('section_id'))
+        batch_id = int(data['batch_id']) if data.get('batch_id') else None
+        mapping = FacultyCourse.query.filter_by(
+            section_id=section_id,
+            course_id=int(data.get('course_id')),
+            faculty_id=int(data.get('faculty_id')),
+            batch_id=batch_id
+        ).first()
+        add = {
+            'section_id': section_id,
+            'mapping_id': mapping.id if mapping else None,
+            'timeslot_id': int(data.get('timeslot_id')),
+            'room_id': int(data.get('room_id')),
+            'batch_id': batch_id
+        }
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid form data'}), 400
+    
+    if not mapping:
+        return jsonify({'success': False, 'message': 'Faculty is not assigned to this course'}), 400
+    return _apply_bulk_edit(BulkEdit(get_occupancy(), adds=[add]))
+
+
+def _apply_bulk_edit(edit):
+    """Run a BulkEdit and report it the way the edit page expects"""
+    try:
+        if not edit.apply():
+            return jsonify({
+                'success': False,
+                'message': '; '.join(error['message'] for error in edit.errors),
+                'errors': edit.errors
+            }), 409
+        
+        summary = edit.summary()
+        return jsonify({
+            'success': True,
+            'message': f"Saved: {summary['added']} added, {summary['moved']} moved, "
+                       f"{summary['deleted']} removed",
+            **summary
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @timetable_bp.route('/api/section/<int:section_id>')
 def api_get_timetable(section_id):
     """API endpoint to get timetable data"""
-    entries = Timetable.query.filter_by(section_id=section_id).all()
+    entries = Timetable.active().filter(Timetable.section_id == section_id).all()
     
     return jsonify([{
         'id': e.id,
@@ -274,17 +368,24 @@ def api_get_timetable(section_id):
         'start_time': e.timeslot.start_time,
         'end_time': e.timeslot.end_time,
         'course': {'code': e.course.code, 'name': e.course.name, 'is_lab': e.course.is_lab},
-        'faculty': {'name': e.faculty.name, 'code': e.faculty.code},
-        'room': {'name': e.room.name, 'code': e.room.code} if e.room else None,
+        'faculty': {'name': e.faculty.name, 'code': e.faculty.faculty_id},
+        'room': {'name': e.room.name, 'code': e.room.room_id} if e.room else None,
         'batch': {'name': e.batch.name} if e.batch else None,
-        'session_type': e.session_type
+        'session_type': e.faculty_course.session_type
     } for e in entries])
 
 
 @timetable_bp.route('/api/faculty/<int:faculty_id>')
 def api_faculty_timetable(faculty_id):
     """Get timetable for a faculty member"""
-    entries = Timetable.query.filter_by(faculty_id=faculty_id).all()
+    # Index range scan on (faculty_id, timeslot_id); no join through faculty_courses
+    entries = Timetable.active().filter(Timetable.faculty_id == faculty_id).options(
+        db.joinedload(Timetable.timeslot),
+        db.joinedload(Timetable.course),
+        db.joinedload(Timetable.section),
+        db.joinedload(Timetable.room),
+        db.joinedload(Timetable.batch)
+    ).all()
     
     return jsonify([{
         'id': e.id,
@@ -302,7 +403,7 @@ def api_faculty_timetable(faculty_id):
 @timetable_bp.route('/api/room/<int:room_id>')
 def api_room_timetable(room_id):
     """Get timetable for a room"""
-    entries = Timetable.query.filter_by(room_id=room_id).all()
+    entries = Timetable.active().filter(Timetable.room_id == room_id).all()
     
     return jsonify([{
         'id': e.id,
@@ -319,80 +420,157 @@ def api_room_timetable(room_id):
 @timetable_bp.route('/api/validate/<int:section_id>')
 def api_validate_timetable(section_id):
     """Validate timetable and return conflicts"""
-    from app.scheduler.constraints import ConstraintChecker
+    from app.scheduler.violations import render_violations
     
-    checker = ConstraintChecker(section_id)
-    violations = checker.check_all()
+    # Checked against the live occupancy index rather than a fresh table scan
+    occupancy = get_occupancy()
+    violations = occupancy.checker(section_id).check_all()
     
     return jsonify({
         'valid': len(violations['hard']) == 0,
-        'hard_violations': violations['hard'],
-        'soft_violations': violations['soft'],
+        'hard_violations': render_violations(violations['hard'], occupancy.names),
+        'soft_violations': render_violations(violations['soft'], occupancy.names),
         'score': violations['score']
     })
 
 
-@timetable_bp.route('/regenerate/<int:section_id>', methods=['POST'])
-def regenerate(section_id):
-    """Regenerate timetable for a section"""
+@timetable_bp.route('/api/what-if')
+def api_what_if():
+    """
+    Evaluate a proposed move or swap without saving it. Accepts either
+    entry_id + timeslot_id (+ room_id), entry_id + swap_with, or a JSON
+    `moves` list of {entry_id, timeslot_id, room_id} for multi-entry moves.
+    """
+    from app.scheduler.moves import MoveEvaluator
+
+    evaluator = MoveEvaluator(get_occupancy())
     try:
-        # Delete existing timetable
-        Timetable.query.filter_by(section_id=section_id).delete()
-        db.session.commit()
-        
-        # Trigger generation (same as POST to /generate)
-        return redirect(url_for('timetable.generate'))
+        if request.args.get('moves'):
+            moves = json.loads(request.args['moves'])
+        elif request.args.get('swap_with'):
+            moves = evaluator.swap(request.args.get('entry_id', type=int),
+                                   request.args.get('swap_with', type=int))
+        else:
+            moves = [{
+                'entry_id': request.args.get('entry_id', type=int),
+                'timeslot_id': request.args.get('timeslot_id', type=int),
+                'room_id': request.args.get('room_id', type=int)
+            }]
+
+        return jsonify(evaluator.evaluate(moves))
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+
+@timetable_bp.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status, progress and results of a generation job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Unknown job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+
+@timetable_bp.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a generation job's progress via SSE"""
+    if get_job(job_id) is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return _event_stream(job_id)
+
+
+@timetable_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running generation job (the job id is its generation id)"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Unknown job {job_id}'}), 404
+    
+    try:
+        status = cancel(job_id)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    if status is None:
+        db.session.refresh(job)
+        return jsonify({'success': False, 'status': job.status, 'message': f'Job already {job.status}'}), 409
+    return jsonify({'success': True, 'status': status})
+
+
+@timetable_bp.route('/api/jobs/<job_id>/profile/<kind>')
+def job_profile(job_id, kind):
+    """Download a profiled job's cProfile data, text report or collapsed stacks"""
+    job = get_job(job_id)
+    if job is None or kind not in PROFILE_FILES:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    path = profile_path(current_app.config['PROFILE_FOLDER'], job.generation_id, kind)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'message': f'No {kind} profile for job {job_id}'}), 404
+    return send_file(path, mimetype='text/plain' if kind != 'pstats' else 'application/octet-stream',
+                     as_attachment=True, download_name=os.path.basename(path))
+
+
+@timetable_bp.route('/api/generations/<int:section_id>')
+def api_generations(section_id):
+    """Stored generations of a section's timetable, newest first"""
+    Section.query.get_or_404(section_id)
+    return jsonify(generations(section_id))
+
+
+@timetable_bp.route('/rollback/<int:section_id>', methods=['POST'])
+def rollback_generation(section_id):
+    """Re-activate a stored generation (default: the one before the active one)"""
+    Section.query.get_or_404(section_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        generation_id = rollback(section_id, data.get('generation_id') or request.form.get('generation_id'))
+        return jsonify({
+            'success': True,
+            'message': f'Timetable rolled back to {generation_id}',
+            'generation_id': generation_id
+        })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        flash(f'Error: {str(e)}', 'danger')
-        return redirect(url_for('timetable.view', section_id=section_id))
+        return jsonify({'success': False, 'message': str(e)}), 500
 
 
-def check_conflicts(section_id, timeslot_id, mapping, room_id, batch_id=None):
-    """Check for scheduling conflicts"""
-    timeslot = TimeSlot.query.get(timeslot_id)
+@timetable_bp.route('/regenerate/<int:section_id>', methods=['POST'])
+def regenerate(section_id):
+    """Regenerate timetable for a section"""
+    # Nothing is cleared: the current timetable stays active until the new
+    # generation is saved. Trigger generation (same as POST to /generate)
+    return redirect(url_for('timetable.generate'))
+
+
+def check_conflicts(section_id, timeslot_id, mapping, room_id, batch_id=None, ignore=()):
+    """Check for scheduling conflicts (answered from the live occupancy index)"""
+    occupancy = get_occupancy()
+    timeslot = occupancy.slot(timeslot_id)
+    if not timeslot:
+        return "Invalid timeslot"
     
-    # 1. Faculty conflict - faculty already teaching at this time
-    # 1. Faculty conflict - faculty already teaching at this time
-    faculty_conflict = Timetable.query.join(FacultyCourse).filter(
-        FacultyCourse.faculty_id == mapping.faculty_id,
-        Timetable.timeslot_id == timeslot_id
-    ).first()
+    conflicts = occupancy.placement_conflicts(
+        section_id, timeslot_id, mapping.faculty_id, room_id, batch_id, ignore
+    )
     
-    if faculty_conflict:
+    # 1. Faculty conflict - faculty already teaching at this time
+    if 'faculty' in conflicts:
         return f"Faculty {mapping.faculty.name} is already scheduled at this time"
     
     # 2. Room conflict - room already in use
-    room_conflict = Timetable.query.filter_by(
-        room_id=room_id,
-        timeslot_id=timeslot_id
-    ).first()
-    
-    if room_conflict:
+    if 'room' in conflicts:
         return f"Room is already booked at this time"
     
     # 3. Section conflict (for theory classes) - section already has a class
-    if not batch_id:
-        section_conflict = Timetable.query.filter_by(
-            section_id=section_id,
-            timeslot_id=timeslot_id,
-            batch_id=None
-        ).first()
-        
-        if section_conflict:
-            return "Section already has a theory class at this time"
+    if 'section' in conflicts:
+        return "Section already has a theory class at this time"
     
     # 4. Batch conflict - batch already has a class
-    if batch_id:
-        batch_conflict = Timetable.query.filter_by(
-            section_id=section_id,
-            timeslot_id=timeslot_id,
-            batch_id=batch_id
-        ).first()
-        
-        if batch_conflict:
-            return "Batch already has a class at this time"
+    if 'batch' in conflicts:
+        return "Batch already has a class at this time"
     
     # 5. Lab period validation - labs must start at odd periods and have 2 consecutive slots
     if mapping.course.is_lab:
@@ -400,3 +578,14 @@ def check_conflicts(section_id, timeslot_id, mapping, room_id, batch_id=None):
             return "Labs must start at period 1, 3, 5, or 7"
     
     return None
+
+
+def clash_message(clashes, timeslot_id):
+    """Message for entry_clashes results at one timeslot"""
+    from app.scheduler.bulk_edit import CONFLICT_MESSAGES
+    
+    slot = get_occupancy().slot(timeslot_id)
+    where = f"{slot.day} P{slot.period}" if slot else "this time"
+    reasons = {reason for _, _, reason in clashes}
+    return '; '.join(message.format(slot=where) for reason, message in CONFLICT_MESSAGES.items()
+                     if reason in reasons)
@@ -1,12 +1,19 @@
 """Scheduler package - Hybrid GA+CSP timetable generation"""
 
-from app.scheduler.constraints import ConstraintChecker
+from app.scheduler.constraints import ConstraintChecker, InstitutionValidator
+from app.scheduler.scoring import ScoringModel, PenaltyTensor
+from app.scheduler.violations import Violation, render_violations
 from app.scheduler.csp_solver import CSPSolver, generate_initial_solution
 from app.scheduler.genetic_algorithm import GeneticAlgorithm, Chromosome
 from app.scheduler.hybrid_scheduler import HybridScheduler, schedule_all_sections
 
 __all__ = [
     'ConstraintChecker',
+    'InstitutionValidator',
+    'ScoringModel',
+    'PenaltyTensor',
+    'Violation',
+    'render_violations',
     'CSPSolver',
     'generate_initial_solution',
     'GeneticAlgorithm',
@@ -0,0 +1,324 @@
+"""Bulk Edit - Set-based validation and single-transaction application of timetable edits"""
+from app.models import Course, FacultyCourse, Timetable
+from app import db
+from app.scheduler.generations import active_generation
+from app.scheduler.hybrid_scheduler import lab_pairs
+from app.scheduler.occupancy import entry_clashes
+from collections import defaultdict
+from types import SimpleNamespace
+from sqlalchemy import select, insert, update, delete
+
+
+# Wording matches check_conflicts so the edit page shows the same messages
+CONFLICT_MESSAGES = {
+    'faculty': "Faculty is already scheduled at {slot}",
+    'room': "Room is already booked at {slot}",
+    'section': "Section already has a theory class at {slot}",
+    'batch': "Batch already has a class at {slot}",
+}
+
+
+class BulkEdit:
+    """
+    A batch of adds, moves and deletes checked together against the live
+    occupancy index and applied in one commit, or not at all.
+    
+    Every new position (added or moved entry) is checked once against the
+    index with all moved and deleted entries ignored, and against the other
+    new positions in the batch. Lab blocks must still be pairs of
+    consecutive periods starting at P1, P3, P5 or P7 afterwards; with
+    `expand_labs` a move or delete of one lab period takes its partner
+    along, and an add at a block start adds the second period too.
+    
+        adds:    [{section_id, mapping_id, timeslot_id, room_id, batch_id}]
+        moves:   [{entry_id, timeslot_id, room_id (optional)}]
+        deletes: [entry_id, ...]
+    """
+    
+    def __init__(self, occupancy, adds=(), moves=(), deletes=(), expand_labs=True):
+        self.occupancy = occupancy.ensure_loaded()
+        self.adds = list(adds)
+        self.moves = list(moves)
+        self.deletes = list(deletes)
+        self.expand_labs = expand_labs
+        self.errors = []
+        self._validated = False
+    
+    # ------------------------------------------------------------------
+    # Resolving the batch
+    # ------------------------------------------------------------------
+    
+    def _error(self, op, message, entry_id=None, index=None):
+        error = {'op': op, 'message': message}
+        if entry_id is not None:
+            error['entry_id'] = entry_id
+        if index is not None:
+            error['index'] = index
+        self.errors.append(error)
+    
+    def _resolve(self):
+        """Turn the request into removed entry ids and new positions"""
+        occupancy = self.occupancy
+        self.deleted = set()
+        self.moved = {}      # entry id -> relocated row
+        self.added = []      # (index, row) with id None
+        
+        for entry_id in self.deletes:
+            row = occupancy.entries.get(entry_id)
+            if row is None:
+                self._error('delete', f"Unknown entry {entry_id}", entry_id=entry_id)
+                continue
+            self.deleted.add(entry_id)
+            partner = self._lab_partner(row)
+            if partner is not None and self.expand_labs:
+                self.deleted.add(partner.id)
+        
+        explicit = {move.get('entry_id') for move in self.moves}
+        for move in self.moves:
+            entry_id = move.get('entry_id')
+            row = occupancy.entries.get(entry_id)
+            if row is None:
+                self._error('move', f"Unknown entry {entry_id}", entry_id=entry_id)
+                continue
+            if entry_id in self.deleted:
+                self._error('move', "Entry is also being deleted", entry_id=entry_id)
+                continue
+            try:
+                target = occupancy.relocated(row, move.get('timeslot_id'), move.get('room_id'))
+            except ValueError as e:
+                self._error('move', str(e), entry_id=entry_id)
+                continue
+            self.moved[entry_id] = target
+            
+            partner = self._lab_partner(row)
+            if partner is None or partner.id in explicit or not self.expand_labs:
+                continue
+            # Keep the block together: the partner keeps its offset
+            slot = occupancy.slot_at(target.day, target.period + partner.period - row.period)
+            if slot is None:
+                self._error('move', "Lab block does not fit at the target slot", entry_id=entry_id)
+                continue
+            self.moved[partner.id] = occupancy.relocated(partner, slot.id, target.room_id)
+        
+        mappings = self._mappings({add.get('mapping_id') for add in self.adds})
+        for index, add in enumerate(self.adds):
+            mapping = mappings.get(add.get('mapping_id'))
+            if mapping is None or mapping.section_id != add.get('section_id'):
+                self._error('add', "Invalid mapping", index=index)
+                continue
+            slot = occupancy.slot(add.get('timeslot_id'))
+            if slot is None:
+                self._error('add', "Invalid timeslot", index=index)
+                continue
+            room_id = add.get('room_id')
+            if room_id not in occupancy.room_capacity:
+                self._error('add', f"Unknown room {room_id}", index=index)
+                continue
+            
+            slots = [slot]
+            if mapping.is_lab and self.expand_labs and slot.period % 2:
+                partner = occupancy.slot_at(slot.day, slot.period + 1)
+                if partner is not None:
+                    slots.append(partner)
+            for slot in slots:
+                self.added.append((index, SimpleNamespace(
+                    id=None, section_id=mapping.section_id, faculty_course_id=mapping.id,
+                    faculty_id=mapping.faculty_id, course_id=mapping.course_id,
+                    is_lab=mapping.is_lab, batch_id=add.get('batch_id') or mapping.batch_id,
+                    room_id=room_id, timeslot_id=slot.id, day=slot.day, period=slot.period
+                )))
+    
+    def _mappings(self, mapping_ids):
+        """mapping id -> (id, section_id, faculty_id, course_id, batch_id, is_lab), one query"""
+        mapping_ids -= {None}
+        if not mapping_ids:
+            return {}
+        rows = db.session.execute(
+            select(FacultyCourse.id, FacultyCourse.section_id, FacultyCourse.faculty_id,
+                   FacultyCourse.course_id, FacultyCourse.batch_id, Course.is_lab)
+            .join(Course, FacultyCourse.course_id == Course.id)
+            .where(FacultyCourse.id.in_(mapping_ids))
+        )
+        return {row.id: row for row in rows}
+    
+    def _lab_partner(self, row):
+        """The other period of a lab entry's two-period block, if present"""
+        if not row.is_lab:
+            return None
+        period = row.period + 1 if row.period % 2 else row.period - 1
+        for other in self.occupancy.section_entries(row.section_id):
+            if (other.id != row.id and other.period == period and other.day == row.day
+                    and other.faculty_course_id == row.faculty_course_id
+                    and other.batch_id == row.batch_id):
+                return other
+        return None
+    
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+    
+    def _placed(self):
+        """Every new position as (op, entry_id, index, row)"""
+        for entry_id, row in self.moved.items():
+            yield 'move', entry_id, None, row
+        for index, row in self.added:
+            yield 'add', None, index, row
+    
+    def _check_conflicts(self):
+        """One pass over the new positions: index lookups plus in-batch claims"""
+        occupancy = self.occupancy
+        ignore = self.deleted | self.moved.keys()
+        claimed = set()
+        
+        for op, entry_id, index, row in self._placed():
+            reasons = occupancy.placement_conflicts(
+                row.section_id, row.timeslot_id, row.faculty_id, row.room_id, row.batch_id, ignore
+            )
+            group = 'batch' if row.batch_id else 'section'
+            for reason, key in (
+                ('faculty', ('faculty', row.faculty_id, row.timeslot_id)),
+                ('room', ('room', row.room_id, row.timeslot_id)),
+                (group, ('group', row.section_id, row.batch_id, row.timeslot_id)),
+            ):
+                if key in claimed and reason not in reasons:
+                    reasons.append(reason)
+                claimed.add(key)
+            
+            slot = occupancy.slot(row.timeslot_id)
+            for reason in reasons:
+                message = CONFLICT_MESSAGES[reason].format(slot=f"{slot.day} P{slot.period}")
+                self._error(op, message, entry_id=entry_id, index=index)
+    
+    def _check_lab_blocks(self):
+        """Lab periods touched by the batch must still form P1-2, P3-4, P5-6 or P7-8 pairs"""
+        occupancy = self.occupancy
+        touched = [occupancy.entries[i] for i in self.deleted | self.moved.keys()]
+        touched += [row for _, _, _, row in self._placed()]
+        blocks = {(row.section_id, row.faculty_course_id, row.batch_id)
+                  for row in touched if row.is_lab}
+        if not blocks:
+            return
+        
+        removed = self.deleted | self.moved.keys()
+        periods = defaultdict(list)  # (block, day) -> periods after the edit
+        for section_id in {block[0] for block in blocks}:
+            rows = [row for row in occupancy.section_entries(section_id) if row.id not in removed]
+            rows += [row for _, _, _, row in self._placed() if row.section_id == section_id]
+            for row in rows:
+                block = (row.section_id, row.faculty_course_id, row.batch_id)
+                if block in blocks:
+                    periods[(block, row.day)].append(row.period)
+        
+        courses = {row.faculty_course_id: row.course_id for row in touched}
+        names = occupancy.names.load([
+            SimpleNamespace(faculty_id=None, room_id=None, timeslot_id=None, course_id=course_id)
+            for course_id in courses.values()
+        ])
+        for ((_, mapping_id, _), day), found in periods.items():
+            paired = len(found) == len(set(found)) and all(
+                (p + 1 if p % 2 else p - 1) in found for p in found
+            )
+            if not paired:
+                course = names.course(courses[mapping_id])
+                self._error('lab', f"Lab {course} on {day} must be blocks of two consecutive "
+                                   f"periods starting at P1, P3, P5 or P7 (has {sorted(found)})")
+    
+    def validate(self):
+        """Check the whole batch; returns the list of errors (empty when it can be applied)"""
+        if not self._validated:
+            self.errors = []
+            self._resolve()
+            if not self.errors:
+                self._check_conflicts()
+                self._check_lab_blocks()
+            self._validated = True
+        return self.errors
+    
+    # ------------------------------------------------------------------
+    # Applying
+    # ------------------------------------------------------------------
+    
+    def apply(self):
+        """
+        Validate and, if clean, write the batch in one transaction and patch
+        the occupancy index. The new positions are checked once more in the
+        database before the commit, so a clash with a write the index had
+        not seen yet rolls the batch back. Returns True when applied.
+        """
+        if self.validate():
+            return False
+        
+        try:
+            if self.deleted:
+                db.session.execute(
+                    delete(Timetable).where(Timetable.id.in_(self.deleted)),
+                    execution_options={'synchronize_session': False}
+                )
+            if self.moved:
+                db.session.execute(update(Timetable), [
+                    {'id': entry_id, 'timeslot_id': row.timeslot_id, 'room_id': row.room_id}
+                    for entry_id, row in self.moved.items()
+                ])
+            self.added_ids = []
+            if self.added:
+                # Manual edits change the active generation in place
+                generations = {section_id: active_generation(section_id, create=True)
+                               for section_id in {row.section_id for _, row in self.added}}
+                rows = [{
+                    'section_id': row.section_id, 'faculty_course_id': row.faculty_course_id,
+                    'faculty_id': row.faculty_id, 'course_id': row.course_id,
+                    'room_id': row.room_id, 'timeslot_id': row.timeslot_id,
+                    'batch_id': row.batch_id, 'is_lab_slot': row.is_lab, 'is_second_slot': False,
+                    'generation_id': generations[row.section_id]
+                } for _, row in self.added]
+                
+                # Added lab blocks are linked like saved ones, by a second
+                # batched update once the ids are known (see _save_entries)
+                slots = {row['timeslot_id']: self.occupancy.slot(row['timeslot_id']) for row in rows}
+                pairs = lab_pairs(rows, slots)
+                for _, second in pairs:
+                    rows[second]['is_second_slot'] = True
+                self.added_ids = list(db.session.scalars(
+                    insert(Timetable).returning(Timetable.id, sort_by_parameter_order=True), rows
+                ))
+                if pairs:
+                    db.session.execute(update(Timetable), [
+                        {'id': self.added_ids[a], 'linked_slot_id': self.added_ids[b]}
+                        for first, second in pairs
+                        for a, b in ((first, second), (second, first))
+                    ])
+            
+            # The index may have missed another process's latest writes:
+            # re-check the new positions in the database before committing
+            if self._check_written():
+                db.session.rollback()
+                return False
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        self.occupancy.remove_entries(self.deleted)
+        self.occupancy.refresh_entries(list(self.moved) + self.added_ids)
+        return True
+    
+    def _check_written(self):
+        """Clashes of the written positions found in the database, recorded as errors"""
+        placed = {entry_id: ('move', entry_id, None, row) for entry_id, row in self.moved.items()}
+        placed.update({entry_id: ('add', None, index, row)
+                       for (index, row), entry_id in zip(self.added, self.added_ids)})
+        for entry_id, reason in dict.fromkeys((entry_id, reason)
+                                              for entry_id, _, reason in entry_clashes(placed)):
+            op, moved_id, index, row = placed[entry_id]
+            slot = self.occupancy.slot(row.timeslot_id)
+            message = CONFLICT_MESSAGES[reason].format(slot=f"{slot.day} P{slot.period}")
+            self._error(op, message, entry_id=moved_id, index=index)
+        return self.errors
+    
+    def summary(self):
+        return {
+            'added': len(self.added),
+            'moved': len(self.moved),
+            'deleted': len(self.deleted),
+            'entry_ids': getattr(self, 'added_ids', [])
+        }
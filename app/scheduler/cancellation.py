@@ -0,0 +1,48 @@
+"""Cancellation - Cooperative stop checkpoints and wall-clock limits for generation runs"""
+import time
+
+
+class GenerationStopped(Exception):
+    """Raised at a checkpoint once a run is cancelled or out of time"""
+    
+    def __init__(self, reason):
+        self.reason = reason  # 'cancelled' or 'timed_out'
+        super().__init__(f"Generation {reason.replace('_', ' ')}")
+
+
+class StopToken:
+    """
+    Checked by the solvers at their checkpoints (each CSP node, each GA
+    fitness evaluation, each greedy mapping). `time_limit` is a wall-clock
+    budget in seconds from creation; `cancelled` is a callable, e.g. a read
+    of the job's status, polled at most every `poll` seconds.
+    """
+    
+    def __init__(self, time_limit=None, cancelled=None, poll=0.25):
+        self.started = time.monotonic()
+        self.deadline = self.started + time_limit if time_limit else None
+        self._cancelled = cancelled
+        self.poll = poll
+        self._next_poll = self.started
+        self.reason = None
+    
+    def stop_reason(self):
+        """'cancelled', 'timed_out' or None; once set it sticks"""
+        if self.reason is None:
+            now = time.monotonic()
+            if self.deadline is not None and now >= self.deadline:
+                self.reason = 'timed_out'
+            elif self._cancelled is not None and now >= self._next_poll:
+                self._next_poll = now + self.poll
+                if self._cancelled():
+                    self.reason = 'cancelled'
+        return self.reason
+    
+    def check(self):
+        """Checkpoint: raise GenerationStopped if the run has to stop"""
+        if self.stop_reason():
+            raise GenerationStopped(self.reason)
+
+
+# For solvers run without a token
+NEVER = StopToken()
@@ -3,21 +3,219 @@ from app.models import (
     Section, Course, Faculty, Room, FacultyCourse,
     Timetable, TimeSlot, Batch
 )
+from app.models.faculty import faculty_slot_masks
+from app.models.timeslot import slot_bit
 from app import db
-import json
+from app.scheduler.scoring import ScoringModel
+from app.scheduler.violations import Violation
+from collections import defaultdict
+from sqlalchemy import select, or_
+
+
+def entry_rows_query():
+    """
+    Core select returning one plain row per timetable entry with everything
+    the checks need (faculty, course, slot, room, batch and section data).
+    Only entries of each section's active generation are included.
+    """
+    return (
+        select(
+            Timetable.id,
+            Timetable.section_id,
+            Timetable.faculty_course_id,
+            Timetable.timeslot_id,
+            Timetable.room_id,
+            Timetable.batch_id,
+            FacultyCourse.faculty_id,
+            FacultyCourse.course_id,
+            Course.is_lab,
+            TimeSlot.day,
+            TimeSlot.day_index,
+            TimeSlot.period,
+            Room.capacity.label('room_capacity'),
+            Batch.strength.label('batch_strength'),
+            Section.strength.label('section_strength'),
+            Faculty.max_hours_per_day,
+            Faculty.preferred_slots,
+            Faculty.unavailable_slots
+        )
+        .join(FacultyCourse, Timetable.faculty_course_id == FacultyCourse.id)
+        .join(Course, FacultyCourse.course_id == Course.id)
+        .join(Faculty, FacultyCourse.faculty_id == Faculty.id)
+        .join(TimeSlot, Timetable.timeslot_id == TimeSlot.id)
+        .join(Section, (Timetable.section_id == Section.id)
+              & (Timetable.generation_id == Section.active_generation_id))
+        .outerjoin(Room, Timetable.room_id == Room.id)
+        .outerjoin(Batch, Timetable.batch_id == Batch.id)
+    )
+
+
+class TimetableIndex:
+    """
+    Entry rows grouped by section, faculty/room slot and faculty day, built in
+    one pass. Clashing groups are bucketed by every section they involve so a
+    section's cross-section checks are a dictionary lookup.
+    """
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.by_section = defaultdict(list)
+        faculty_slots = defaultdict(list)
+        room_slots = defaultdict(list)
+        self.faculty_days = defaultdict(lambda: defaultdict(int))  # faculty_id -> day -> periods
+        self.faculty_limits = {}  # faculty_id -> max_hours_per_day
+        
+        for row in rows:
+            self.by_section[row.section_id].append(row)
+            faculty_slots[(row.faculty_id, row.timeslot_id)].append(row)
+            if row.room_id:
+                room_slots[(row.room_id, row.timeslot_id)].append(row)
+            self.faculty_days[row.faculty_id][row.day] += 1
+            self.faculty_limits[row.faculty_id] = row.max_hours_per_day
+        
+        self.faculty_clashes = self._bucket_clashes(faculty_slots)
+        self.room_clashes = self._bucket_clashes(room_slots)
+    
+    @staticmethod
+    def _bucket_clashes(groups):
+        """section_id -> [(key, rows)] for every group with more than one row"""
+        clashes = defaultdict(list)
+        for key, rows in groups.items():
+            if len(rows) > 1:
+                for section_id in {r.section_id for r in rows}:
+                    clashes[section_id].append((key, rows))
+        return clashes
+    
+    def section_entries(self, section_id):
+        return self.by_section.get(section_id, [])
+    
+    def faculty_clashes_for(self, section_id):
+        """[(faculty_id, timeslot_id), rows] for clashes involving the section"""
+        return self.faculty_clashes.get(section_id, [])
+    
+    def room_clashes_for(self, section_id):
+        """[(room_id, timeslot_id), rows] for clashes involving the section"""
+        return self.room_clashes.get(section_id, [])
+    
+    def faculty_day_load(self, faculty_id):
+        return self.faculty_days.get(faculty_id, {})
+    
+    def faculty_limit(self, faculty_id):
+        return self.faculty_limits.get(faculty_id)
+
+
+class CandidateIndex:
+    """
+    The timetable with one section's entries left out, for scoring many
+    candidate timetables of that section against the same background.
+    Other sections' rows are grouped once; with_entries() lays a
+    candidate's rows over them without copying anything.
+    """
+    
+    def __init__(self, section_id, rows):
+        self.section_id = section_id
+        self.faculty_slots = defaultdict(list)
+        self.room_slots = defaultdict(list)
+        self.faculty_days = defaultdict(lambda: defaultdict(int))
+        self.faculty_limits = {}
+        
+        for row in rows:
+            if row.section_id == section_id:
+                continue
+            self.faculty_slots[(row.faculty_id, row.timeslot_id)].append(row)
+            if row.room_id:
+                self.room_slots[(row.room_id, row.timeslot_id)].append(row)
+            self.faculty_days[row.faculty_id][row.day] += 1
+            self.faculty_limits[row.faculty_id] = row.max_hours_per_day
+    
+    def with_entries(self, rows):
+        """A TimetableIndex-like view with `rows` as the section's entries"""
+        return _Candidate(self, rows)
+
+
+class _Candidate:
+    """A CandidateIndex with one candidate's rows laid over it"""
+    
+    def __init__(self, background, rows):
+        self.background = background
+        self.rows = rows
+    
+    def section_entries(self, section_id):
+        return self.rows if section_id == self.background.section_id else []
+    
+    def _clashes(self, groups, key_of):
+        own = defaultdict(list)
+        for row in self.rows:
+            key = key_of(row)
+            if key is not None:
+                own[key].append(row)
+        return [(key, groups.get(key, []) + rows) for key, rows in own.items()
+                if len(rows) + len(groups.get(key, ())) > 1]
+    
+    def faculty_clashes_for(self, section_id):
+        return self._clashes(self.background.faculty_slots,
+                             lambda r: (r.faculty_id, r.timeslot_id))
+    
+    def room_clashes_for(self, section_id):
+        return self._clashes(self.background.room_slots,
+                             lambda r: (r.room_id, r.timeslot_id) if r.room_id else None)
+    
+    def faculty_day_load(self, faculty_id):
+        load = dict(self.background.faculty_days.get(faculty_id, {}))
+        for row in self.rows:
+            if row.faculty_id == faculty_id:
+                load[row.day] = load.get(row.day, 0) + 1
+        return load
+    
+    def faculty_limit(self, faculty_id):
+        for row in self.rows:
+            if row.faculty_id == faculty_id:
+                return row.max_hours_per_day
+        return self.background.faculty_limits.get(faculty_id)
 
 
 class ConstraintChecker:
     """Checks all hard and soft constraints for a timetable"""
     
-    def __init__(self, section_id):
+    def __init__(self, section_id, scoring=None, penalties=None,
+                 index=None, section=None, timeslots=None):
         self.section_id = section_id
-        self.section = Section.query.get(section_id)
-        self.entries = Timetable.query.filter_by(section_id=section_id).all()
+        self.section = section
         # Load timeslots
-        self.timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
+        if timeslots is None:
+            timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
+        self.timeslots = timeslots
         self.timeslot_ids = [t.id for t in self.timeslots]
         
+        # One query for this section's entries plus every entry that shares a
+        # faculty or room with the section (needed for cross-section checks).
+        # Any object with TimetableIndex's query methods will do, e.g. the
+        # live OccupancyIndex.
+        if index is None:
+            section_faculty = select(FacultyCourse.faculty_id).where(FacultyCourse.section_id == section_id)
+            section_rooms = select(Timetable.room_id).where(Timetable.section_id == section_id)
+            index = TimetableIndex(db.session.execute(
+                entry_rows_query().where(or_(
+                    Timetable.section_id == section_id,
+                    FacultyCourse.faculty_id.in_(section_faculty),
+                    Timetable.room_id.in_(section_rooms)
+                ))
+            ).all())
+        self.index = index
+        self.entries = index.section_entries(section_id)
+        
+        # Scoring model and precompiled soft penalties (callers that check
+        # the same section repeatedly should pass these in)
+        self.scoring = scoring or ScoringModel.from_config()
+        if penalties is None:
+            self.section = self.section or Section.query.get(section_id)
+            mappings = FacultyCourse.query.filter_by(section_id=section_id).options(
+                db.joinedload(FacultyCourse.faculty),
+                db.joinedload(FacultyCourse.course)
+            ).all()
+            penalties = self.scoring.compile_penalties(self.section, mappings, self.timeslots)
+        self.penalties = penalties
+    
     def check_all(self):
         """Check all constraints and return violations"""
         hard_violations = []
@@ -36,48 +234,36 @@ class ConstraintChecker:
         soft_violations.extend(self.check_faculty_daily_load())
         soft_violations.extend(self.check_course_distribution())
         soft_violations.extend(self.check_lecture_gaps())
+        soft_violations.extend(self.check_time_of_day())
         
-        # Calculate score (higher is better)
-        score = 1000 - (len(hard_violations) * 100) - (len(soft_violations) * 10)
+        # Weighted costs; slot penalties come straight from the tensor
+        hard_cost = self.scoring.cost(hard_violations)
+        soft_cost = self.scoring.cost(
+            v for v in soft_violations if v.type not in self.penalties.components
+        ) + self.penalties.cost(
+            [e.faculty_course_id for e in self.entries],
+            [e.timeslot_id for e in self.entries]
+        )
         
         return {
             'hard': hard_violations,
             'soft': soft_violations,
-            'score': max(0, score)
+            'hard_cost': hard_cost,
+            'soft_cost': soft_cost,
+            'score': self.scoring.score(hard_cost, soft_cost)
         }
     
     def check_faculty_conflicts(self):
         """HC1: Faculty cannot teach two classes at the same time"""
         violations = []
         
-        # Group entries by timeslot and faculty
-        faculty_slots = {}
-        for entry in self.entries:
-            if not entry.faculty_course:
-                continue
-            key = (entry.faculty_course.faculty_id, entry.timeslot_id)
-            if key not in faculty_slots:
-                faculty_slots[key] = []
-            faculty_slots[key].append(entry)
-        
-        # Check for same faculty at same time across all sections
-        all_entries = Timetable.query.all()
-        global_faculty_slots = {}
-        for entry in all_entries:
-            key = (entry.faculty_course.faculty_id, entry.timeslot_id)
-            if key not in global_faculty_slots:
-                global_faculty_slots[key] = []
-            global_faculty_slots[key].append(entry)
-        
-        for (faculty_id, slot_id), entries in global_faculty_slots.items():
-            if len(entries) > 1:
-                faculty = Faculty.query.get(faculty_id)
-                slot = TimeSlot.query.get(slot_id)
-                violations.append({
-                    'type': 'faculty_conflict',
-                    'message': f"Faculty {faculty.name} has {len(entries)} classes at {slot.day} P{slot.period}",
-                    'severity': 'hard'
-                })
+        # Same faculty at same time across all sections, where one of the
+        # clashing classes belongs to this section
+        for (faculty_id, slot_id), entries in self.index.faculty_clashes_for(self.section_id):
+            violations.append(Violation(
+                'faculty_conflict', 'hard',
+                faculty_id=faculty_id, timeslot_id=slot_id, magnitude=len(entries)
+            ))
         
         return violations
     
@@ -85,24 +271,11 @@ class ConstraintChecker:
         """HC2: Room cannot have two classes at the same time"""
         violations = []
         
-        all_entries = Timetable.query.all()
-        room_slots = {}
-        for entry in all_entries:
-            if entry.room_id:
-                key = (entry.room_id, entry.timeslot_id)
-                if key not in room_slots:
-                    room_slots[key] = []
-                room_slots[key].append(entry)
-        
-        for (room_id, slot_id), entries in room_slots.items():
-            if len(entries) > 1:
-                room = Room.query.get(room_id)
-                slot = TimeSlot.query.get(slot_id)
-                violations.append({
-                    'type': 'room_conflict',
-                    'message': f"Room {room.name} has {len(entries)} bookings at {slot.day} P{slot.period}",
-                    'severity': 'hard'
-                })
+        for (room_id, slot_id), entries in self.index.room_clashes_for(self.section_id):
+            violations.append(Violation(
+                'room_conflict', 'hard',
+                room_id=room_id, timeslot_id=slot_id, magnitude=len(entries)
+            ))
         
         return violations
     
@@ -111,21 +284,17 @@ class ConstraintChecker:
         violations = []
         
         # For theory classes (no batch), section can only have one class per slot
-        section_slots = {}
+        section_slots = defaultdict(list)
         for entry in self.entries:
             if not entry.batch_id:  # Theory class
-                if entry.timeslot_id not in section_slots:
-                    section_slots[entry.timeslot_id] = []
                 section_slots[entry.timeslot_id].append(entry)
         
         for slot_id, entries in section_slots.items():
             if len(entries) > 1:
-                slot = TimeSlot.query.get(slot_id)
-                violations.append({
-                    'type': 'section_conflict',
-                    'message': f"Section has {len(entries)} theory classes at {slot.day} P{slot.period}",
-                    'severity': 'hard'
-                })
+                violations.append(Violation(
+                    'section_conflict', 'hard',
+                    timeslot_id=slot_id, magnitude=len(entries)
+                ))
         
         return violations
     
@@ -134,27 +303,21 @@ class ConstraintChecker:
         violations = []
         
         # Group lab entries by course and batch
-        lab_entries = [e for e in self.entries if e.faculty_course.course.is_lab]
-        lab_groups = {}
-        
-        for entry in lab_entries:
-            key = (entry.faculty_course.course_id, entry.batch_id, entry.timeslot.day)
-            if key not in lab_groups:
-                lab_groups[key] = []
-            lab_groups[key].append(entry)
+        lab_groups = defaultdict(list)
+        for entry in self.entries:
+            if entry.is_lab:
+                lab_groups[(entry.course_id, entry.batch_id, entry.day)].append(entry)
         
         for (course_id, batch_id, day), entries in lab_groups.items():
             if len(entries) >= 2:
-                periods = sorted([e.timeslot.period for e in entries])
+                periods = sorted([e.period for e in entries])
                 # Check if periods are consecutive
                 for i in range(len(periods) - 1):
                     if periods[i+1] - periods[i] != 1:
-                        course = Course.query.get(course_id)
-                        violations.append({
-                            'type': 'lab_not_consecutive',
-                            'message': f"Lab {course.code} periods not consecutive on {day}: {periods}",
-                            'severity': 'hard'
-                        })
+                        violations.append(Violation(
+                            'lab_not_consecutive', 'hard',
+                            course_id=course_id, day=day, periods=tuple(periods)
+                        ))
                         break
         
         return violations
@@ -164,15 +327,12 @@ class ConstraintChecker:
         violations = []
         
         for entry in self.entries:
-            if entry.faculty_course.faculty.unavailable_slots:
-                unavailable = json.loads(entry.faculty_course.faculty.unavailable_slots)
-                slot_key = f"{entry.timeslot.day}_{entry.timeslot.period}"
-                if slot_key in unavailable:
-                    violations.append({
-                        'type': 'faculty_unavailable',
-                        'message': f"Faculty {entry.faculty_course.faculty.name} is unavailable at {entry.timeslot.day} P{entry.timeslot.period}",
-                        'severity': 'hard'
-                    })
+            _, unavailable = faculty_slot_masks(entry.faculty_id, entry.preferred_slots, entry.unavailable_slots)
+            if unavailable & slot_bit(entry.day_index, entry.period):
+                violations.append(Violation(
+                    'faculty_unavailable', 'hard',
+                    faculty_id=entry.faculty_id, timeslot_id=entry.timeslot_id
+                ))
         
         return violations
     
@@ -181,18 +341,18 @@ class ConstraintChecker:
         violations = []
         
         for entry in self.entries:
-            if entry.room:
-                if entry.batch:
-                    strength = entry.batch.strength
+            if entry.room_capacity is not None:
+                if entry.batch_id:
+                    strength = entry.batch_strength
                 else:
-                    strength = self.section.strength
+                    strength = entry.section_strength
                 
-                if entry.room.capacity < strength:
-                    violations.append({
-                        'type': 'room_capacity',
-                        'message': f"Room {entry.room.name} (cap: {entry.room.capacity}) too small for {strength} students",
-                        'severity': 'hard'
-                    })
+                if entry.room_capacity < strength:
+                    violations.append(Violation(
+                        'room_capacity', 'hard',
+                        room_id=entry.room_id, timeslot_id=entry.timeslot_id,
+                        magnitude=strength, limit=entry.room_capacity
+                    ))
         
         return violations
     
@@ -201,15 +361,11 @@ class ConstraintChecker:
         violations = []
         
         for entry in self.entries:
-            if entry.faculty_course.faculty.preferred_slots:
-                preferred = json.loads(entry.faculty_course.faculty.preferred_slots)
-                slot_key = f"{entry.timeslot.day}_{entry.timeslot.period}"
-                if preferred and slot_key not in preferred:
-                    violations.append({
-                        'type': 'not_preferred_slot',
-                        'message': f"Faculty {entry.faculty_course.faculty.name} not in preferred slot at {entry.timeslot.day} P{entry.timeslot.period}",
-                        'severity': 'soft'
-                    })
+            if self.penalties.component('not_preferred_slot', entry.faculty_course_id, entry.timeslot_id):
+                violations.append(Violation(
+                    'not_preferred_slot', 'soft',
+                    faculty_id=entry.faculty_id, timeslot_id=entry.timeslot_id
+                ))
         
         return violations
     
@@ -217,24 +373,16 @@ class ConstraintChecker:
         """SC2: Limit faculty's daily teaching hours"""
         violations = []
         
-        # Count hours per faculty per day
-        faculty_daily = {}
-        all_entries = Timetable.query.all()
-        
-        for entry in all_entries:
-            key = (entry.faculty_course.faculty_id, entry.timeslot.day)
-            if key not in faculty_daily:
-                faculty_daily[key] = 0
-            faculty_daily[key] += 1
-        
-        for (faculty_id, day), count in faculty_daily.items():
-            faculty = Faculty.query.get(faculty_id)
-            if count > faculty.max_hours_per_day:
-                violations.append({
-                    'type': 'faculty_overload_daily',
-                    'message': f"Faculty {faculty.name} has {count} hours on {day} (max: {faculty.max_hours_per_day})",
-                    'severity': 'soft'
-                })
+        # Hours per faculty per day (across all sections), for faculty
+        # teaching this section
+        for faculty_id in {e.faculty_id for e in self.entries}:
+            limit = self.index.faculty_limit(faculty_id)
+            for day, count in self.index.faculty_day_load(faculty_id).items():
+                if limit is not None and count > limit:
+                    violations.append(Violation(
+                        'faculty_overload_daily', 'soft',
+                        faculty_id=faculty_id, day=day, magnitude=count, limit=limit
+                    ))
         
         return violations
     
@@ -243,26 +391,20 @@ class ConstraintChecker:
         violations = []
         
         # Group non-lab courses by course_id
-        theory_courses = {}
+        theory_courses = defaultdict(list)
         for entry in self.entries:
-            if not entry.faculty_course.course.is_lab:
-                if entry.faculty_course.course_id not in theory_courses:
-                    theory_courses[entry.faculty_course.course_id] = []
-                theory_courses[entry.faculty_course.course_id].append(entry.timeslot.day)
+            if not entry.is_lab:
+                theory_courses[entry.course_id].append(entry.day_index)
         
         for course_id, days in theory_courses.items():
             # Check for consecutive days with same course
-            day_order = {'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3, 'Friday': 4}
-            day_indices = sorted([day_order[d] for d in days])
+            day_indices = sorted(days)
             
             for i in range(len(day_indices) - 1):
                 if day_indices[i+1] - day_indices[i] == 1:
-                    course = Course.query.get(course_id)
-                    violations.append({
-                        'type': 'consecutive_days',
-                        'message': f"Course {course.code} on consecutive days",
-                        'severity': 'soft'
-                    })
+                    violations.append(Violation(
+                        'consecutive_days', 'soft', course_id=course_id
+                    ))
                     break
         
         return violations
@@ -272,10 +414,13 @@ class ConstraintChecker:
         violations = []
         
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+        entries_by_day = defaultdict(list)
+        for entry in self.entries:
+            entries_by_day[entry.day].append(entry)
         
         for day in days:
             # Get all periods with classes for this section on this day
-            day_entries = [e for e in self.entries if e.timeslot.day == day]
+            day_entries = entries_by_day[day]
             if len(day_entries) < 2:
                 continue
             
@@ -283,7 +428,7 @@ class ConstraintChecker:
             all_periods = set()
             for entry in day_entries:
                 if not entry.batch_id:  # Theory affects whole section
-                    all_periods.add(entry.timeslot.period)
+                    all_periods.add(entry.period)
             
             if not all_periods:
                 continue
@@ -295,17 +440,81 @@ class ConstraintChecker:
                 gap = periods[i+1] - periods[i]
                 # Gap > 1 and not crossing lunch
                 if gap > 1 and not (periods[i] <= 4 < periods[i+1]):
-                    violations.append({
-                        'type': 'schedule_gap',
-                        'message': f"Gap of {gap-1} periods on {day} between P{periods[i]} and P{periods[i+1]}",
-                        'severity': 'soft'
-                    })
+                    violations.append(Violation(
+                        'schedule_gap', 'soft',
+                        day=day, magnitude=gap - 1, periods=(periods[i], periods[i+1])
+                    ))
         
         return violations
+    
+    def check_time_of_day(self):
+        """SC5: Avoid penalised periods (e.g. last period) for theory classes"""
+        violations = []
+        
+        for entry in self.entries:
+            if self.penalties.component('time_of_day', entry.faculty_course_id, entry.timeslot_id):
+                violations.append(Violation(
+                    'time_of_day', 'soft', timeslot_id=entry.timeslot_id
+                ))
+        
+        return violations
+
+
+class InstitutionValidator:
+    """
+    Validates every section's timetable from a single load of the whole
+    timetable table; results are sliced per section.
+    """
+    
+    def __init__(self, scoring=None):
+        self.scoring = scoring or ScoringModel.from_config()
+        self.index = TimetableIndex(db.session.execute(entry_rows_query()).all())
+        self.timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
+        self.sections = {s.id: s for s in Section.query.all()}
+        
+        self.mappings = defaultdict(list)
+        for mapping in FacultyCourse.query.options(
+            db.joinedload(FacultyCourse.faculty),
+            db.joinedload(FacultyCourse.course)
+        ).all():
+            self.mappings[mapping.section_id].append(mapping)
+        
+        self._results = {}
+    
+    def checker(self, section_id):
+        """A ConstraintChecker for one section that shares this validator's data"""
+        section = self.sections.get(section_id)
+        penalties = self.scoring.compile_penalties(section, self.mappings[section_id], self.timeslots)
+        return ConstraintChecker(
+            section_id, self.scoring, penalties,
+            index=self.index, section=section, timeslots=self.timeslots
+        )
+    
+    def for_section(self, section_id):
+        """Violations and score for one section (same shape as ConstraintChecker.check_all)"""
+        if section_id not in self._results:
+            self._results[section_id] = self.checker(section_id).check_all()
+        return self._results[section_id]
+    
+    def validate(self, section_ids=None):
+        """section_id -> result for the given sections (default: every section with entries)"""
+        if section_ids is None:
+            section_ids = sorted(self.index.by_section)
+        return {section_id: self.for_section(section_id) for section_id in section_ids}
+    
+    def summary(self):
+        """Institution-wide violation counts"""
+        results = self.validate()
+        return {
+            'sections_checked': len(results),
+            'sections_with_conflicts': sum(1 for r in results.values() if r['hard']),
+            'hard_violations': sum(len(r['hard']) for r in results.values()),
+            'soft_violations': sum(len(r['soft']) for r in results.values())
+        }
 
 
-def calculate_fitness(section_id):
+def calculate_fitness(section_id, scoring=None, penalties=None):
     """Calculate fitness score for a timetable"""
-    checker = ConstraintChecker(section_id)
+    checker = ConstraintChecker(section_id, scoring, penalties)
     result = checker.check_all()
     return result['score'], result['hard'], result['soft']
@@ -4,7 +4,7 @@ from app.models import (
     Timetable, TimeSlot, Batch
 )
 from app import db
-import json
+from app.scheduler.cancellation import NEVER
 import random
 from collections import defaultdict
 
@@ -15,8 +15,9 @@ class CSPSolver:
     Uses backtracking with forward checking and MRV heuristic.
     """
     
-    def __init__(self, section_id):
+    def __init__(self, section_id, stop=None):
         self.section_id = section_id
+        self.stop = stop or NEVER
         self.section = Section.query.get(section_id)
         self.mappings = FacultyCourse.query.filter_by(section_id=section_id).all()
         # Load timeslots
@@ -35,6 +36,10 @@ class CSPSolver:
         self.room_schedule = defaultdict(set)     # room_id -> set of timeslot_ids
         self.section_schedule = defaultdict(set)  # batch_id/None -> set of timeslot_ids
         
+        # Search counters (for the run statistics)
+        self.nodes = 0
+        self.backtracks = 0
+        
         self._initialize_domains()
     
     def _initialize_domains(self):
@@ -53,14 +58,11 @@ class CSPSolver:
             return valid
         
         # Get faculty unavailable slots
-        unavailable = []
-        if mapping.faculty.unavailable_slots:
-            unavailable = json.loads(mapping.faculty.unavailable_slots)
+        unavailable = mapping.faculty.unavailable_mask
         
         for slot in self.timeslots:
             # Skip if faculty unavailable
-            slot_key = f"{slot.day}_{slot.period}"
-            if slot_key in unavailable:
+            if unavailable & slot.bit:
                 continue
             
             # For labs, must start at periods 1, 3, 5, 7
@@ -216,6 +218,10 @@ class CSPSolver:
         if not unassigned:
             return True  # All assigned successfully
         
+        # Cancellation / time limit checkpoint (raises GenerationStopped)
+        self.stop.check()
+        self.nodes += 1
+        
         # Select next variable (mapping) to assign
         mapping_id = unassigned[0]
         remaining = unassigned[1:]
@@ -229,6 +235,7 @@ class CSPSolver:
                     return True
                 
                 self._unassign(mapping_id)
+                self.backtracks += 1
         
         return False
     
@@ -266,11 +273,18 @@ class CSPSolver:
         return entries
 
 
-def generate_initial_solution(section_id):
+def generate_initial_solution(section_id, stop=None, stats=None):
     """Generate an initial valid timetable using CSP"""
-    solver = CSPSolver(section_id)
+    solver = CSPSolver(section_id, stop)
+    
+    try:
+        solved = solver.solve()
+    finally:
+        # Search counters, also when a stop cuts the search short
+        if stats is not None:
+            stats.record('csp', nodes=solver.nodes, backtracks=solver.backtracks)
     
-    if solver.solve():
+    if solved:
         return {
             'success': True,
             'entries': solver.get_solution()
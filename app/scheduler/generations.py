@@ -0,0 +1,115 @@
+"""Generations - Versioned section timetables: activation, rollback and retention
+
+Every generation run writes its rows under a new generation_id and, in the
+same commit, points Section.active_generation_id at it. Readers only see
+the active generation, so a run never blanks or half-replaces a timetable,
+and going back to an earlier generation is a pointer update. Older
+generations are kept up to GENERATION_RETENTION per section and then
+compacted away.
+"""
+from flask import current_app
+from app.models import Section, Timetable, GenerationLog
+from app import db
+from app.scheduler.occupancy import get_occupancy
+from collections import defaultdict
+from sqlalchemy import select, update, delete, func, tuple_
+
+
+def activate(section_id, generation_id):
+    """Point a section at a generation (part of the caller's transaction)"""
+    db.session.execute(
+        update(Section).where(Section.id == section_id).values(active_generation_id=generation_id)
+    )
+
+
+def active_generation(section_id, create=False):
+    """
+    The section's active generation id. With create, a section that has
+    none gets a new, empty generation activated (in the caller's transaction).
+    """
+    generation_id = db.session.execute(
+        select(Section.active_generation_id).where(Section.id == section_id)
+    ).scalar()
+    if generation_id is None and create:
+        generation_id = GenerationLog.generate_id()
+        activate(section_id, generation_id)
+    return generation_id
+
+
+def generations(section_id):
+    """The section's stored generations, newest first"""
+    active = active_generation(section_id)
+    rows = db.session.execute(
+        select(
+            Timetable.generation_id,
+            func.count(Timetable.id).label('entries'),
+            func.min(Timetable.created_at).label('created_at')
+        )
+        .where(Timetable.section_id == section_id)
+        .group_by(Timetable.generation_id)
+        .order_by(func.max(Timetable.id).desc())
+    )
+    return [{
+        'generation_id': row.generation_id,
+        'entries': row.entries,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'active': row.generation_id == active
+    } for row in rows]
+
+
+def rollback(section_id, generation_id=None):
+    """
+    Re-activate a stored generation, by default the newest one older than
+    the active one. Commits; returns the generation id now active.
+    """
+    stored = generations(section_id)
+    if generation_id is None:
+        positions = [i for i, g in enumerate(stored) if g['active']]
+        older = stored[positions[0] + 1:] if positions else stored
+        if not older:
+            raise ValueError("No earlier generation to roll back to")
+        generation_id = older[0]['generation_id']
+    elif generation_id not in {g['generation_id'] for g in stored}:
+        raise ValueError(f"Unknown generation {generation_id}")
+
+    activate(section_id, generation_id)
+    db.session.commit()
+    get_occupancy(load=False).refresh_section(section_id)
+    return generation_id
+
+
+def compact(section_id=None, keep=None):
+    """
+    Delete all but the newest `keep` generations of each section (default
+    GENERATION_RETENTION), counting the active one, which is always kept.
+    Commits; returns the number of entries removed.
+    """
+    keep = max(1, keep or current_app.config.get('GENERATION_RETENTION', 5))
+    active = dict(db.session.execute(select(Section.id, Section.active_generation_id)).all())
+
+    query = (
+        select(Timetable.section_id, Timetable.generation_id)
+        .group_by(Timetable.section_id, Timetable.generation_id)
+        .order_by(Timetable.section_id, func.max(Timetable.id).desc())
+    )
+    if section_id is not None:
+        query = query.where(Timetable.section_id == section_id)
+
+    kept = defaultdict(int)
+    doomed = []
+    for sid, generation_id in db.session.execute(query):
+        if generation_id == active.get(sid):
+            continue
+        # One place is reserved for the active generation
+        kept[sid] += 1
+        if kept[sid] > keep - (1 if active.get(sid) else 0):
+            doomed.append((sid, generation_id))
+
+    if not doomed:
+        return 0
+    removed = db.session.execute(
+        delete(Timetable).where(tuple_(Timetable.section_id, Timetable.generation_id).in_(doomed)),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    return removed
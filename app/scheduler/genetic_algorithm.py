@@ -4,8 +4,12 @@ from app.models import (
     Timetable, TimeSlot, Batch
 )
 from app import db
-from app.scheduler.constraints import calculate_fitness
+from app.scheduler.constraints import ConstraintChecker, CandidateIndex, entry_rows_query
 from app.scheduler.csp_solver import CSPSolver
+from app.scheduler.scoring import ScoringModel
+from app.scheduler.cancellation import GenerationStopped, NEVER
+from collections import namedtuple
+from sqlalchemy import select
 import random
 import copy
 from flask import current_app
@@ -20,40 +24,27 @@ class Chromosome:
         self.fitness = 0
         self.hard_violations = 0
         self.soft_violations = 0
+        self.hard_cost = float('inf')
+        self.soft_cost = float('inf')
     
-    def calculate_fitness(self):
-        """Calculate fitness score for this chromosome"""
-        # Temporarily save to database to check constraints
-        # This is a simplified approach - in production, use in-memory checking
-        
-        # Clear existing entries for this section
-        Timetable.query.filter_by(section_id=self.section_id).delete()
-        
-        # Add new entries from genes
-        for gene in self.genes:
-            mapping_id, slot_id, room_id, batch_id = gene
-            mapping = FacultyCourse.query.get(mapping_id)
-            
-            entry = Timetable(
-                generation_id='temp_gen_id',
-                section_id=self.section_id,
-                faculty_course_id=mapping.id,
-                room_id=room_id,
-                timeslot_id=slot_id,
-                batch_id=batch_id,
-                is_lab_slot=mapping.course.is_lab
-            )
-            db.session.add(entry)
-        
-        db.session.flush()
-        
-        # Calculate fitness
-        self.fitness, hard, soft = calculate_fitness(self.section_id)
-        self.hard_violations = len(hard)
-        self.soft_violations = len(soft)
-        
-        # Rollback the temporary entries
-        db.session.rollback()
+    @property
+    def rank_key(self):
+        """Lexicographic (hard, soft) cost - lower is better"""
+        return ScoringModel.rank_key(self.hard_cost, self.soft_cost)
+    
+    def calculate_fitness(self, scoring=None, penalties=None, context=None):
+        """
+        Calculate fitness score for this chromosome, in memory: the genes are
+        checked against the other sections' entries held by `context` (a
+        FitnessContext; loaded here when not given)
+        """
+        context = context or FitnessContext(self.section_id)
+        result = context.checker(self.genes, scoring, penalties).check_all()
+        self.fitness = result['score']
+        self.hard_cost = result['hard_cost']
+        self.soft_cost = result['soft_cost']
+        self.hard_violations = len(result['hard'])
+        self.soft_violations = len(result['soft'])
         
         return self.fitness
     
@@ -67,6 +58,8 @@ class Chromosome:
             entries.append({
                 'section_id': self.section_id,
                 'faculty_course_id': mapping.id,
+                'faculty_id': mapping.faculty_id,
+                'course_id': mapping.course_id,
                 'room_id': room_id,
                 'timeslot_id': slot_id,
                 'batch_id': batch_id,
@@ -76,21 +69,79 @@ class Chromosome:
         return entries
 
 
+GeneRow = namedtuple('GeneRow', [column.name for column in entry_rows_query().selected_columns])
+
+
+class FitnessContext:
+    """
+    Everything scoring a section's chromosomes needs besides the genes,
+    loaded once per run: the other sections' active entries (grouped in a
+    CandidateIndex) and, per mapping, timeslot and room, the fields the
+    constraint checks read. A chromosome's genes become entry rows of the
+    same shape as entry_rows_query's, so ConstraintChecker runs unchanged.
+    """
+    
+    def __init__(self, section_id, section=None, mappings=None, timeslots=None):
+        self.section_id = section_id
+        self.section = section or db.session.get(Section, section_id)
+        if mappings is None:
+            mappings = FacultyCourse.query.filter_by(section_id=section_id).all()
+        if timeslots is None:
+            timeslots = TimeSlot.query.order_by(TimeSlot.day_index, TimeSlot.period).all()
+        self.timeslots = timeslots
+        
+        self.index = CandidateIndex(section_id, db.session.execute(
+            entry_rows_query().where(Timetable.section_id != section_id)
+        ).all())
+        self.mappings = {m.id: (
+            m.faculty_id, m.course_id, m.course.is_lab, m.faculty.max_hours_per_day,
+            m.faculty.preferred_slots, m.faculty.unavailable_slots
+        ) for m in mappings}
+        self.slots = {t.id: (t.day, t.day_index, t.period) for t in timeslots}
+        self.room_capacity = dict(db.session.execute(select(Room.id, Room.capacity)).all())
+        self.batch_strength = {b.id: b.strength for b in self.section.batches}
+        self.section_strength = self.section.strength
+    
+    def rows(self, genes):
+        """Entry rows for a chromosome's genes"""
+        rows = []
+        for mapping_id, slot_id, room_id, batch_id in genes:
+            faculty_id, course_id, is_lab, max_hours, preferred, unavailable = self.mappings[mapping_id]
+            day, day_index, period = self.slots[slot_id]
+            rows.append(GeneRow(
+                None, self.section_id, mapping_id, slot_id, room_id, batch_id,
+                faculty_id, course_id, is_lab, day, day_index, period,
+                self.room_capacity.get(room_id), self.batch_strength.get(batch_id),
+                self.section_strength, max_hours, preferred, unavailable
+            ))
+        return rows
+    
+    def checker(self, genes, scoring=None, penalties=None):
+        """A ConstraintChecker for the section as the genes would schedule it"""
+        return ConstraintChecker(
+            self.section_id, scoring, penalties,
+            index=self.index.with_entries(self.rows(genes)),
+            section=self.section, timeslots=self.timeslots
+        )
+
+
 class GeneticAlgorithm:
     """Genetic Algorithm for optimizing timetables"""
     
-    def __init__(self, section_id, config=None):
+    def __init__(self, section_id, config=None, stop=None):
         self.section_id = section_id
         self.section = Section.query.get(section_id)
         
         # Configuration
         self.config = config or {}
+        self.stop = stop or NEVER  # checked before every fitness evaluation
         self.population_size = self.config.get('population_size', 50)
         self.max_generations = self.config.get('max_generations', 500)
         self.crossover_rate = self.config.get('crossover_rate', 0.85)
         self.mutation_rate = self.config.get('mutation_rate', 0.15)
         self.elitism_count = self.config.get('elitism_count', 2)
         self.tournament_size = self.config.get('tournament_size', 3)
+        self.target_soft_cost = self.config.get('target_soft_cost', 100)
         
         # Data
         self.mappings = FacultyCourse.query.filter_by(section_id=section_id).all()
@@ -99,9 +150,51 @@ class GeneticAlgorithm:
         self.classrooms = [r for r in self.rooms if not r.is_lab]
         self.labs = [r for r in self.rooms if r.is_lab]
         
+        # Scoring: weights from app config (overridable per run), soft slot
+        # penalties compiled once for the whole run
+        self.scoring = ScoringModel.from_config(self.config.get('scoring'))
+        self.penalties = self.scoring.compile_penalties(self.section, self.mappings, self.timeslots)
+        self.fitness_context = FitnessContext(section_id, self.section, self.mappings, self.timeslots)
+        
         self.population = []
         self.best_chromosome = None
         self.generation = 0
+        
+        # Fitness of gene sets already scored this run: elites and unchanged
+        # children come round every generation
+        self._fitness_cache = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+    
+    def evaluate(self, chromosome):
+        """Score a chromosome, reusing the result for genes scored before"""
+        self.stop.check()
+        key = tuple(chromosome.genes)
+        cached = self._fitness_cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            (chromosome.fitness, chromosome.hard_cost, chromosome.soft_cost,
+             chromosome.hard_violations, chromosome.soft_violations) = cached
+            return chromosome.fitness
+        
+        chromosome.calculate_fitness(self.scoring, self.penalties, self.fitness_context)
+        self.evaluations += 1
+        self._fitness_cache[key] = (
+            chromosome.fitness, chromosome.hard_cost, chromosome.soft_cost,
+            chromosome.hard_violations, chromosome.soft_violations
+        )
+        return chromosome.fitness
+    
+    def stats(self):
+        """Evaluation counters for the run statistics"""
+        lookups = self.evaluations + self.cache_hits
+        return {
+            'population_size': self.population_size,
+            'generations': self.generation,
+            'evaluations': self.evaluations,
+            'cache_hits': self.cache_hits,
+            'cache_hit_rate': round(self.cache_hits / lookups, 3) if lookups else None
+        }
     
     def initialize_population(self, initial_solution=None):
         """Initialize population with CSP-generated solutions"""
@@ -114,16 +207,17 @@ class GeneticAlgorithm:
         
         # Generate rest of population
         while len(self.population) < self.population_size:
+            self.stop.check()
             chromosome = self._generate_random_chromosome()
             if chromosome:
                 self.population.append(chromosome)
         
         # Calculate fitness for all
         for chromosome in self.population:
-            chromosome.calculate_fitness()
+            self.evaluate(chromosome)
         
-        # Sort by fitness
-        self.population.sort(key=lambda c: c.fitness, reverse=True)
+        # Sort by (hard, soft) cost
+        self.population.sort(key=lambda c: c.rank_key)
         self.best_chromosome = self.population[0]
     
     def _solution_to_chromosome(self, solution):
@@ -182,6 +276,10 @@ class GeneticAlgorithm:
                     if is_lab and slot.period not in [1, 3, 5, 7]:
                         continue
                     
+                    # Skip slots the faculty is unavailable for
+                    if mapping.faculty.unavailable_mask & slot.bit:
+                        continue
+                    
                     # Check constraints
                     faculty_id = mapping.faculty_id
                     batch_id = mapping.batch_id
@@ -224,6 +322,8 @@ class GeneticAlgorithm:
                         
                         if not next_slot:
                             continue
+                        if mapping.faculty.unavailable_mask & next_slot.bit:
+                            continue
                         if next_slot.id in used_slots['faculty'][faculty_id]:
                             continue
                         if next_slot.id in used_slots['room'][room.id]:
@@ -266,7 +366,7 @@ class GeneticAlgorithm:
     def select_parent(self):
         """Tournament selection"""
         tournament = random.sample(self.population, min(self.tournament_size, len(self.population)))
-        return max(tournament, key=lambda c: c.fitness)
+        return min(tournament, key=lambda c: c.rank_key)
     
     def crossover(self, parent1, parent2):
         """Single-point crossover"""
@@ -310,6 +410,9 @@ class GeneticAlgorithm:
                 if is_lab and new_slot.period not in [1, 3, 5, 7]:
                     # Keep original if invalid
                     pass
+                elif mapping.faculty.unavailable_mask & new_slot.bit:
+                    # Never mutate into a slot the faculty is unavailable for
+                    pass
                 else:
                     genes[idx] = (mapping_id, new_slot.id, new_room.id, batch_id)
         
@@ -338,31 +441,45 @@ class GeneticAlgorithm:
         
         # Calculate fitness
         for chromosome in self.population:
-            chromosome.calculate_fitness()
+            self.evaluate(chromosome)
         
-        # Sort by fitness
-        self.population.sort(key=lambda c: c.fitness, reverse=True)
+        # Sort by (hard, soft) cost
+        self.population.sort(key=lambda c: c.rank_key)
         
         # Update best
-        if self.population[0].fitness > self.best_chromosome.fitness:
+        if self.population[0].rank_key < self.best_chromosome.rank_key:
             self.best_chromosome = copy.deepcopy(self.population[0])
         
         self.generation += 1
     
     def run(self, initial_solution=None):
-        """Run the genetic algorithm"""
+        """
+        Run the genetic algorithm. Hitting the time limit ends the run with
+        the best chromosome so far (marked timed_out); cancellation, or the
+        time limit before the first population is scored, raises
+        GenerationStopped.
+        """
         self.initialize_population(initial_solution)
         
         no_improvement_count = 0
-        previous_best = self.best_chromosome.fitness
+        previous_best = self.best_chromosome.rank_key
+        timed_out = False
         
         for gen in range(self.max_generations):
-            self.evolve()
+            try:
+                self.evolve()
+            except GenerationStopped as e:
+                if e.reason != 'timed_out':
+                    raise
+                # The partly scored generation is dropped; best_chromosome
+                # only changes once a whole generation is sorted
+                timed_out = True
+                break
             
             # Check for improvement
-            if self.best_chromosome.fitness > previous_best:
+            if self.best_chromosome.rank_key < previous_best:
                 no_improvement_count = 0
-                previous_best = self.best_chromosome.fitness
+                previous_best = self.best_chromosome.rank_key
             else:
                 no_improvement_count += 1
             
@@ -376,7 +493,7 @@ class GeneticAlgorithm:
             }
             
             # Early stopping if perfect solution found
-            if self.best_chromosome.hard_violations == 0 and self.best_chromosome.fitness >= 900:
+            if self.best_chromosome.hard_cost == 0 and self.best_chromosome.soft_cost <= self.target_soft_cost:
                 break
             
             # Early stopping if no improvement for many generations
@@ -388,5 +505,6 @@ class GeneticAlgorithm:
             'generations': self.generation,
             'fitness': self.best_chromosome.fitness,
             'hard_violations': self.best_chromosome.hard_violations,
-            'soft_violations': self.best_chromosome.soft_violations
+            'soft_violations': self.best_chromosome.soft_violations,
+            'timed_out': timed_out
         }
@@ -7,9 +7,17 @@ from app.models import (
 from app import db
 from app.scheduler.csp_solver import CSPSolver, generate_initial_solution
 from app.scheduler.genetic_algorithm import GeneticAlgorithm
-from app.scheduler.constraints import ConstraintChecker
+from app.scheduler.constraints import ConstraintChecker, InstitutionValidator
+from app.scheduler.occupancy import get_occupancy
+from app.scheduler.generations import activate, compact
+from app.scheduler.cancellation import GenerationStopped, StopToken, NEVER
+from app.scheduler.stats import RunStats
+from flask import current_app
 import json
+import random
+import time
 from collections import defaultdict
+from sqlalchemy import update
 
 
 class HybridScheduler:
@@ -20,10 +28,18 @@ class HybridScheduler:
     3. Apply local search for fine-tuning
     """
     
-    def __init__(self, section_id, config=None):
+    def __init__(self, section_id, config=None, cancelled=None):
+        # Phase timings and solver counters, reported with the final event
+        self.stats = RunStats()
         self.section_id = section_id
         self.section = Section.query.get(section_id)
         self.config = config or {}
+        # Polled at the solvers' checkpoints; True stops the run (see
+        # app/scheduler/cancellation.py)
+        self.cancelled = cancelled
+        self.stop = NEVER
+        # Rows are saved under this id and activated only when the run succeeds
+        self.generation_id = self.config.get('generation_id') or GenerationLog.generate_id()
         
         # Validate section
         if not self.section:
@@ -73,19 +89,26 @@ class HybridScheduler:
     
     def generate(self):
         """Main generation method - yields progress updates"""
+        # A fixed seed makes the run repeatable (CSP value order, GA)
+        if self.config.get('seed') is not None:
+            random.seed(self.config['seed'])
+        
         # Validate prerequisites
-        errors = self.validate_prerequisites()
+        with self.stats.phase('prerequisites'):
+            errors = self.validate_prerequisites()
         if errors:
             yield {
                 'type': 'error',
                 'message': 'Prerequisites not met: ' + '; '.join(errors),
-                'errors': errors
+                'errors': errors,
+                'stats': self.stats.to_dict()
             }
             return
         
-        # Clear existing timetable for this section
-        Timetable.query.filter_by(section_id=self.section_id).delete()
-        db.session.commit()
+        # Wall-clock budget for the solve (CSP, GA, greedy fallback)
+        time_limit = self.config.get('time_limit_seconds', current_app.config.get('GA_TIME_LIMIT_SECONDS'))
+        self.stop = StopToken(time_limit, self.cancelled)
+        timed_out = False
         
         try:
             # Step 1: Generate initial solution using CSP
@@ -97,7 +120,8 @@ class HybridScheduler:
                 'message': f"Generating initial solution for section {self.section.name}..."
             }
             
-            csp_result = generate_initial_solution(self.section_id)
+            with self.stats.phase('csp'):
+                csp_result = generate_initial_solution(self.section_id, self.stop, self.stats)
             
             if csp_result['success']:
                 initial_entries = csp_result['entries']
@@ -113,42 +137,64 @@ class HybridScheduler:
                 use_ga = self.config.get('use_ga', True)
                 
                 if use_ga and len(initial_entries) > 5:
+                    ga_started = time.perf_counter()
                     ga = GeneticAlgorithm(
                         self.section_id,
                         config={
                             'population_size': self.config.get('population_size', 30),
                             'max_generations': self.config.get('max_generations', 200),
                             'crossover_rate': self.config.get('crossover_rate', 0.85),
-                            'mutation_rate': self.config.get('mutation_rate', 0.15)
-                        }
+                            'mutation_rate': self.config.get('mutation_rate', 0.15),
+                            'scoring': self.config.get('scoring')
+                        },
+                        stop=self.stop
                     )
                     
-                    # Run GA and consume progress updates
+                    # Run GA and consume progress updates, coalesced to one
+                    # per progress_interval seconds (latest generation wins)
                     ga_result = None
-                    for progress in ga.run(initial_entries):
-                        if 'best_chromosome' in progress and 'generation' not in progress:
-                             # This is the final result
-                             ga_result = progress
-                        else:
-                            # This is a progress update
-                            percent = 20 + int((progress['generation'] / ga.max_generations) * 70)
-                            yield {
-                                'type': 'progress',
-                                'progress': percent,
-                                'status': 'Optimizing',
-                                'substatus': f"Generation {progress['generation']}",
-                                'generation': progress['generation'],
-                                'fitness': progress['fitness'],
-                                'message': f"Gen {progress['generation']}: Fitness {progress['fitness']}"
-                            }
-                            # Keep track of last result in case loop finishes
-                            ga_result = progress
+                    progress_interval = self.config.get('progress_interval', 0)
+                    next_progress = 0.0
+                    try:
+                        for progress in ga.run(initial_entries):
+                            if 'best_chromosome' in progress and 'generation' not in progress:
+                                 # This is the final result
+                                 ga_result = progress
+                            else:
+                                # Keep track of last result in case loop finishes
+                                ga_result = progress
+                                now = time.monotonic()
+                                if now < next_progress:
+                                    continue
+                                next_progress = now + progress_interval
+                                
+                                # This is a progress update
+                                percent = 20 + int((progress['generation'] / ga.max_generations) * 70)
+                                yield {
+                                    'type': 'progress',
+                                    'progress': percent,
+                                    'status': 'Optimizing',
+                                    'substatus': f"Generation {progress['generation']}",
+                                    'generation': progress['generation'],
+                                    'fitness': progress['fitness'],
+                                    'message': f"Gen {progress['generation']}: Fitness {progress['fitness']}"
+                                }
+                    except GenerationStopped as e:
+                        # Out of time before the GA scored a population:
+                        # the CSP solution is the best so far
+                        if e.reason != 'timed_out':
+                            raise
+                        timed_out = True
+                        ga_result = None
+                    finally:
+                        self._record_ga(ga, ga_started)
                     
-                    # Use GA result if better
-                    if ga_result and ga_result['best_chromosome'].fitness > 0:
+                    # The CSP seed survives elitism, so the GA best is never worse
+                    if ga_result:
                         entries = ga_result['best_chromosome'].to_entries()
                         fitness = ga_result['fitness']
                         generations = ga_result['generations']
+                        timed_out = ga_result.get('timed_out', False)
                     else:
                         entries = initial_entries
                         fitness = 800  # Default for CSP solution
@@ -166,23 +212,24 @@ class HybridScheduler:
                     }
                 
                 # Step 3: Save to database
-                self._save_entries(entries)
+                with self.stats.phase('save'):
+                    self._save_entries(entries)
                 
                 # Step 4: Validate and get final stats
-                checker = ConstraintChecker(self.section_id)
-                validation = checker.check_all()
-                
                 self.result = {
                     'type': 'complete',
                     'success': True,
                     'message': 'Timetable generated successfully',
-                    'fitness_score': validation['score'],
                     'generations': generations,
-                    'hard_violations': len(validation['hard']),
-                    'soft_violations': len(validation['soft']),
                     'entries_count': len(entries),
-                    'section_id': self.section_id
+                    'section_id': self.section_id,
+                    'generation_id': self.generation_id
                 }
+                if timed_out:
+                    self.result['stopped'] = 'timed_out'
+                    self.result['message'] = 'Time limit reached; saved the best timetable found'
+                self.result.update(self._validate())
+                self.result['stats'] = self.stats.to_dict()
                 
                 yield self.result
                 
@@ -196,40 +243,77 @@ class HybridScheduler:
                     'message': "CSP failed, trying greedy approach..."
                 }
                 
-                greedy_result = self._greedy_schedule()
+                with self.stats.phase('greedy'):
+                    greedy_result = self._greedy_schedule()
                 
                 if greedy_result['success']:
-                    self._save_entries(greedy_result['entries'])
-                    
-                    checker = ConstraintChecker(self.section_id)
-                    validation = checker.check_all()
+                    with self.stats.phase('save'):
+                        self._save_entries(greedy_result['entries'])
                     
-                    yield {
+                    self.result = {
                         'type': 'complete',
                         'success': True,
                         'message': 'Timetable generated (greedy approach)',
-                        'fitness_score': validation['score'],
                         'generations': 0,
-                        'hard_violations': len(validation['hard']),
-                        'soft_violations': len(validation['soft']),
                         'entries_count': len(greedy_result['entries']),
-                        'section_id': self.section_id
+                        'section_id': self.section_id,
+                        'generation_id': self.generation_id
                     }
+                    self.result.update(self._validate())
+                    self.result['stats'] = self.stats.to_dict()
+                    
+                    yield self.result
                 else:
                     yield {
                         'type': 'error',
                         'success': False,
-                        'message': 'Could not generate a valid timetable. Please check constraints and try again.'
+                        'message': 'Could not generate a valid timetable. Please check constraints and try again.',
+                        'stats': self.stats.to_dict()
                     }
                 
+        except GenerationStopped as e:
+            db.session.rollback()
+            yield {
+                'type': 'error',
+                'success': False,
+                'stopped': e.reason,
+                'message': 'Generation cancelled' if e.reason == 'cancelled'
+                           else 'Time limit reached before a timetable was found',
+                'stats': self.stats.to_dict()
+            }
         except Exception as e:
             db.session.rollback()
             yield {
                 'type': 'error',
                 'success': False,
-                'message': f'Error during generation: {str(e)}'
+                'message': f'Error during generation: {str(e)}',
+                'stats': self.stats.to_dict()
             }
     
+    def _validate(self):
+        """
+        Final stats for the saved timetable. Batch runs pass validate=False
+        and validate all sections together afterwards.
+        """
+        if not self.config.get('validate', True):
+            return {'fitness_score': None, 'hard_violations': None, 'soft_violations': None}
+        
+        with self.stats.phase('validate'):
+            validation = ConstraintChecker(self.section_id).check_all()
+        return {
+            'fitness_score': validation['score'],
+            'hard_violations': len(validation['hard']),
+            'soft_violations': len(validation['soft'])
+        }
+    
+    def _record_ga(self, ga, started):
+        """GA phase time and evaluation counters, also for a stopped run"""
+        seconds = time.perf_counter() - started
+        self.stats.phases['ga'] = self.stats.phases.get('ga', 0.0) + seconds
+        counters = ga.stats()
+        counters['evaluations_per_second'] = round(counters['evaluations'] / seconds, 1) if seconds else None
+        self.stats.record('ga', **counters)
+    
     def _greedy_schedule(self):
         """Fallback greedy scheduling approach"""
         entries = []
@@ -243,10 +327,11 @@ class HybridScheduler:
         # Sort mappings: labs first (harder to schedule), then by weekly hours
         sorted_mappings = sorted(
             self.mappings,
-            key=lambda m: (not m.course.is_lab, -m.course.weekly_hours)
+            key=lambda m: (not m.course.is_lab, -m.course.total_hours_per_week)
         )
         
         for mapping in sorted_mappings:
+            self.stop.check()
             hours = self._get_required_hours(mapping)
             is_lab = mapping.course.is_lab
             available_rooms = self.labs if is_lab else self.classrooms
@@ -286,6 +371,8 @@ class HybridScheduler:
                     entry = {
                         'section_id': self.section_id,
                         'faculty_course_id': mapping.id,
+                        'faculty_id': mapping.faculty_id,
+                        'course_id': mapping.course_id,
                         'room_id': room.id,
                         'timeslot_id': slot.id,
                         'batch_id': mapping.batch_id,
@@ -319,6 +406,8 @@ class HybridScheduler:
     def _is_slot_free(self, mapping, slot, room, used_slots):
         """Check if slot is available for this mapping"""
         # Faculty check
+        if mapping.faculty.unavailable_mask & slot.bit:
+            return False
         if slot.id in used_slots['faculty'][mapping.faculty_id]:
             return False
         
@@ -353,14 +442,99 @@ class HybridScheduler:
             used_slots['section'].add(slot.id)
     
     def _save_entries(self, entries):
-        """Save entries to database"""
-        generation_id = GenerationLog.generate_id()
+        """
+        Save entries to database as one batched insert. Lab blocks are paired
+        up in memory; both periods get linked_slot_id pointing at the other
+        (set by a second batched update) and the second is flagged
+        is_second_slot. The new generation becomes the section's active one
+        in the same commit; older ones are then compacted to the retention
+        limit.
+        """
+        generation_id = self.generation_id
+        slots = {t.id: t for t in self.timeslots}
+        
+        # GA/greedy entries carry the mapping id; CSP solutions identify the
+        # mapping by course, faculty and batch
+        by_id = {m.id: m for m in self.mappings}
+        by_key = {}
+        for m in self.mappings:
+            by_key.setdefault((m.course_id, m.faculty_id, m.batch_id), m)
+        
+        rows = []
         for entry_data in entries:
-            entry_data['generation_id'] = generation_id
-            entry = Timetable(**entry_data)
-            db.session.add(entry)
+            mapping = by_id.get(entry_data.get('faculty_course_id')) or by_key.get(
+                (entry_data.get('course_id'), entry_data.get('faculty_id'), entry_data.get('batch_id'))
+            )
+            if not mapping:
+                continue
+            
+            rows.append({
+                'generation_id': generation_id,
+                'section_id': self.section_id,
+                'faculty_course_id': mapping.id,
+                'faculty_id': mapping.faculty_id,
+                'course_id': mapping.course_id,
+                'room_id': entry_data['room_id'],
+                'timeslot_id': entry_data['timeslot_id'],
+                'batch_id': entry_data.get('batch_id'),
+                'is_lab_slot': mapping.course.is_lab,
+                'is_second_slot': False
+            })
+        
+        pairs = lab_pairs(rows, slots)
+        for _, second in pairs:
+            rows[second]['is_second_slot'] = True
+        
+        if rows:
+            table = Timetable.__table__
+            ids = db.session.execute(
+                table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            # Links need the ids the database hands out, so they go in a
+            # second executemany over the lab rows only, in the same
+            # transaction. Picking ids up front (max(id) + n) would race
+            # other writers between the read and the insert.
+            if pairs:
+                db.session.execute(update(Timetable), [
+                    {'id': ids[a], 'linked_slot_id': ids[b]}
+                    for first, second in pairs
+                    for a, b in ((first, second), (second, first))
+                ])
         
+        activate(self.section_id, generation_id)
         db.session.commit()
+        compact(self.section_id)
+        self._occupancy_changed()
+    
+    def _occupancy_changed(self):
+        """Bring the live occupancy index in line with this section's saved entries"""
+        occupancy = get_occupancy(load=False)
+        if occupancy is not None:
+            occupancy.refresh_section(self.section_id)
+
+
+def lab_pairs(rows, slots):
+    """
+    (first, second) indexes of the two-period lab blocks among timetable
+    rows: consecutive periods of the same mapping and batch on one day.
+    """
+    blocks = defaultdict(list)
+    for i, row in enumerate(rows):
+        slot = slots.get(row['timeslot_id'])
+        if row['is_lab_slot'] and slot:
+            blocks[(row['faculty_course_id'], row['batch_id'], slot.day_index)].append((slot.period, i))
+    
+    pairs = []
+    for periods in blocks.values():
+        periods.sort()
+        k = 0
+        while k + 1 < len(periods):
+            if periods[k + 1][0] == periods[k][0] + 1:
+                pairs.append((periods[k][1], periods[k + 1][1]))
+                k += 2
+            else:
+                k += 1
+    return pairs
 
 
 def schedule_all_sections(sections=None):
@@ -370,7 +544,8 @@ def schedule_all_sections(sections=None):
     
     results = []
     for section in sections:
-        scheduler = HybridScheduler(section.id)
+        # Sections are validated together once all of them are saved
+        scheduler = HybridScheduler(section.id, {'validate': False})
         # Consume generator to get final result
         result = None
         for progress in scheduler.generate():
@@ -380,4 +555,14 @@ def schedule_all_sections(sections=None):
             result['section'] = {'id': section.id, 'name': section.name, 'semester': section.semester}
             results.append(result)
     
+    # Single-pass validation of the whole institution; cross-section
+    # conflicts only show up once every section has been saved
+    validator = InstitutionValidator()
+    for result in results:
+        if result.get('success'):
+            validation = validator.for_section(result['section']['id'])
+            result['fitness_score'] = validation['score']
+            result['hard_violations'] = len(validation['hard'])
+            result['soft_violations'] = len(validation['soft'])
+    
     return results
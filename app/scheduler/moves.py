@@ -0,0 +1,89 @@
+"""Move Evaluator - Read-only what-if evaluation of timetable moves and swaps"""
+from app.scheduler.violations import render_violations
+from collections import Counter
+
+
+class MoveEvaluator:
+    """
+    Scores proposed moves against the live occupancy index without touching
+    the database. A move relocates one entry to another timeslot (and
+    optionally another room); a swap is two moves.
+    """
+    
+    def __init__(self, occupancy):
+        self.occupancy = occupancy
+    
+    def _entry(self, entry_id):
+        row = self.occupancy.entries.get(entry_id)
+        if row is None:
+            raise ValueError(f"Unknown timetable entry {entry_id}")
+        return row
+    
+    def swap(self, entry_a, entry_b):
+        """Moves that exchange the slots and rooms of two entries"""
+        a, b = self._entry(entry_a), self._entry(entry_b)
+        return [
+            {'entry_id': a.id, 'timeslot_id': b.timeslot_id, 'room_id': b.room_id},
+            {'entry_id': b.id, 'timeslot_id': a.timeslot_id, 'room_id': a.room_id}
+        ]
+    
+    def _relocate(self, move):
+        """The entry row as it would read after the move"""
+        row = self._entry(move.get('entry_id'))
+        return self.occupancy.relocated(row, move.get('timeslot_id'), move.get('room_id'))
+    
+    def evaluate(self, moves):
+        """
+        Compare the affected sections before and after the moves. Returns the
+        hard violations the moves would introduce or resolve and the change
+        in hard cost, soft cost and display score.
+        """
+        _check_moves(moves)
+        moved = {}
+        for move in moves:
+            row = self._relocate(move)
+            moved[row.id] = row
+        if not moved:
+            raise ValueError("No moves given")
+        
+        view = self.occupancy.with_moves(moved)
+        before_hard, after_hard = Counter(), Counter()
+        delta = {'hard_cost': 0.0, 'soft_cost': 0.0, 'score': 0.0}
+        
+        for section_id in sorted({row.section_id for row in moved.values()}):
+            before = self.occupancy.checker(section_id).check_all()
+            after = self.occupancy.checker(section_id, index=view).check_all()
+            
+            before_hard.update(before['hard'])
+            after_hard.update(after['hard'])
+            for key in delta:
+                delta[key] += after[key] - before[key]
+        
+        introduced = list((after_hard - before_hard).elements())
+        resolved = list((before_hard - after_hard).elements())
+        names = self.occupancy.names
+        return {
+            'allowed': not introduced,
+            'hard_reasons': [v['message'] for v in render_violations(introduced, names)],
+            'resolved': [v['message'] for v in render_violations(resolved, names)],
+            'hard_delta': delta['hard_cost'],
+            'soft_delta': delta['soft_cost'],
+            'score_delta': delta['score']
+        }
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_moves(moves):
+    """Moves must be a list of {entry_id, timeslot_id, room_id (optional)} with integer ids"""
+    if not isinstance(moves, list):
+        raise ValueError("moves must be a list")
+    for move in moves:
+        if not isinstance(move, dict):
+            raise ValueError("Each move must be an object with entry_id and timeslot_id")
+        if not (_is_id(move.get('entry_id')) and _is_id(move.get('timeslot_id'))):
+            raise ValueError("Each move needs integer entry_id and timeslot_id")
+        if move.get('room_id') is not None and not _is_id(move['room_id']):
+            raise ValueError("room_id must be an integer")
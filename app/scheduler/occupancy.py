@@ -0,0 +1,507 @@
+"""Occupancy Index - Process-wide, incrementally maintained timetable occupancy"""
+from flask import current_app, has_app_context, g
+from app.models import Section, Course, Faculty, Room, FacultyCourse, Timetable, TimeSlot, Batch
+from app.models.timeslot import slot_bit
+from app import db
+from app.scheduler.constraints import entry_rows_query, ConstraintChecker
+from app.scheduler.violations import EntityNames
+from app.scheduler.scoring import ScoringModel
+from app.database import RoutingSession
+from collections import defaultdict, namedtuple
+from types import SimpleNamespace
+from sqlalchemy import select, update, event, or_, and_
+from sqlalchemy.orm import aliased
+import threading
+
+
+SlotInfo = namedtuple('SlotInfo', 'id day day_index period bit')
+
+# One-row counter bumped by every transaction that writes timetable entries
+# or the data they are read with, so each process can tell whether its
+# index still matches the database
+occupancy_version = db.Table(
+    'occupancy_version',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0)
+)
+
+# Writes to these invalidate occupancy indexes in other processes
+TRACKED_MODELS = (Timetable, Section, Course, Faculty, Room, FacultyCourse, TimeSlot, Batch)
+TRACKED_TABLES = {model.__tablename__ for model in TRACKED_MODELS}
+
+
+def current_version():
+    """The database's occupancy version"""
+    return db.session.execute(select(occupancy_version.c.version)).scalar() or 0
+
+
+class OccupancyIndex:
+    """
+    In-memory occupancy of the timetable table, keyed the way conflict checks
+    ask: faculty x slot, room x slot, section/batch x slot and faculty x day.
+    
+    Built once from the database, then patched by the code paths that write
+    timetable entries. Edits to related data (faculty, rooms, mappings, ...)
+    invalidate it and it is rebuilt on next use. Every writing transaction
+    bumps the database's occupancy version; the index remembers the version
+    it matches and is rebuilt when it finds the database at another one, so
+    writes made by other processes (generation workers, other web workers)
+    are seen on their next check. A process's own commit only advances the
+    index's version once the write path has patched it in, and only if no
+    other write came in between.
+    """
+    
+    def __init__(self):
+        self.version = None
+        self._lock = threading.RLock()
+        self._committed = threading.local()  # this thread's last committed version
+        self._clear()
+    
+    def _clear(self):
+        self.entries = {}                       # entry id -> row
+        self.by_section = defaultdict(set)      # section_id -> entry ids
+        self.by_slot = defaultdict(set)         # timeslot_id -> entry ids
+        self.faculty_slots = defaultdict(set)   # (faculty_id, timeslot_id) -> entry ids
+        self.room_slots = defaultdict(set)      # (room_id, timeslot_id) -> entry ids
+        self.group_slots = defaultdict(set)     # (section_id, batch_id, timeslot_id) -> entry ids
+        self.faculty_days = defaultdict(lambda: defaultdict(int))  # faculty_id -> day -> periods
+        self.faculty_limits = {}
+        self.slots = {}                         # timeslot_id -> SlotInfo
+        self.slots_by_key = {}                  # (day, period) -> SlotInfo
+        self.room_capacity = {}                 # room_id -> capacity
+        self.names = EntityNames()              # cached display names for rendering
+        self._penalties = {}                    # section_id -> PenaltyTensor
+        self._derived = {}                      # key -> (version, value), see derived()
+    
+    # ------------------------------------------------------------------
+    # Loading and maintenance
+    # ------------------------------------------------------------------
+    
+    @property
+    def loaded(self):
+        return self.version is not None
+    
+    def ensure_loaded(self):
+        """Build the index if it has never been built or the database has moved on"""
+        with self._lock:
+            if not self.loaded or self.version != current_version():
+                self._rebuild()
+        return self
+    
+    def _rebuild(self):
+        self._clear()
+        # Read before the entries: a write landing in between only costs
+        # another rebuild
+        version = current_version()
+        self.scoring = ScoringModel.from_config()
+        self.room_capacity = dict(db.session.execute(select(Room.id, Room.capacity)).all())
+        for slot in db.session.execute(
+            select(TimeSlot.id, TimeSlot.day, TimeSlot.day_index, TimeSlot.period)
+            .order_by(TimeSlot.day_index, TimeSlot.period)
+        ):
+            info = SlotInfo(slot.id, slot.day, slot.day_index, slot.period,
+                            slot_bit(slot.day_index, slot.period))
+            self.slots[info.id] = info
+            self.slots_by_key[(info.day, info.period)] = info
+        
+        for row in db.session.execute(entry_rows_query()):
+            self._add(row)
+        self.version = version
+    
+    def invalidate(self):
+        """Drop everything; the next reader rebuilds from the database"""
+        with self._lock:
+            self._clear()
+            self.version = None
+    
+    def committed(self, version):
+        """Record the version this thread's commit moved the database to"""
+        self._committed.version = version
+    
+    def _patched(self):
+        """
+        Called once a write path has patched in its commit: the index now
+        matches that commit's version if it matched the one just before.
+        """
+        version = getattr(self._committed, 'version', None)
+        self._committed.version = None
+        if version is not None and self.loaded and version == self.version + 1:
+            self.version = version
+    
+    def _add(self, row):
+        self.entries[row.id] = row
+        self.by_section[row.section_id].add(row.id)
+        self.by_slot[row.timeslot_id].add(row.id)
+        self.faculty_slots[(row.faculty_id, row.timeslot_id)].add(row.id)
+        if row.room_id:
+            self.room_slots[(row.room_id, row.timeslot_id)].add(row.id)
+        self.group_slots[(row.section_id, row.batch_id, row.timeslot_id)].add(row.id)
+        self.faculty_days[row.faculty_id][row.day] += 1
+        self.faculty_limits[row.faculty_id] = row.max_hours_per_day
+    
+    def _remove(self, entry_id):
+        row = self.entries.pop(entry_id, None)
+        if row is None:
+            return
+        
+        for groups, key in (
+            (self.by_section, row.section_id),
+            (self.by_slot, row.timeslot_id),
+            (self.faculty_slots, (row.faculty_id, row.timeslot_id)),
+            (self.room_slots, (row.room_id, row.timeslot_id)),
+            (self.group_slots, (row.section_id, row.batch_id, row.timeslot_id))
+        ):
+            ids = groups.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del groups[key]
+        
+        days = self.faculty_days[row.faculty_id]
+        days[row.day] -= 1
+        if days[row.day] <= 0:
+            del days[row.day]
+    
+    def _load(self, *criteria):
+        for row in db.session.execute(entry_rows_query().where(*criteria)):
+            self._add(row)
+    
+    def refresh_entries(self, entry_ids):
+        """Re-read the given entries after they were inserted or changed"""
+        entry_ids = list(entry_ids)
+        with self._lock:
+            if not self.loaded:
+                return
+            if entry_ids:
+                for entry_id in entry_ids:
+                    self._remove(entry_id)
+                self._load(Timetable.id.in_(entry_ids))
+            self._patched()
+    
+    def remove_entries(self, entry_ids):
+        """Forget deleted entries"""
+        with self._lock:
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            self._patched()
+    
+    def refresh_section(self, section_id):
+        """Replace a section's entries after its timetable was regenerated"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self.remove_section(section_id)
+            self._load(Timetable.section_id == section_id)
+            self._patched()
+    
+    def remove_section(self, section_id):
+        """Forget a section's entries after its timetable was deleted"""
+        with self._lock:
+            for entry_id in list(self.by_section.get(section_id, ())):
+                self._remove(entry_id)
+            self._patched()
+    
+    # ------------------------------------------------------------------
+    # Queries (same interface as constraints.TimetableIndex)
+    # ------------------------------------------------------------------
+    
+    def _rows(self, ids):
+        return sorted((self.entries[i] for i in ids), key=lambda r: r.id)
+    
+    def section_entries(self, section_id):
+        with self._lock:
+            return self._rows(self.by_section.get(section_id, ()))
+    
+    def _clashes_for(self, groups, section_id, key_of):
+        with self._lock:
+            clashes = {}
+            for entry_id in self.by_section.get(section_id, ()):
+                key = key_of(self.entries[entry_id])
+                ids = groups.get(key, ())
+                if len(ids) > 1 and key not in clashes:
+                    clashes[key] = self._rows(ids)
+            return sorted(clashes.items(), key=lambda item: item[0])
+    
+    def faculty_clashes_for(self, section_id):
+        """[(faculty_id, timeslot_id), rows] for clashes involving the section"""
+        return self._clashes_for(self.faculty_slots, section_id,
+                                 lambda r: (r.faculty_id, r.timeslot_id))
+    
+    def room_clashes_for(self, section_id):
+        """[(room_id, timeslot_id), rows] for clashes involving the section"""
+        return self._clashes_for(self.room_slots, section_id,
+                                 lambda r: (r.room_id, r.timeslot_id))
+    
+    def faculty_day_load(self, faculty_id):
+        with self._lock:
+            return dict(self.faculty_days.get(faculty_id, {}))
+    
+    def faculty_limit(self, faculty_id):
+        return self.faculty_limits.get(faculty_id)
+    
+    def slot(self, timeslot_id):
+        return self.slots.get(timeslot_id)
+    
+    def slot_at(self, day, period):
+        return self.slots_by_key.get((day, period))
+    
+    def slot_list(self):
+        """All timeslots in day/period order"""
+        return list(self.slots.values())
+    
+    def penalties(self, section_id):
+        """Soft-penalty tensor for a section under the app's scoring model (cached)"""
+        with self._lock:
+            tensor = self._penalties.get(section_id)
+            if tensor is None:
+                mappings = FacultyCourse.query.filter_by(section_id=section_id).options(
+                    db.joinedload(FacultyCourse.faculty),
+                    db.joinedload(FacultyCourse.course)
+                ).all()
+                tensor = self.scoring.compile_penalties(
+                    db.session.get(Section, section_id), mappings, self.slot_list()
+                )
+                self._penalties[section_id] = tensor
+            return tensor
+    
+    def derived(self, key, compute):
+        """
+        A value computed from the whole timetable (e.g. the dashboard's
+        validation summary), cached until the index moves to another version
+        """
+        with self._lock:
+            version = self.version
+            cached = self._derived.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        value = compute()
+        with self._lock:
+            if self.version == version:
+                self._derived[key] = (version, value)
+        return value
+    
+    def checker(self, section_id, index=None):
+        """ConstraintChecker for a section that reads only from this index"""
+        return ConstraintChecker(
+            section_id, self.scoring, self.penalties(section_id),
+            index=index or self, timeslots=self.slot_list()
+        )
+    
+    def relocated(self, row, timeslot_id, room_id=None):
+        """A copy of an entry row as it would read at another slot (and room)"""
+        slot = self.slot(timeslot_id)
+        if slot is None:
+            raise ValueError(f"Unknown timeslot {timeslot_id}")
+        room_id = room_id or row.room_id
+        if room_id not in self.room_capacity:
+            raise ValueError(f"Unknown room {room_id}")
+        
+        fields = row._asdict() if hasattr(row, '_asdict') else dict(vars(row))
+        fields.update(
+            timeslot_id=slot.id, day=slot.day, day_index=slot.day_index, period=slot.period,
+            room_id=room_id, room_capacity=self.room_capacity[room_id]
+        )
+        return SimpleNamespace(**fields)
+    
+    def with_moves(self, moved):
+        """Read-only view with entries relocated ({entry_id: replacement row})"""
+        return MovedOccupancy(self, moved)
+    
+    def booked_rooms(self, timeslot_id, ignore=()):
+        """Room ids in use at a timeslot"""
+        with self._lock:
+            return {self.entries[i].room_id for i in self.by_slot.get(timeslot_id, ())
+                    if i not in ignore}
+    
+    def placement_conflicts(self, section_id, timeslot_id, faculty_id, room_id,
+                            batch_id=None, ignore=()):
+        """
+        Which resources are already taken for a proposed class, as a list of
+        'faculty', 'room', 'section' and 'batch'. Entries in `ignore` (e.g.
+        the ones being moved) are treated as absent.
+        """
+        def taken(groups, key):
+            return any(i not in ignore for i in groups.get(key, ()))
+        
+        with self._lock:
+            conflicts = []
+            if taken(self.faculty_slots, (faculty_id, timeslot_id)):
+                conflicts.append('faculty')
+            if room_id and taken(self.room_slots, (room_id, timeslot_id)):
+                conflicts.append('room')
+            if batch_id:
+                if taken(self.group_slots, (section_id, batch_id, timeslot_id)):
+                    conflicts.append('batch')
+            elif taken(self.group_slots, (section_id, None, timeslot_id)):
+                conflicts.append('section')
+            return conflicts
+
+
+class MovedOccupancy:
+    """
+    An OccupancyIndex as it would look with some entries relocated. Nothing
+    is copied; lookups consult the index and patch in the moved rows.
+    """
+    
+    def __init__(self, index, moved):
+        self.index = index
+        self.moved = moved  # entry id -> replacement row
+    
+    def section_entries(self, section_id):
+        return [self.moved.get(row.id, row) for row in self.index.section_entries(section_id)]
+    
+    def _group(self, groups, key, key_of):
+        with self.index._lock:
+            rows = [self.index.entries[i] for i in groups.get(key, ()) if i not in self.moved]
+        rows.extend(row for row in self.moved.values() if key_of(row) == key)
+        return sorted(rows, key=lambda r: r.id)
+    
+    def _clashes_for(self, groups, section_id, key_of):
+        clashes = {}
+        for row in self.section_entries(section_id):
+            key = key_of(row)
+            if key not in clashes:
+                clashes[key] = self._group(groups, key, key_of)
+        return sorted(((k, rows) for k, rows in clashes.items() if len(rows) > 1),
+                      key=lambda item: item[0])
+    
+    def faculty_clashes_for(self, section_id):
+        return self._clashes_for(self.index.faculty_slots, section_id,
+                                 lambda r: (r.faculty_id, r.timeslot_id))
+    
+    def room_clashes_for(self, section_id):
+        return self._clashes_for(self.index.room_slots, section_id,
+                                 lambda r: (r.room_id, r.timeslot_id))
+    
+    def faculty_day_load(self, faculty_id):
+        load = self.index.faculty_day_load(faculty_id)
+        for entry_id, row in self.moved.items():
+            original = self.index.entries[entry_id]
+            if original.faculty_id == faculty_id:
+                load[original.day] -= 1
+            if row.faculty_id == faculty_id:
+                load[row.day] = load.get(row.day, 0) + 1
+        return {day: count for day, count in load.items() if count > 0}
+    
+    def faculty_limit(self, faculty_id):
+        return self.index.faculty_limit(faculty_id)
+
+
+def get_occupancy(load=True):
+    """
+    The current app's occupancy index (None outside an app context). With
+    load, it is built if needed and checked against the database version
+    once per app context (i.e. per request).
+    """
+    if not has_app_context():
+        return None
+    index = current_app.extensions.get('occupancy')
+    if index is not None and load and (not index.loaded or not g.get('occupancy_checked')):
+        index.ensure_loaded()
+        g.occupancy_checked = True
+    return index
+
+
+def entry_clashes(entry_ids):
+    """
+    Active entries that share a faculty, room or section/batch slot with any
+    of the given ones, read from the database inside the caller's
+    transaction: [(entry_id, other_id, reason)] with reason 'faculty',
+    'room', 'section' or 'batch' (as in placement_conflicts). Write paths
+    run it after their writes and before commit, when the transaction holds
+    the write lock, so it also sees what other processes committed after
+    the index was last checked.
+    """
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return []
+    entry, other = aliased(Timetable), aliased(Timetable)
+    entry_section, other_section = aliased(Section), aliased(Section)
+    rows = db.session.execute(
+        select(
+            entry.id, other.id.label('other_id'), entry.batch_id,
+            (other.faculty_id == entry.faculty_id).label('faculty'),
+            (other.room_id == entry.room_id).label('room'),
+            ((other.section_id == entry.section_id)
+             & other.batch_id.is_not_distinct_from(entry.batch_id)).label('group')
+        )
+        .join(entry_section, (entry_section.id == entry.section_id)
+              & (entry_section.active_generation_id == entry.generation_id))
+        .join(other, (other.timeslot_id == entry.timeslot_id) & (other.id != entry.id))
+        .join(other_section, (other_section.id == other.section_id)
+              & (other_section.active_generation_id == other.generation_id))
+        .where(
+            entry.id.in_(entry_ids),
+            or_(other.faculty_id == entry.faculty_id,
+                and_(entry.room_id.is_not(None), other.room_id == entry.room_id),
+                and_(other.section_id == entry.section_id,
+                     other.batch_id.is_not_distinct_from(entry.batch_id)))
+        )
+        .order_by(entry.id, other.id)
+    )
+    clashes = []
+    for row in rows:
+        for reason, clash in (('faculty', row.faculty), ('room', row.room),
+                              ('batch' if row.batch_id else 'section', row.group)):
+            if clash:
+                clashes.append((row.id, row.other_id, reason))
+    return clashes
+
+
+def _invalidate_occupancy(mapper, connection, target):
+    index = get_occupancy(load=False)
+    if index is not None:
+        index.invalidate()
+
+
+def _bump_version(session):
+    """Bump the database's occupancy version, once per transaction"""
+    if 'occupancy_version' not in session.info:
+        session.info['occupancy_version'] = session.execute(
+            update(occupancy_version)
+            .values(version=occupancy_version.c.version + 1)
+            .returning(occupancy_version.c.version)
+        ).scalar()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, TRACKED_MODELS) for obj in changed):
+        _bump_version(session)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executing(state):
+    # Core-style INSERT/UPDATE/DELETE run through the session
+    table = getattr(state.statement, 'table', None)
+    if (state.is_insert or state.is_update or state.is_delete) \
+            and getattr(table, 'name', None) in TRACKED_TABLES:
+        _bump_version(state.session)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _publish_version(session):
+    version = session.info.pop('occupancy_version', None)
+    index = get_occupancy(load=False)
+    if version is not None and index is not None:
+        index.committed(version)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _forget_version(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('occupancy_version', None)
+
+
+def init_occupancy(app):
+    """Attach an occupancy index to the app"""
+    app.extensions['occupancy'] = OccupancyIndex()
+    
+    # Entry rows carry faculty limits/preferences, capacities and strengths,
+    # and cached penalties/names depend on mappings, so changes to any of
+    # these rebuild the index
+    for model in (Section, Course, Faculty, Room, FacultyCourse, TimeSlot, Batch):
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            if not db.event.contains(model, event_name, _invalidate_occupancy):
+                db.event.listen(model, event_name, _invalidate_occupancy)
@@ -0,0 +1,161 @@
+"""Scoring Model - Weighted hard/soft penalties and precompiled soft-penalty tensors"""
+from flask import current_app, has_app_context
+import numpy as np
+
+
+# Default weight per violation type. Hard and soft costs are kept apart and
+# compared lexicographically, so a hard weight only orders hard violations
+# among themselves.
+DEFAULT_WEIGHTS = {
+    # Hard constraints
+    'faculty_conflict': 1.0,
+    'room_conflict': 1.0,
+    'section_conflict': 1.0,
+    'lab_not_consecutive': 1.0,
+    'faculty_unavailable': 1.0,
+    'room_capacity': 1.0,
+    # Soft constraints
+    'not_preferred_slot': 10.0,
+    'faculty_overload_daily': 10.0,
+    'consecutive_days': 10.0,
+    'schedule_gap': 10.0,
+    'time_of_day': 10.0,
+}
+
+# Display score: base_score - hard_scale * hard_cost - soft_cost (never clamped)
+DEFAULT_BASE_SCORE = 1000.0
+DEFAULT_HARD_SCALE = 100.0
+
+
+class ScoringModel:
+    """
+    Configurable weighting model for timetable violations.
+
+    Solutions are ranked by (hard_cost, soft_cost), lower is better; the
+    scalar score is only used for display and progress reporting.
+    """
+
+    def __init__(self, weights=None, time_of_day=None, section_time_of_day=None,
+                 base_score=DEFAULT_BASE_SCORE, hard_scale=DEFAULT_HARD_SCALE):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        # period -> penalty units for theory classes, optionally per section code
+        self.time_of_day = {int(p): float(v) for p, v in (time_of_day or {}).items()}
+        self.section_time_of_day = {
+            code: {int(p): float(v) for p, v in periods.items()}
+            for code, periods in (section_time_of_day or {}).items()
+        }
+        self.base_score = float(base_score)
+        self.hard_scale = float(hard_scale)
+
+    @classmethod
+    def from_config(cls, overrides=None):
+        """Build a model from app config, optionally overridden by a solver config dict"""
+        settings = {}
+        if has_app_context():
+            app_config = current_app.config
+            settings = {
+                'weights': dict(app_config.get('SCORING_WEIGHTS') or {}),
+                'time_of_day': dict(app_config.get('SCORING_TIME_OF_DAY') or {}),
+                'section_time_of_day': dict(app_config.get('SCORING_SECTION_TIME_OF_DAY') or {}),
+                'base_score': app_config.get('SCORING_BASE_SCORE', DEFAULT_BASE_SCORE),
+                'hard_scale': app_config.get('SCORING_HARD_SCALE', DEFAULT_HARD_SCALE)
+            }
+
+        overrides = overrides or {}
+        for key in ('weights', 'time_of_day', 'section_time_of_day'):
+            if overrides.get(key):
+                settings.setdefault(key, {}).update(overrides[key])
+        for key in ('base_score', 'hard_scale'):
+            if key in overrides:
+                settings[key] = overrides[key]
+
+        return cls(**settings)
+
+    def weight(self, violation_type):
+        """Weight for a violation type (unknown types count as 1)"""
+        return self.weights.get(violation_type, 1.0)
+
+    def cost(self, violations):
+        """Weighted cost of a list of violations"""
+        return sum(self.weight(v.type) for v in violations)
+
+    def score(self, hard_cost, soft_cost):
+        """Scalar display score (higher is better, unclamped)"""
+        return self.base_score - self.hard_scale * hard_cost - soft_cost
+
+    @staticmethod
+    def rank_key(hard_cost, soft_cost):
+        """Lexicographic sort key - any hard violation outweighs all soft cost"""
+        return (hard_cost, soft_cost)
+
+    def periods_for_section(self, section):
+        """Time-of-day penalty units for a section"""
+        if section is not None and section.section_id in self.section_time_of_day:
+            return self.section_time_of_day[section.section_id]
+        return self.time_of_day
+
+    def compile_penalties(self, section, mappings, timeslots):
+        """Precompile per-(mapping, slot) soft penalties for a section"""
+        return PenaltyTensor(self, section, mappings, timeslots)
+
+
+class PenaltyTensor:
+    """
+    Soft penalties precompiled into a (mapping x slot) matrix.
+
+    Each component (faculty slot preference, time of day) is kept as its own
+    matrix so violations can still be listed; `matrix` is their sum and soft
+    cost of a schedule becomes a gather-and-sum over it.
+    """
+
+    def __init__(self, model, section, mappings, timeslots):
+        self.mapping_index = {m.id: i for i, m in enumerate(mappings)}
+        self.slot_index = {t.id: j for j, t in enumerate(timeslots)}
+        shape = (len(mappings), len(timeslots))
+
+        preference = np.zeros(shape)
+        time_of_day = np.zeros(shape)
+
+        pref_weight = model.weight('not_preferred_slot')
+        tod_weight = model.weight('time_of_day')
+        periods = model.periods_for_section(section)
+
+        for i, mapping in enumerate(mappings):
+            preferred = mapping.faculty.preferred_mask if mapping.faculty else 0
+            is_lab = mapping.course.is_lab if mapping.course else False
+
+            for j, slot in enumerate(timeslots):
+                if preferred and not preferred & slot.bit:
+                    preference[i, j] = pref_weight
+                if not is_lab and slot.period in periods:
+                    time_of_day[i, j] = tod_weight * periods[slot.period]
+
+        self.components = {
+            'not_preferred_slot': preference,
+            'time_of_day': time_of_day
+        }
+        self.matrix = preference + time_of_day
+
+    def _indices(self, mapping_ids, slot_ids):
+        rows, cols = [], []
+        for mapping_id, slot_id in zip(mapping_ids, slot_ids):
+            row = self.mapping_index.get(mapping_id)
+            col = self.slot_index.get(slot_id)
+            if row is not None and col is not None:
+                rows.append(row)
+                cols.append(col)
+        return np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+
+    def cost(self, mapping_ids, slot_ids):
+        """Total soft penalty of placing each mapping at the paired slot"""
+        rows, cols = self._indices(mapping_ids, slot_ids)
+        return float(self.matrix[rows, cols].sum())
+
+    def component(self, name, mapping_id, slot_id):
+        """Penalty contributed by one component for a single placement"""
+        row = self.mapping_index.get(mapping_id)
+        col = self.slot_index.get(slot_id)
+        if row is None or col is None:
+            return 0.0
+        return float(self.components[name][row, col])
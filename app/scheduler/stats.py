@@ -0,0 +1,89 @@
+"""Run Stats - Per-phase wall time and solver counters for a generation run"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+PHASES = ('prerequisites', 'csp', 'ga', 'greedy', 'save', 'validate')
+
+
+class RunStats:
+    """
+    Wall time per phase plus counters reported by the solvers, e.g.
+
+        stats = RunStats()
+        with stats.phase('csp'):
+            ...
+        stats.record('csp', nodes=120, backtracks=4)
+
+    A phase entered more than once accumulates its time.
+
+    Memory is the process's current RSS, sampled when the run starts and
+    as each phase ends: workers are long-lived, so their lifetime peak
+    (peak_rss_mb) says nothing about one run. rss_mb is the highest sample
+    and rss_growth_mb how far it rose above the start.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+        self.start_rss_mb = self.high_rss_mb = current_rss_mb()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+            self._sample_rss()
+
+    def _sample_rss(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.high_rss_mb = max(self.high_rss_mb or 0.0, rss)
+
+    def record(self, group, **counters):
+        self.counters.setdefault(group, {}).update(counters)
+
+    def to_dict(self):
+        """JSON-ready summary (seconds rounded to milliseconds)"""
+        phases = {name: round(self.phases[name], 3) for name in PHASES if name in self.phases}
+        phases.update({name: round(t, 3) for name, t in self.phases.items() if name not in PHASES})
+        self._sample_rss()
+        growth = None
+        if self.start_rss_mb is not None and self.high_rss_mb is not None:
+            growth = round(self.high_rss_mb - self.start_rss_mb, 1)
+        return {
+            'phases': phases,
+            'total_seconds': round(time.perf_counter() - self.started, 3),
+            **self.counters,
+            'rss_mb': self.high_rss_mb,
+            'rss_growth_mb': growth
+        }
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB (None without /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+def peak_rss_mb():
+    """Lifetime peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
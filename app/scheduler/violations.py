@@ -0,0 +1,107 @@
+"""Violations - Compact constraint violation records and lazy message rendering"""
+from app.models import Course, Faculty, Room, TimeSlot
+from app import db
+from collections import namedtuple
+from sqlalchemy import select, literal, null, union_all
+
+
+class Violation(namedtuple('Violation', [
+    'type', 'severity', 'faculty_id', 'room_id', 'course_id',
+    'timeslot_id', 'day', 'magnitude', 'limit', 'periods'
+], defaults=(None,) * 8)):
+    """
+    One constraint violation: a type code plus the ids and numbers needed to
+    describe it. Records are hashable so they can be counted and diffed;
+    text is only produced by render_violations.
+    """
+    __slots__ = ()
+
+
+# Message templates by violation type; fields are filled in by render_violations
+MESSAGES = {
+    'faculty_conflict': "Faculty {faculty} has {magnitude} classes at {slot}",
+    'room_conflict': "Room {room} has {magnitude} bookings at {slot}",
+    'section_conflict': "Section has {magnitude} theory classes at {slot}",
+    'lab_not_consecutive': "Lab {course} periods not consecutive on {day}: {periods}",
+    'faculty_unavailable': "Faculty {faculty} is unavailable at {slot}",
+    'room_capacity': "Room {room} (cap: {limit}) too small for {magnitude} students",
+    'not_preferred_slot': "Faculty {faculty} not in preferred slot at {slot}",
+    'faculty_overload_daily': "Faculty {faculty} has {magnitude} hours on {day} (max: {limit})",
+    'consecutive_days': "Course {course} on consecutive days",
+    'schedule_gap': "Gap of {magnitude} periods on {day} between P{start} and P{end}",
+    'time_of_day': "Class scheduled in discouraged period {slot}",
+}
+
+
+class EntityNames:
+    """Display names for violation messages, fetched in batches and kept"""
+    
+    KINDS = {
+        'faculty': ('faculty_id', Faculty.id, Faculty.name, null()),
+        'room': ('room_id', Room.id, Room.name, null()),
+        'course': ('course_id', Course.id, Course.code, null()),
+        'slot': ('timeslot_id', TimeSlot.id, TimeSlot.day, TimeSlot.period),
+    }
+    
+    def __init__(self):
+        self._maps = {kind: {} for kind in self.KINDS}
+    
+    def load(self, violations):
+        """Fetch every name the violations refer to that is not known yet, in one query"""
+        parts = []
+        for kind, (field, id_column, name_column, extra_column) in self.KINDS.items():
+            ids = {getattr(v, field) for v in violations} - {None} - self._maps[kind].keys()
+            if ids:
+                parts.append(
+                    select(literal(kind), id_column, name_column, extra_column)
+                    .where(id_column.in_(ids))
+                )
+        if parts:
+            for kind, entity_id, name, extra in db.session.execute(union_all(*parts)):
+                self._maps[kind][entity_id] = (name, extra)
+        return self
+    
+    def faculty(self, faculty_id):
+        row = self._maps['faculty'].get(faculty_id)
+        return row[0] if row else f"#{faculty_id}"
+    
+    def room(self, room_id):
+        row = self._maps['room'].get(room_id)
+        return row[0] if row else f"#{room_id}"
+    
+    def course(self, course_id):
+        row = self._maps['course'].get(course_id)
+        return row[0] if row else f"#{course_id}"
+    
+    def slot(self, timeslot_id):
+        row = self._maps['slot'].get(timeslot_id)
+        return f"{row[0]} P{row[1]}" if row else f"slot #{timeslot_id}"
+
+
+def render_violation(violation, names):
+    """Violation as a JSON-ready dict with its message (names must be loaded)"""
+    periods = list(violation.periods or ())
+    message = MESSAGES.get(violation.type, violation.type).format(
+        faculty=names.faculty(violation.faculty_id),
+        room=names.room(violation.room_id),
+        course=names.course(violation.course_id),
+        slot=names.slot(violation.timeslot_id),
+        day=violation.day,
+        magnitude=violation.magnitude,
+        limit=violation.limit,
+        periods=periods,
+        start=periods[0] if periods else None,
+        end=periods[-1] if periods else None
+    )
+    data = {key: value for key, value in violation._asdict().items() if value is not None}
+    if periods:
+        data['periods'] = periods
+    data['message'] = message
+    return data
+
+
+def render_violations(violations, names=None):
+    """Render a list of violations with one batched name lookup"""
+    violations = list(violations)
+    names = (names or EntityNames()).load(violations)
+    return [render_violation(v, names) for v in violations]
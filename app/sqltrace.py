@@ -0,0 +1,190 @@
+"""SQL Trace - Per-request statement counts and N+1 detection
+
+Opt-in (SQL_TRACE = True). Every request then records the SQL statements it
+runs, grouped by shape (the statement text with IN lists collapsed, so the
+same query for different ids counts once), with their time and the first
+application frame that issued each shape. A shape run SQL_TRACE_N_PLUS_ONE
+times or more in one request is flagged as a likely N+1 pattern: a lazy
+relationship load or a query inside a loop.
+
+Each traced request is written to the 'app.sqltrace' log as one JSON
+record (at WARNING when it has N+1 suspects), and in debug mode the
+response carries a summary header:
+
+    X-SQL-Trace: statements=42; seconds=0.0131; n_plus_one=2
+
+Outside requests, e.g. in benchmarks and tests, trace a block directly:
+
+    with trace_queries() as trace:
+        client.get('/timetable/view/1')
+    print(trace.count, trace.n_plus_one())
+
+    with assert_max_queries(10):
+        client.get('/timetable/view/1')  # AssertionError with a report if exceeded
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+_active = ContextVar('sql_traces', default=())
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+class QueryTrace:
+    """The statements seen while the trace was active, grouped by shape"""
+    
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = {}  # shape -> {'count', 'seconds', 'frame'}
+    
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        key = shape(statement)
+        entry = self.shapes.get(key)
+        if entry is None:
+            # Only the first run of a shape pays for the stack walk
+            entry = self.shapes[key] = {'count': 0, 'seconds': 0.0, 'frame': caller()}
+        entry['count'] += 1
+        entry['seconds'] += seconds
+    
+    def n_plus_one(self):
+        """Shapes repeated at least `threshold` times, most repeated first"""
+        suspects = [
+            {'statement': key, 'count': entry['count'],
+             'seconds': round(entry['seconds'], 4), 'frame': entry['frame']}
+            for key, entry in self.shapes.items() if entry['count'] >= self.threshold
+        ]
+        return sorted(suspects, key=lambda s: -s['count'])
+    
+    def to_dict(self):
+        return {
+            'statements': self.count,
+            'seconds': round(self.seconds, 4),
+            'shapes': len(self.shapes),
+            'n_plus_one': self.n_plus_one()
+        }
+    
+    def report(self):
+        """Readable summary, for assertion messages"""
+        lines = [f"{self.count} statements in {self.seconds:.4f}s, {len(self.shapes)} shapes"]
+        for key, entry in sorted(self.shapes.items(), key=lambda item: -item[1]['count']):
+            lines.append(f"  {entry['count']:>5}x  {entry['frame'] or '?'}  {key[:160]}")
+        return '\n'.join(lines)
+
+
+def shape(statement):
+    """The statement text with whitespace normalised and IN lists collapsed"""
+    return _IN_LIST.sub('IN (...)', _SPACE.sub(' ', statement).strip())
+
+
+def caller():
+    """'path:line in function' of the innermost application frame on the stack"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_ROOT) and 'site-packages' not in filename
+                and filename != __file__):
+            return f"{os.path.relpath(filename, _ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def init_sqltrace(app, db):
+    """Install the statement listeners (after db.init_app); trace requests if SQL_TRACE is set"""
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    
+    if not app.config.get('SQL_TRACE'):
+        return
+    threshold = app.config.get('SQL_TRACE_N_PLUS_ONE', 5)
+    
+    @app.before_request
+    def _start_trace():
+        trace = QueryTrace(threshold)
+        g.sql_trace = (trace, _active.set(_active.get() + (trace,)))
+    
+    @app.after_request
+    def _report_trace(response):
+        if 'sql_trace' not in g:
+            return response
+        trace, _ = g.sql_trace
+        summary = trace.to_dict()
+        suspects = summary['n_plus_one']
+        logger.log(
+            logging.WARNING if suspects else logging.INFO,
+            json.dumps({'endpoint': request.endpoint, 'method': request.method,
+                        'path': request.path, **summary})
+        )
+        if app.debug:
+            response.headers['X-SQL-Trace'] = (
+                f"statements={trace.count}; seconds={trace.seconds:.4f}; n_plus_one={len(suspects)}"
+            )
+        return response
+    
+    @app.teardown_request
+    def _end_trace(error=None):
+        started = g.pop('sql_trace', None)
+        if started is not None:
+            _active.reset(started[1])
+
+
+@contextmanager
+def trace_queries(threshold=5):
+    """Trace the statements run inside the block (on this thread)"""
+    trace = QueryTrace(threshold)
+    token = _active.set(_active.get() + (trace,))
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit, threshold=5):
+    """Fail with the trace's report if the block runs more than `limit` statements"""
+    with trace_queries(threshold) as trace:
+        yield trace
+    if trace.count > limit:
+        raise AssertionError(f"Expected at most {limit} SQL statements, got {trace.report()}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault('sql_trace_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    traces = _active.get()
+    started = conn.info.get('sql_trace_started')
+    if not traces or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for trace in traces:
+        trace.record(statement, seconds)
+
+
+def _handle_error(exception_context):
+    # Failed statements skip after_cursor_execute; keep the stack in step
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('sql_trace_started'):
+        conn.info['sql_trace_started'].pop()
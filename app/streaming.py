@@ -0,0 +1,194 @@
+"""Streaming - Asynchronous job progress streams (ASGI sidecar)
+
+Every open /timetable/api/jobs/<job_id>/events connection on the Flask app
+holds a worker thread for the whole run. This module serves the same
+endpoint, with the same protocol (numbered events, Last-Event-ID replay,
+heartbeats), as a plain ASGI application on an asyncio event loop, so any
+number of viewers costs no worker threads:
+
+    uvicorn app.streaming:create_asgi_app --factory --port 5001
+    (or: python run.py stream 5001)
+
+with the reverse proxy sending /timetable/api/jobs/<job_id>/events there
+and everything else to the Flask app.
+
+Each job has a single producer task, started by its first subscriber, that
+polls the job store (in a thread, as database access is synchronous) and
+fans new events out to all of the job's subscribers. It stops once the job
+has finished or its last subscriber has gone.
+"""
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from app import db
+from app.jobs import read_events, get_job, event_id, sse_message
+
+
+EVENTS_PATH = re.compile(r'^/timetable/api/jobs/(?P<job_id>[^/]+)/events/?$')
+
+
+class Channel:
+    """One job's events as read so far, shared by its subscribers"""
+    
+    def __init__(self):
+        self.events = []  # (seq, event) in order
+        self.finished = False
+        self.subscribers = 0
+        self.updated = asyncio.Event()  # replaced after each set
+        self.producer = None
+    
+    def publish(self, events, finished):
+        self.events.extend(events)
+        self.finished = finished
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+
+class ProgressStreams:
+    """ASGI application serving job event streams from the job store"""
+    
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.channels = {}  # job id -> Channel
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for channel in self.channels.values():
+                    if channel.producer:
+                        channel.producer.cancel()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _http(self, scope, receive, send):
+        match = EVENTS_PATH.match(scope['path'])
+        if scope['method'] != 'GET' or not match:
+            await self._json(send, 404, {'error': 'Not found'})
+            return
+        
+        job_id = match.group('job_id')
+        if not await self._db(lambda: get_job(job_id) is not None):
+            await self._json(send, 404, {'error': f'Unknown job {job_id}'})
+            return
+        
+        # A reconnecting EventSource sends the id of the last event it got
+        headers = dict(scope.get('headers') or [])
+        query = parse_qs(scope.get('query_string', b'').decode())
+        after = event_id(
+            headers.get(b'last-event-id', b'').decode() or (query.get('last_event_id') or [None])[0]
+        )
+        
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]
+        })
+        stream = asyncio.ensure_future(self._subscribe(job_id, after, send))
+        disconnect = asyncio.ensure_future(self._disconnected(receive))
+        done, pending = await asyncio.wait({stream, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if stream in done:
+            stream.result()
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    
+    async def _subscribe(self, job_id, after, send):
+        """Send the job's events above `after` until its final one, with heartbeats"""
+        channel = self._channel(job_id)
+        channel.subscribers += 1
+        try:
+            await self._send(send, f"retry: {self.config.get('SSE_RETRY_MS', 3000)}\n\n")
+            heartbeat = self.config.get('SSE_HEARTBEAT_SECONDS', 15)
+            position = 0
+            while True:
+                while position < len(channel.events):
+                    seq, event = channel.events[position]
+                    position += 1
+                    if seq is None or seq > after:
+                        await self._send(send, sse_message(seq, event))
+                if channel.finished:
+                    return
+                try:
+                    await asyncio.wait_for(channel.updated.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    await self._send(send, sse_message(None, None))
+        finally:
+            channel.subscribers -= 1
+            if not channel.subscribers and self.channels.get(job_id) is channel:
+                del self.channels[job_id]
+    
+    def _channel(self, job_id):
+        """The job's channel, starting its producer for the first subscriber"""
+        channel = self.channels.get(job_id)
+        if channel is None:
+            channel = self.channels[job_id] = Channel()
+            channel.producer = asyncio.ensure_future(self._produce(job_id, channel))
+        return channel
+    
+    async def _produce(self, job_id, channel):
+        """Poll the job store for new events and publish them to the channel"""
+        poll = self.config.get('JOB_POLL_INTERVAL', 0.5)
+        after = 0
+        while True:
+            try:
+                events, finished = await self._db(lambda: read_events(job_id, after))
+            except Exception as e:
+                events, finished = [(None, {'type': 'error', 'success': False, 'message': str(e)})], True
+            after = max([seq for seq, _ in events if seq] + [after])
+            if events or finished:
+                channel.publish(events, finished)
+            if finished:
+                return
+            await asyncio.sleep(poll)
+            if not channel.subscribers:
+                return
+    
+    async def _db(self, func):
+        """Run a database read in a thread, inside the Flask app context"""
+        def call():
+            with self.flask_app.app_context():
+                try:
+                    return func()
+                finally:
+                    db.session.remove()
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+    
+    @staticmethod
+    async def _disconnected(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+    
+    @staticmethod
+    async def _send(send, text):
+        await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+    
+    @staticmethod
+    async def _json(send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')]
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+def create_asgi_app(config_name='default'):
+    """ASGI application factory (for uvicorn --factory and the like)"""
+    from app import create_app
+    return ProgressStreams(create_app(config_name))
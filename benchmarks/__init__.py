@@ -0,0 +1,4 @@
+"""Benchmarks - Performance measurements against throwaway SQLite databases
+
+Run modules directly, e.g. `python -m benchmarks.query_plans --rows 100000`.
+"""
@@ -0,0 +1,168 @@
+"""Shared helpers for benchmarks - throwaway apps and synthetic data"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+PERIODS = 8
+
+
+def temp_app(db_path=None, **settings):
+    """
+    A Flask app bound to a fresh SQLite file (a temp file by default), with
+    any config settings overridden. Returns (app, db_path).
+    """
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(prefix='timetable-bench-', suffix='.db')
+        os.close(handle)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    return open_app(db_path, **settings), db_path
+
+
+def open_app(db_path, **settings):
+    """A Flask app bound to an existing SQLite file, e.g. one built by temp_app"""
+    from config import config, Config
+    from app import create_app
+
+    config['benchmark'] = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(db_path),
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+        **settings
+    })
+    return create_app('benchmark')
+
+
+def _insert(model, rows, chunk=5000):
+    from app import db
+    for start in range(0, len(rows), chunk):
+        db.session.execute(model.__table__.insert(), rows[start:start + chunk])
+
+
+def seed_institution(sections, faculty=None, rooms=None, courses_per_section=8, seed=0):
+    """
+    Bulk-insert reference data: 5x8 timeslots, rooms, faculty, courses,
+    sections with two batches each and one faculty mapping per course.
+    Every section is mapped to all courses of its semester (so the
+    scheduler's prerequisites hold) plus random others.
+    Must run inside an app context; returns a dict of the generated ids.
+    """
+    from app import db
+    from app.models import TimeSlot, Room, Faculty, Course, Section, Batch, FacultyCourse
+
+    rng = random.Random(seed)
+    faculty = faculty or max(8, sections // 4)
+    rooms = rooms or max(8, sections // 10)
+    n_courses = max(courses_per_section * 2, 16)
+
+    _insert(TimeSlot, [
+        {'slot_id': f"{day[:3].upper()}-{p}", 'day': day, 'day_index': d, 'period': p,
+         'start_time': f"{8 + p:02d}:00", 'end_time': f"{8 + p:02d}:50"}
+        for d, day in enumerate(DAYS) for p in range(1, PERIODS + 1)
+    ])
+    _insert(Room, [
+        {'room_id': f"R{i:05d}", 'name': f"Room {i}", 'capacity': 60 if i % 5 else 30,
+         'room_type': 'Classroom' if i % 5 else 'Lab'}
+        for i in range(1, rooms + 1)
+    ])
+    _insert(Faculty, [
+        {'faculty_id': f"F{i:05d}", 'name': f"Faculty {i}", 'max_hours_per_day': 6}
+        for i in range(1, faculty + 1)
+    ])
+    _insert(Course, [
+        {'code': f"C{i:04d}", 'name': f"Course {i}", 'semester': 1 + i % 8, 'credits': 3,
+         'category': 'PC', 'course_type': 'P' if i % 4 == 0 else 'T', 'is_lab': i % 4 == 0,
+         'lecture_hours': 3}
+        for i in range(1, n_courses + 1)
+    ])
+    _insert(Section, [
+        {'section_id': f"S{i:05d}", 'name': f"S{i}", 'branch': 'CSE', 'semester': 1 + i % 8,
+         'strength': 60, 'batch_year': 2024, 'academic_year': '2024-25'}
+        for i in range(1, sections + 1)
+    ])
+    _insert(Batch, [
+        {'batch_id': f"S{i:05d}-G{g}", 'name': f"G{g}", 'section_id': i, 'strength': 30}
+        for i in range(1, sections + 1) for g in (1, 2)
+    ])
+    def section_courses(section_id):
+        semester = 1 + section_id % 8
+        own = [c for c in range(1, n_courses + 1) if 1 + c % 8 == semester]
+        others = [c for c in range(1, n_courses + 1) if 1 + c % 8 != semester]
+        return own + rng.sample(others, courses_per_section - len(own))
+    
+    _insert(FacultyCourse, [
+        {'faculty_id': rng.randint(1, faculty), 'course_id': course_id, 'section_id': section_id,
+         'session_type': 'P' if course_id % 4 == 0 else 'L', 'academic_year': '2024-25'}
+        for section_id in range(1, sections + 1)
+        for course_id in section_courses(section_id)
+    ])
+    db.session.commit()
+
+    return {
+        'sections': sections, 'faculty': faculty, 'rooms': rooms,
+        'courses': n_courses, 'timeslots': len(DAYS) * PERIODS,
+        'mappings': sections * courses_per_section
+    }
+
+
+def seed_timetable(sizes, per_section=40, seed=0, denormalize=True):
+    """
+    Bulk-insert per_section timetable rows for every section (one per slot,
+    rooms and mappings chosen at random) as each section's active
+    generation. With denormalize=False the faculty_id/course_id copies are
+    left empty, as in databases that predate them. Returns the number of rows.
+    """
+    from app import db
+    from app.models import Timetable, Section, FacultyCourse
+
+    rng = random.Random(seed)
+    rows = timetable_rows(sizes, range(1, sizes['sections'] + 1), per_section, 'BENCH', rng)
+    _insert(Timetable, rows)
+    if denormalize:
+        timetable, mappings = Timetable.__table__, FacultyCourse.__table__
+        mapping = select(mappings).where(mappings.c.id == timetable.c.faculty_course_id)
+        db.session.execute(timetable.update().values(
+            faculty_id=mapping.with_only_columns(mappings.c.faculty_id).scalar_subquery(),
+            course_id=mapping.with_only_columns(mappings.c.course_id).scalar_subquery()
+        ))
+    db.session.execute(Section.__table__.update().values(active_generation_id='BENCH'))
+    db.session.commit()
+    return len(rows)
+
+
+def timetable_rows(sizes, section_ids, per_section, generation_id, rng):
+    """
+    Random timetable rows for the sections of a seed_institution dataset:
+    per_section rows each, one per slot, rooms and mappings at random.
+    """
+    slots = sizes['timeslots']
+    courses_per_section = sizes['mappings'] // sizes['sections']
+    rows = []
+    for section_id in section_ids:
+        first_mapping = (section_id - 1) * courses_per_section + 1
+        for slot in rng.sample(range(1, slots + 1), min(per_section, slots)):
+            batch = rng.choice((None, None, None, 1, 2))
+            rows.append({
+                'generation_id': generation_id,
+                'faculty_course_id': first_mapping + rng.randrange(courses_per_section),
+                'timeslot_id': slot,
+                'room_id': rng.randint(1, sizes['rooms']),
+                'section_id': section_id,
+                'batch_id': (section_id - 1) * 2 + batch if batch else None
+            })
+    return rows
+
+
+def timed(func, repeat=20):
+    """Median and best wall time of func() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 4), 'best_ms': round(min(samples), 4)}
@@ -0,0 +1,221 @@
+"""Concurrency benchmark - page reads while generations are saved, per SQLite mode
+
+For each mode a synthetic institution is built in a fresh database, then N
+reader threads issue GET requests against the timetable APIs while a
+writer process saves new timetable generations back to back, for a fixed
+duration. Each save writes several sections' timetables (thousands of
+rows) in one transaction, activates them and compacts old generations,
+the way a batch regeneration does. Reports reader throughput, latency and
+errors (e.g. "database is locked") and how far the writer got.
+
+    baseline    rollback journal, driver defaults, one engine (the old setup)
+    concurrent  WAL, busy timeout, synchronous=NORMAL, mmap and the
+                read-only engine for GET requests (config.py defaults)
+
+The readers share one process (and the GIL), as with the threaded
+development server; the writer is a separate process, as generation
+workers are (JOB_WORKERS). The defaults (4 readers, 3200 rows per save)
+are where the difference between the modes shows: with many reader
+threads, reads are bound by the GIL rather than by the database lock and
+both modes measure about the same.
+
+    python -m benchmarks.concurrency [--readers 4] [--duration 15] [--sections-per-save 80] [--json out.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import temp_app, open_app, seed_institution, seed_timetable, timetable_rows
+
+MODES = {
+    'baseline': {
+        'SQLITE_WAL': False,
+        'SQLITE_BUSY_TIMEOUT_MS': None,
+        'SQLITE_SYNCHRONOUS': None,
+        'SQLITE_MMAP_SIZE': None,
+        'SQLITE_READ_ENGINE': False
+    },
+    'concurrent': {},
+}
+
+def reader(app, sizes, stop, samples, errors, seed):
+    """GET timetable APIs until stopped; records (latency_ms, ok)"""
+    rng = random.Random(seed)
+    client = app.test_client()
+    while not stop.is_set():
+        url = rng.choice((
+            f"/timetable/api/section/{rng.randint(1, sizes['sections'])}",
+            f"/timetable/api/faculty/{rng.randint(1, sizes['faculty'])}",
+            f"/timetable/api/room/{rng.randint(1, sizes['rooms'])}",
+        ))
+        start = time.perf_counter()
+        try:
+            response = client.get(url)
+            ok = response.status_code == 200
+            if not ok:
+                message = (response.get_json(silent=True) or {}).get('message', '')
+                errors[f"HTTP {response.status_code} {message}".strip()[:80]] += 1
+        except Exception as e:
+            ok = False
+            errors[str(e).splitlines()[0][:80]] += 1
+        samples.append(((time.perf_counter() - start) * 1000, ok))
+
+
+def writer(db_path, settings, sizes, sections_per_save, per_section, stop, results, seed):
+    """
+    Writer process: save a new generation for a few random sections per
+    transaction, activate it and compact old generations, until stopped.
+    Puts {'saves': [seconds], 'rows': n, 'errors': {...}} on `results`.
+    """
+    from app import db
+    from app.models import Timetable, FacultyCourse
+    from app.scheduler.generations import activate, compact
+
+    rng = random.Random(seed)
+    app = open_app(db_path, **settings)
+    saves, rows_written, errors = [], 0, Counter()
+    with app.app_context():
+        mappings = dict((m.id, (m.faculty_id, m.course_id)) for m in FacultyCourse.query.all())
+        number = 0
+        while not stop.is_set():
+            number += 1
+            generation_id = f"SAVE-{number}"
+            section_ids = rng.sample(range(1, sizes['sections'] + 1), min(sections_per_save, sizes['sections']))
+            rows = timetable_rows(sizes, section_ids, per_section, generation_id, rng)
+            for row in rows:
+                row['faculty_id'], row['course_id'] = mappings[row['faculty_course_id']]
+            start = time.perf_counter()
+            try:
+                db.session.execute(Timetable.__table__.insert(), rows)
+                for section_id in section_ids:
+                    activate(section_id, generation_id)
+                db.session.commit()
+                compact()
+            except Exception as e:
+                db.session.rollback()
+                errors[str(e).splitlines()[0][:80]] += 1
+                continue
+            saves.append(time.perf_counter() - start)
+            rows_written += len(rows)
+        for engine in db.engines.values():
+            engine.dispose()
+    results.put({'saves': saves, 'rows': rows_written, 'errors': dict(errors)})
+
+
+def run_mode(settings, readers=4, duration=15, sections=80, sections_per_save=80, per_section=40, seed=0):
+    """Seed a fresh database under the given settings and measure one mode"""
+    from app import db
+
+    app, db_path = temp_app(**settings)
+    context = multiprocessing.get_context('spawn')
+    try:
+        with app.app_context():
+            sizes = seed_institution(sections=sections, seed=seed)
+            seed_timetable(sizes, per_section=per_section, seed=seed)
+            db.session.remove()
+
+        stop, results = context.Event(), context.Queue()
+        process = context.Process(target=writer, args=(db_path, settings, sizes, sections_per_save,
+                                                       per_section, stop, results, seed))
+        process.start()
+        time.sleep(3)  # let the writer process start up before timing
+
+        halt = threading.Event()
+        samples, read_errors = [], Counter()
+        threads = [
+            threading.Thread(target=reader, args=(app, sizes, halt, samples, read_errors, seed + i + 1))
+            for i in range(readers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        halt.set()
+        for thread in threads:
+            thread.join()
+        stop.set()
+        written = results.get()
+        process.join()
+    finally:
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    latencies = sorted(ms for ms, _ in samples)
+    failed = sum(1 for _, ok in samples if not ok)
+    saves = written['saves']
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2) if latencies else None
+
+    return {
+        'reads': len(samples),
+        'reads_per_second': round(len(samples) / duration, 1),
+        'read_failures': failed,
+        'read_p50_ms': percentile(0.50),
+        'read_p95_ms': percentile(0.95),
+        'read_p99_ms': percentile(0.99),
+        'read_max_ms': round(latencies[-1], 2) if latencies else None,
+        'read_errors': dict(read_errors),
+        'saves': len(saves),
+        'rows_written': written['rows'],
+        'save_mean_s': round(statistics.mean(saves), 3) if saves else None,
+        'write_errors': written['errors']
+    }
+
+
+def run(readers=4, duration=15, sections=80, sections_per_save=80, per_section=40, modes=None):
+    return {
+        'readers': readers,
+        'duration_s': duration,
+        'sections': sections,
+        'rows_per_save': sections_per_save * per_section,
+        'modes': {
+            name: run_mode(MODES[name], readers, duration, sections, sections_per_save, per_section)
+            for name in (modes or MODES)
+        }
+    }
+
+
+def print_report(report):
+    print(f"{report['readers']} readers + 1 writer process saving {report['rows_per_save']} rows per "
+          f"transaction, {report['duration_s']}s per mode, {report['sections']} sections")
+    print(f"{'mode':<12} {'reads/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'failed':>7} {'saves':>6} {'save s':>7} {'w.err':>6}")
+    for name, result in report['modes'].items():
+        print(f"{name:<12} {result['reads_per_second']:>8} {result['read_p50_ms']:>8} "
+              f"{result['read_p95_ms']:>8} {result['read_p99_ms']:>8} {result['read_max_ms']:>8} "
+              f"{result['read_failures']:>7} {result['saves']:>6} {result['save_mean_s'] or '-':>7} "
+              f"{sum(result['write_errors'].values()):>6}")
+        for message, count in {**result['read_errors'], **result['write_errors']}.items():
+            print(f"{'':<12} {count} x {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+    parser.add_argument('--duration', type=float, default=15, help='seconds per mode')
+    parser.add_argument('--sections', type=int, default=80, help='sections in the dataset')
+    parser.add_argument('--sections-per-save', type=int, default=80, help='sections written per transaction')
+    parser.add_argument('--per-section', type=int, default=40, help='timetable rows per section')
+    parser.add_argument('--mode', action='append', choices=sorted(MODES), help='run only this mode')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    report = run(args.readers, args.duration, args.sections, args.sections_per_save, args.per_section, args.mode)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Synthetic institutes - parametric scheduling instances for the benchmarks
+
+generate_instance() fills the current app's (empty) database with an
+institute built from a seed: sections in every semester with lab batches,
+faculty that teach across sections, classrooms and labs with capacities,
+and faculty unavailability and preferences at a given density. The same
+parameters and seed always give the same instance.
+
+Every section gets a mapping for each of its semester's courses (theory for
+the whole section, labs once per batch), so the scheduler's prerequisites
+hold. Faculty loads are balanced: each mapping goes to the least loaded of
+a few randomly drawn faculty, so most faculty teach several sections.
+
+    SCALES['medium']                          named parameter sets
+    generate_instance(sections=16, seed=1)    any parameters, in an app context
+"""
+import json
+import random
+
+from benchmarks.common import DAYS, PERIODS, _insert
+
+DEFAULTS = {
+    'sections': 8,
+    'batches': 2,                # lab batches per section
+    'section_strength': 60,
+    'faculty': 16,
+    'classrooms': 8,
+    'labs': 3,
+    'classroom_capacity': (60, 90),
+    'lab_capacity': (30, 40),
+    'theory_courses': 5,         # per semester
+    'lab_courses': 1,            # per semester
+    'unavailable_density': 0.1,  # share of a faculty's slots marked unavailable
+    'preference_density': 0.2,   # share of a faculty's slots marked preferred
+    'seed': 0
+}
+
+SCALES = {
+    'small': {'sections': 4, 'faculty': 10, 'classrooms': 6, 'labs': 2},
+    'medium': {'sections': 16, 'faculty': 32, 'classrooms': 16, 'labs': 5},
+    'large': {'sections': 48, 'faculty': 90, 'classrooms': 40, 'labs': 12},
+}
+
+
+def instance_params(scale=None, **overrides):
+    """The full parameter set of a named scale with overrides applied"""
+    params = dict(DEFAULTS)
+    if scale:
+        params.update(SCALES[scale])
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return params
+
+
+def generate_instance(**params):
+    """
+    Insert a synthetic institute into the current app's database. Must run
+    inside an app context on an empty database; returns the parameters used
+    plus counts of what was generated.
+    """
+    from app import db
+    from app.models import TimeSlot, Room, Faculty, Course, Section, Batch, FacultyCourse
+
+    p = instance_params(**params)
+    rng = random.Random(p['seed'])
+    slot_keys = [f"{day[:3].upper()}-{period}" for day in DAYS for period in range(1, PERIODS + 1)]
+    semesters = sorted({1 + i % 8 for i in range(1, p['sections'] + 1)})
+
+    _insert(TimeSlot, [
+        {'slot_id': f"{day[:3].upper()}-{period}", 'day': day, 'day_index': d, 'period': period,
+         'start_time': f"{8 + period:02d}:00", 'end_time': f"{8 + period:02d}:50"}
+        for d, day in enumerate(DAYS) for period in range(1, PERIODS + 1)
+    ])
+
+    rooms = [
+        {'room_id': f"CR{i:04d}", 'name': f"Classroom {i}", 'room_type': 'Classroom',
+         'capacity': rng.randint(*p['classroom_capacity'])}
+        for i in range(1, p['classrooms'] + 1)
+    ] + [
+        {'room_id': f"LAB{i:04d}", 'name': f"Lab {i}", 'room_type': 'Lab', 'lab_type': 'Computer',
+         'capacity': rng.randint(*p['lab_capacity'])}
+        for i in range(1, p['labs'] + 1)
+    ]
+    _insert(Room, rooms)
+
+    def sample_slots(density):
+        return json.dumps(sorted(rng.sample(slot_keys, int(len(slot_keys) * density))))
+
+    _insert(Faculty, [
+        {'faculty_id': f"F{i:05d}", 'name': f"Faculty {i}", 'email': f"f{i}@example.edu",
+         'max_hours_per_day': 6, 'max_hours_per_week': 18,
+         'unavailable_slots': sample_slots(p['unavailable_density']),
+         'preferred_slots': sample_slots(p['preference_density'])}
+        for i in range(1, p['faculty'] + 1)
+    ])
+
+    courses = []
+    for semester in semesters:
+        for k in range(p['theory_courses']):
+            courses.append({
+                'code': f"T{semester}{k:02d}", 'name': f"Theory {semester}.{k}", 'semester': semester,
+                'credits': 4 if k % 2 == 0 else 3, 'category': 'PC', 'course_type': 'T', 'is_lab': False,
+                'lecture_hours': 3, 'tutorial_hours': 1 if k % 2 == 0 else 0, 'practical_hours': 0
+            })
+        for k in range(p['lab_courses']):
+            courses.append({
+                'code': f"L{semester}{k:02d}", 'name': f"Lab {semester}.{k}", 'semester': semester,
+                'credits': 1, 'category': 'PC', 'course_type': 'P', 'is_lab': True,
+                'lecture_hours': 0, 'tutorial_hours': 0, 'practical_hours': 2
+            })
+    _insert(Course, courses)
+    course_ids = {}  # semester -> [(course id, is lab, weekly periods)]
+    for course_id, course in enumerate(courses, 1):
+        periods = 2 * course['practical_hours'] if course['is_lab'] else course['lecture_hours'] + course['tutorial_hours']
+        course_ids.setdefault(course['semester'], []).append((course_id, course['is_lab'], periods))
+
+    strength = p['section_strength']
+    _insert(Section, [
+        {'section_id': f"S{i:05d}", 'name': f"S{i}", 'branch': 'CSE', 'semester': 1 + i % 8,
+         'strength': strength, 'batch_year': 2024, 'academic_year': '2024-25'}
+        for i in range(1, p['sections'] + 1)
+    ])
+    batches = {}  # section id -> batch ids
+    batch_rows = []
+    for section_id in range(1, p['sections'] + 1):
+        for g in range(1, p['batches'] + 1):
+            batch_rows.append({
+                'batch_id': f"S{section_id:05d}-G{g}", 'name': f"G{g}", 'section_id': section_id,
+                'strength': strength // p['batches'] + (1 if g <= strength % p['batches'] else 0)
+            })
+            batches.setdefault(section_id, []).append(len(batch_rows))
+    _insert(Batch, batch_rows)
+
+    # Shared, balanced faculty loads: the least loaded of a few random picks
+    load = [0] * (p['faculty'] + 1)
+
+    def pick_faculty(periods):
+        candidates = rng.sample(range(1, p['faculty'] + 1), min(3, p['faculty']))
+        chosen = min(candidates, key=lambda f: load[f])
+        load[chosen] += periods
+        return chosen
+
+    mappings = []
+    for section_id in range(1, p['sections'] + 1):
+        for course_id, is_lab, periods in course_ids[1 + section_id % 8]:
+            for batch_id in (batches[section_id] if is_lab else [None]):
+                mappings.append({
+                    'faculty_id': pick_faculty(periods), 'course_id': course_id,
+                    'section_id': section_id, 'batch_id': batch_id,
+                    'session_type': 'P' if is_lab else 'L', 'academic_year': '2024-25'
+                })
+    _insert(FacultyCourse, mappings)
+    db.session.commit()
+
+    return {
+        **p,
+        'timeslots': len(slot_keys),
+        'courses': len(courses),
+        'mappings': len(mappings),
+        'max_faculty_load': max(load),
+        'mean_faculty_load': round(sum(load) / p['faculty'], 1)
+    }
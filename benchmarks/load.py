@@ -0,0 +1,341 @@
+"""Load test - the web pages and APIs under concurrent users, per endpoint
+
+Drives the real WSGI app with a weighted mix of requests, the way staff
+browse it: the dashboard, section timetables (page and JSON), faculty and
+room views, PDF and Excel exports and validation. Each concurrency level
+runs for a fixed duration with that many client threads, every thread
+picking endpoints by weight and ids at random. Reports throughput and
+p50/p95/p99 latency per endpoint and overall, plus SQL statements per
+request (in-process only).
+
+By default requests go through the Flask test client in this process, on
+a synthetic institution (benchmarks/common.py) built in a throwaway
+database; --db keeps that database for later runs. With --url they go over
+HTTP to a running server instead (e.g. gunicorn on a copy of the same
+database), which is the number to size a deployment by. `compare` flags
+endpoints whose latency or throughput regressed between two reports.
+
+    python -m benchmarks.load run [--concurrency 1 --concurrency 8] [--duration 20] [--sections 200]
+                                  [--db bench.db | --url http://127.0.0.1:5000] [--json out.json]
+    python -m benchmarks.load compare base.json new.json [--tolerance 0.15]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.common import temp_app, open_app, seed_institution, seed_timetable
+
+# endpoint -> (weight, url template); {section}, {faculty} and {room} are
+# filled with random ids
+MIX = {
+    'dashboard': (5, '/'),
+    'section_page': (20, '/timetable/view/{section}'),
+    'section_api': (25, '/timetable/api/section/{section}'),
+    'faculty_page': (8, '/faculty/view/{faculty}'),
+    'faculty_api': (10, '/timetable/api/faculty/{faculty}'),
+    'room_page': (5, '/rooms/view/{room}'),
+    'room_api': (7, '/timetable/api/room/{room}'),
+    'section_pdf': (4, '/export/section/{section}/pdf'),
+    'section_excel': (4, '/export/section/{section}/excel'),
+    'faculty_pdf': (2, '/export/faculty/{faculty}/pdf'),
+    'validate': (10, '/timetable/api/validate/{section}'),
+}
+
+# metric -> (better direction, absolute change below which it is noise)
+COMPARED = {
+    'p50_ms': ('lower', 1.0),
+    'p95_ms': ('lower', 2.0),
+    'p99_ms': ('lower', 5.0),
+    'requests_per_second': ('higher', 0.5),
+    'errors': ('lower', 0),
+}
+
+
+class TestClientTransport:
+    """Requests through the Flask test client, with SQL statement counts"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def get(self, url):
+        from app.sqltrace import trace_queries
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        with trace_queries() as trace:
+            response = client.get(url)
+            response.close()
+        return response.status_code, trace.count
+
+
+class HTTPTransport:
+    """Requests over HTTP to a running server"""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def get(self, url):
+        try:
+            with urllib.request.urlopen(self.base_url + url, timeout=self.timeout) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def pick_url(rng, sizes, endpoints, weights):
+    name = rng.choices(endpoints, weights)[0]
+    url = MIX[name][1].format(section=rng.randint(1, sizes['sections']),
+                              faculty=rng.randint(1, sizes['faculty']),
+                              room=rng.randint(1, sizes['rooms']))
+    return name, url
+
+
+def client(transport, sizes, endpoints, stop, samples, errors, seed):
+    """Issue requests until stopped; records (endpoint, latency_ms, ok, statements)"""
+    rng = random.Random(seed)
+    weights = [MIX[name][0] for name in endpoints]
+    while not stop.is_set():
+        name, url = pick_url(rng, sizes, endpoints, weights)
+        start = time.perf_counter()
+        try:
+            status, statements = transport.get(url)
+            ok = status == 200
+            if not ok:
+                errors[f"{name}: HTTP {status}"] += 1
+        except Exception as e:
+            ok, statements = False, None
+            errors[f"{name}: {str(e).splitlines()[0][:80]}"] += 1
+        samples.append((name, (time.perf_counter() - start) * 1000, ok, statements))
+
+
+def summarize(samples, duration):
+    latencies = sorted(ms for _, ms, _, _ in samples)
+    statements = [n for _, _, _, n in samples if n is not None]
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2) if latencies else None
+
+    return {
+        'requests': len(samples),
+        'requests_per_second': round(len(samples) / duration, 1),
+        'errors': sum(1 for _, _, ok, _ in samples if not ok),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': round(statistics.mean(latencies), 2) if latencies else None,
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'statements_per_request': round(statistics.mean(statements), 1) if statements else None
+    }
+
+
+def run_level(transport, sizes, endpoints, concurrency, duration, seed):
+    """One concurrency level: `concurrency` client threads for `duration` seconds"""
+    stop = threading.Event()
+    samples, errors = [], Counter()
+    threads = [
+        threading.Thread(target=client, args=(transport, sizes, endpoints, stop, samples, errors, seed + i))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample[0], []).append(sample)
+    return {
+        'concurrency': concurrency,
+        'overall': summarize(samples, duration),
+        'endpoints': {name: summarize(by_endpoint[name], duration)
+                      for name in endpoints if name in by_endpoint},
+        'error_messages': dict(errors)
+    }
+
+
+def warm_up(transport, sizes, endpoints, seed):
+    """One request per endpoint, so first-request costs stay out of the numbers"""
+    rng = random.Random(seed)
+    for name in endpoints:
+        transport.get(pick_url(rng, sizes, [name], [1])[1])
+
+
+def build_dataset(sections, per_section, seed):
+    """The synthetic institution with every section's timetable filled in"""
+    from app import db
+
+    sizes = seed_institution(sections=sections, seed=seed)
+    seed_timetable(sizes, per_section=per_section, seed=seed)
+    db.session.remove()
+    return sizes
+
+
+def dataset_sizes():
+    """Sizes of an existing dataset, for reusing a kept --db"""
+    from app.models import Section, Faculty, Room, Timetable
+    return {
+        'sections': Section.query.count(),
+        'faculty': Faculty.query.count(),
+        'rooms': Room.query.count(),
+        'timetable_rows': Timetable.query.count()
+    }
+
+
+def run(levels=(1, 4, 8), duration=20, sections=200, per_section=30, endpoints=None,
+        db_path=None, url=None, seed=0):
+    from app import db
+
+    endpoints = endpoints or list(MIX)
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'target': url or 'test client',
+            'duration_seconds': duration,
+            'seed': seed,
+            'mix': {name: MIX[name][0] for name in endpoints}
+        },
+        'levels': []
+    }
+
+    # The dataset: built in a fresh database unless a kept one is reused
+    temporary = db_path is None
+    if db_path and os.path.exists(db_path):
+        app = open_app(db_path, JOB_WORKERS=0)
+        with app.app_context():
+            sizes = dataset_sizes()
+    else:
+        app, db_path = temp_app(db_path, JOB_WORKERS=0)
+        with app.app_context():
+            build_dataset(sections, per_section, seed)
+            sizes = dataset_sizes()
+    report['meta']['dataset'] = sizes
+
+    if url:
+        # Ids are drawn from the local dataset: the server must serve the same one
+        transport = HTTPTransport(url)
+    else:
+        transport = TestClientTransport(app)
+    try:
+        warm_up(transport, sizes, endpoints, seed)
+        print(HEADER)
+        for concurrency in levels:
+            level = run_level(transport, sizes, endpoints, concurrency, duration, seed)
+            report['levels'].append(level)
+            for name, summary in level['endpoints'].items():
+                print_row(concurrency, name, summary)
+            print_row(concurrency, 'ALL', level['overall'])
+            for message, count in level['error_messages'].items():
+                print(f"  {count:>6}x {message}")
+    finally:
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        if temporary:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+    return report
+
+
+HEADER = (f"{'users':>5} {'endpoint':<14} {'reqs':>7} {'req/s':>7} {'err':>5} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'sql':>6}")
+
+
+def print_row(concurrency, name, s):
+    print(f"{concurrency:>5} {name:<14} {s['requests']:>7} {s['requests_per_second']:>7} {s['errors']:>5} "
+          f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} {s['max_ms']:>8} "
+          f"{s['statements_per_request'] if s['statements_per_request'] is not None else '-':>6}")
+
+
+def compare(base, new, tolerance=0.15):
+    """
+    Regressions of `new` against `base`: per concurrency level and
+    endpoint, metrics that got worse by more than `tolerance` (relative)
+    and their noise floor. Returns a list of
+    (concurrency, endpoint, metric, base value, new value).
+    """
+    def results(report):
+        return {
+            (level['concurrency'], name): summary
+            for level in report['levels']
+            for name, summary in list(level['endpoints'].items()) + [('ALL', level['overall'])]
+        }
+
+    base_results = results(base)
+    regressions = []
+    for key, r in results(new).items():
+        b = base_results.get(key)
+        if b is None:
+            continue
+        for metric, (better, floor) in COMPARED.items():
+            old, value = b.get(metric), r.get(metric)
+            if old is None or value is None:
+                continue
+            change = value - old if better == 'lower' else old - value
+            if change > floor and change > abs(old) * tolerance:
+                regressions.append((*key, metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the load test')
+    run_parser.add_argument('--concurrency', type=int, action='append',
+                            help='client threads; repeat for several levels (default 1, 4, 8)')
+    run_parser.add_argument('--duration', type=float, default=20, help='seconds per level')
+    run_parser.add_argument('--endpoint', action='append', choices=list(MIX), help='request only this endpoint')
+    run_parser.add_argument('--sections', type=int, default=200, help='sections in the generated dataset')
+    run_parser.add_argument('--per-section', type=int, default=30, help='timetable rows per section')
+    run_parser.add_argument('--db', help='keep the dataset in this file and reuse it if it exists')
+    run_parser.add_argument('--url', help='load a running server at this base URL instead')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--json', help='also write the report to this file')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two reports')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--tolerance', type=float, default=0.15, help='relative change allowed')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run(args.concurrency or (1, 4, 8), args.duration, args.sections, args.per_section,
+                     args.endpoint, args.db, args.url, args.seed)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.tolerance)
+    for concurrency, endpoint, metric, old, value in regressions:
+        print(f"REGRESSION {endpoint} @ {concurrency} users {metric}: {old} -> {value}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""Scheduler microbenchmarks - the hot functions on a fixed synthetic fixture
+
+Times the functions that dominate generation profiles, one call at a time,
+on the same fixture every run: the 'medium' synthetic institute (seed 0,
+benchmarks/instances.py) with the first few sections scheduled by CSP.
+
+    csp.is_consistent            CSPSolver._is_consistent (solved solver state)
+    csp.order_domain_values      CSPSolver._order_domain_values (median-size domain)
+    ga.calculate_fitness         Chromosome.calculate_fitness
+    ga.crossover                 GeneticAlgorithm.crossover
+    ga.mutate                    GeneticAlgorithm.mutate (mutation rate 1)
+    checker.check_all            ConstraintChecker(section).check_all
+    routes.check_conflicts       check_conflicts from app/routes/timetable.py
+
+Each benchmark is warmed up, then timed over --repeat samples of a
+calibrated number of calls; the report gives per-call median, mean,
+stdev, min and p95. With --save the results become the baseline; later
+runs print the before/after change against it and flag changes beyond
+the baseline's noise.
+
+    python -m benchmarks.micro [-k csp.] [--repeat 15] [--save] [--baseline path] [--json out.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.common import temp_app
+from benchmarks.instances import instance_params, generate_instance
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'micro.json')
+
+SCHEDULED_SECTIONS = 4
+SECTION_ID = 1
+GA_CONFIG = {'population_size': 10, 'mutation_rate': 1.0, 'crossover_rate': 1.0}
+
+
+def build_fixture(seed=0):
+    """The fixture database: a synthetic institute with a few sections scheduled"""
+    from app import db
+    from app.scheduler.hybrid_scheduler import HybridScheduler
+
+    generate_instance(**instance_params('medium', seed=seed))
+    for section_id in range(1, SCHEDULED_SECTIONS + 1):
+        random.seed(seed + section_id)
+        for _ in HybridScheduler(section_id, {'use_ga': False, 'validate': False}).generate():
+            pass
+    db.session.remove()
+
+
+# ----------------------------------------------------------------------
+# Benchmarks: each setup returns a zero-argument callable that makes one call
+# ----------------------------------------------------------------------
+
+def _cycle(items):
+    state = {'i': 0}
+
+    def next_item():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return next_item
+
+
+def _solved_csp():
+    from app.scheduler.csp_solver import CSPSolver
+    solver = CSPSolver(SECTION_ID)
+    solver.solve()
+    return solver
+
+
+def setup_is_consistent(rng):
+    solver = _solved_csp()
+    candidates = [
+        (mapping_id, slot_id, room_id)
+        for mapping_id, domain in solver.domains.items()
+        for slot_id, room_id in rng.sample(domain, min(20, len(domain)))
+    ]
+    rng.shuffle(candidates)
+    next_candidate = _cycle(candidates)
+    return lambda: solver._is_consistent(*next_candidate())
+
+
+def setup_order_domain_values(rng):
+    # One mapping, the median by domain size: the cost grows with the domain
+    solver = _solved_csp()
+    by_size = sorted(solver.domains, key=lambda mapping_id: (len(solver.domains[mapping_id]), mapping_id))
+    mapping_id = by_size[len(by_size) // 2]
+    return lambda: solver._order_domain_values(mapping_id)
+
+
+def _ga():
+    from app.scheduler.csp_solver import generate_initial_solution
+    from app.scheduler.genetic_algorithm import GeneticAlgorithm
+    ga = GeneticAlgorithm(SECTION_ID, GA_CONFIG)
+    ga.initialize_population(generate_initial_solution(SECTION_ID)['entries'])
+    return ga
+
+
+def setup_calculate_fitness(rng):
+    ga = _ga()
+    next_chromosome = _cycle(ga.population)
+    return lambda: next_chromosome().calculate_fitness(ga.scoring, ga.penalties, ga.fitness_context)
+
+
+def setup_crossover(rng):
+    ga = _ga()
+    pairs = [tuple(rng.sample(ga.population, 2)) for _ in range(50)]
+    next_pair = _cycle(pairs)
+    return lambda: ga.crossover(*next_pair())
+
+
+def setup_mutate(rng):
+    ga = _ga()
+    next_chromosome = _cycle(ga.population)
+    return lambda: ga.mutate(next_chromosome())
+
+
+def setup_check_all(rng):
+    from app.scheduler.constraints import ConstraintChecker
+    return lambda: ConstraintChecker(SECTION_ID).check_all()
+
+
+def setup_check_conflicts(rng):
+    from app.models import FacultyCourse, TimeSlot, Room
+    from app.routes.timetable import check_conflicts
+    mappings = FacultyCourse.query.filter(FacultyCourse.section_id <= SCHEDULED_SECTIONS).all()
+    slots = [t.id for t in TimeSlot.query.all()]
+    rooms = [r.id for r in Room.query.all()]
+    placements = [
+        (m.section_id, rng.choice(slots), m, rng.choice(rooms), m.batch_id)
+        for m in rng.sample(mappings, min(200, len(mappings)))
+    ]
+    next_placement = _cycle(placements)
+    return lambda: check_conflicts(*next_placement())
+
+
+BENCHMARKS = {
+    'csp.is_consistent': setup_is_consistent,
+    'csp.order_domain_values': setup_order_domain_values,
+    'ga.calculate_fitness': setup_calculate_fitness,
+    'ga.crossover': setup_crossover,
+    'ga.mutate': setup_mutate,
+    'checker.check_all': setup_check_all,
+    'routes.check_conflicts': setup_check_conflicts,
+}
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def calibrate(func, min_sample_seconds):
+    """Calls per sample so that a sample takes at least min_sample_seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_sample_seconds or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure(func, repeat=15, warmup=3, min_sample_seconds=0.05):
+    """Per-call timings in microseconds over `repeat` samples"""
+    number = calibrate(func, min_sample_seconds)
+    for _ in range(warmup):
+        for _ in range(number):
+            func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    samples.sort()
+    return {
+        'calls_per_sample': number,
+        'samples': repeat,
+        'median_us': round(statistics.median(samples), 3),
+        'mean_us': round(statistics.mean(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'min_us': round(samples[0], 3),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)
+    }
+
+
+def run(names=None, repeat=15, warmup=3, seed=0):
+    from app import db
+
+    app, db_path = temp_app(JOB_WORKERS=0)
+    results = {}
+    try:
+        with app.app_context():
+            build_fixture(seed)
+            for name in names or BENCHMARKS:
+                rng = random.Random(seed)
+                random.seed(seed)
+                func = BENCHMARKS[name](rng)
+                results[name] = measure(func, repeat, warmup)
+                db.session.rollback()
+                print_row(name, results[name])
+            for engine in db.engines.values():
+                engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'seed': seed,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def print_row(name, result, base=None):
+    line = (f"{name:<26} {result['median_us']:>12.2f} {result['stdev_us']:>10.2f} "
+            f"{result['min_us']:>12.2f} {result['p95_us']:>12.2f}")
+    if base is not None:
+        change = (result['median_us'] - base['median_us']) / base['median_us'] * 100
+        # Beyond three baseline standard deviations (and 5%) counts as a change
+        noise = max(3 * base['stdev_us'], 0.05 * base['median_us'])
+        flag = ''
+        if abs(result['median_us'] - base['median_us']) > noise:
+            flag = 'faster' if change < 0 else 'SLOWER'
+        line += f" {base['median_us']:>12.2f} {change:>+8.1f}% {flag}"
+    print(line)
+
+
+def print_comparison(report, baseline):
+    print(f"\n{'benchmark':<26} {'median us':>12} {'stdev us':>10} {'min us':>12} {'p95 us':>12} "
+          f"{'before us':>12} {'change':>9}")
+    for name, result in report['results'].items():
+        print_row(name, result, baseline['results'].get(name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='run only benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=15, help='timed samples per benchmark')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed samples per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare with')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.pattern or args.pattern in name]
+    print(f"{'benchmark':<26} {'median us':>12} {'stdev us':>10} {'min us':>12} {'p95 us':>12}")
+    report = run(names, args.repeat, args.warmup, args.seed)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            print_comparison(report, json.load(f))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Query plan benchmark - timetable hot queries before and after the index migration
+
+Builds a synthetic database (100k timetable rows by default), drops the
+migration-managed indexes to reproduce a pre-migration schema, records
+EXPLAIN QUERY PLAN output and timings for the hot queries, then runs the
+migrations and measures again. Timetable rows are generated without the
+denormalized faculty_id/course_id, which the migrations backfill.
+
+    python -m benchmarks.query_plans [--rows 100000] [--repeat 20] [--json out.json]
+"""
+import argparse
+import json
+import os
+
+from benchmarks.common import temp_app, seed_institution, seed_timetable, timed
+
+ROWS_PER_SECTION = 40
+
+# name -> (SQL, parameters); ids are filled in from the generated data
+HOT_QUERIES = {
+    'section_view': (
+        "SELECT * FROM timetable WHERE section_id = :section_id",
+        ('section_id',)
+    ),
+    'section_slot_batch': (
+        "SELECT id FROM timetable WHERE section_id = :section_id "
+        "AND timeslot_id = :timeslot_id AND batch_id IS NULL",
+        ('section_id', 'timeslot_id')
+    ),
+    'room_slot': (
+        "SELECT id FROM timetable WHERE room_id = :room_id AND timeslot_id = :timeslot_id",
+        ('room_id', 'timeslot_id')
+    ),
+    'faculty_slot': (
+        "SELECT timetable.id FROM timetable JOIN faculty_courses "
+        "ON timetable.faculty_course_id = faculty_courses.id "
+        "WHERE faculty_courses.faculty_id = :faculty_id AND timetable.timeslot_id = :timeslot_id",
+        ('faculty_id', 'timeslot_id')
+    ),
+    'faculty_timetable': (
+        "SELECT timetable.* FROM timetable JOIN faculty_courses "
+        "ON timetable.faculty_course_id = faculty_courses.id "
+        "WHERE faculty_courses.faculty_id = :faculty_id",
+        ('faculty_id',)
+    ),
+    'faculty_timetable_direct': (
+        "SELECT * FROM timetable WHERE faculty_id = :faculty_id",
+        ('faculty_id',)
+    ),
+    'section_mappings': (
+        "SELECT * FROM faculty_courses WHERE section_id = :section_id",
+        ('section_id',)
+    ),
+    'rooms_booked_at_slot': (
+        "SELECT room_id FROM timetable WHERE timeslot_id = :timeslot_id",
+        ('timeslot_id',)
+    ),
+}
+
+
+def drop_migrated_indexes():
+    """Return the schema to its pre-migration state (no secondary indexes)"""
+    from app import db
+    from app.models import Timetable, FacultyCourse
+    from app.migrations import schema_version
+
+    with db.engine.begin() as connection:
+        for table in (Timetable.__table__, FacultyCourse.__table__):
+            for index in table.indexes:
+                index.drop(connection, checkfirst=True)
+        connection.execute(schema_version.delete())
+
+
+def measure(params, repeat):
+    """Query plan and timing for every hot query"""
+    from app import db
+    from sqlalchemy import text
+
+    results = {}
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('ANALYZE')
+        for name, (sql, keys) in HOT_QUERIES.items():
+            bound = {key: params[key] for key in keys}
+            plan = [row[-1] for row in connection.execute(text('EXPLAIN QUERY PLAN ' + sql), bound)]
+            rows = len(connection.execute(text(sql), bound).all())
+            results[name] = {
+                'plan': plan,
+                'full_scan': any(step.startswith('SCAN') and 'INDEX' not in step for step in plan),
+                'rows': rows,
+                **timed(lambda: connection.execute(text(sql), bound).all(), repeat)
+            }
+    return results
+
+
+def run(rows=100000, repeat=20, db_path=None, keep=False):
+    """Build the dataset and measure before/after the migration"""
+    from app import db
+    from app.migrations import upgrade
+
+    app, db_path = temp_app(db_path)
+    try:
+        with app.app_context():
+            sizes = seed_institution(sections=max(1, rows // ROWS_PER_SECTION))
+            total = seed_timetable(sizes, per_section=ROWS_PER_SECTION, denormalize=False)
+
+            params = {
+                'section_id': sizes['sections'] // 2 or 1,
+                'timeslot_id': 10,
+                'room_id': sizes['rooms'] // 2 or 1,
+                'faculty_id': sizes['faculty'] // 2 or 1
+            }
+
+            drop_migrated_indexes()
+            before = measure(params, repeat)
+            applied = upgrade()
+            after = measure(params, repeat)
+            db.session.remove()
+    finally:
+        if not keep and os.path.exists(db_path):
+            os.remove(db_path)
+
+    return {
+        'timetable_rows': total,
+        'sizes': sizes,
+        'migrations_applied': [version for version, _ in applied],
+        'queries': {name: {'before': before[name], 'after': after[name]} for name in HOT_QUERIES}
+    }
+
+
+def print_report(report):
+    print(f"timetable rows: {report['timetable_rows']}  "
+          f"migrations applied: {report['migrations_applied']}")
+    print(f"{'query':<26} {'before ms':>10} {'after ms':>10} {'speedup':>8}  plan after")
+    for name, result in report['queries'].items():
+        before, after = result['before'], result['after']
+        speedup = before['median_ms'] / after['median_ms'] if after['median_ms'] else float('inf')
+        print(f"{name:<26} {before['median_ms']:>10.3f} {after['median_ms']:>10.3f} {speedup:>7.1f}x  "
+              f"{' / '.join(after['plan'])}")
+        if before['full_scan'] and not after['full_scan']:
+            print(f"{'':<26} was: {' / '.join(before['plan'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='timetable rows to generate')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    parser.add_argument('--db', help='database file to build (default: temp file)')
+    parser.add_argument('--keep', action='store_true', help='keep the database file')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.repeat, args.db, args.keep)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
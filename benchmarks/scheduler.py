@@ -0,0 +1,282 @@
+"""Scheduler benchmark - the solvers end to end on synthetic institutes
+
+For each scale a synthetic institute (benchmarks/instances.py) is built in
+a throwaway database. Each solver then schedules the first N sections in a
+fresh process, on its own copy of that database, so peak memory is the
+solver's own and no run sees another's timetables:
+
+    csp      CSPSolver backtracking
+    greedy   the HybridScheduler greedy fallback
+    ga       GeneticAlgorithm, seeded with the CSP solution (GA time only)
+    hybrid   HybridScheduler.generate, the full run including save/validate
+
+Solutions that are not saved (csp, greedy, ga) are scored with the same
+constraint checker as the GA. Reports wall time, GA fitness evaluations,
+hard and soft violations and peak RSS per scale and solver. `compare`
+flags regressions between two reports.
+
+    python -m benchmarks.scheduler run [--scale small --scale medium] [--sections 3] [--json out.json]
+    python -m benchmarks.scheduler compare base.json new.json [--tolerance 0.10]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from benchmarks.common import temp_app, open_app
+from benchmarks.instances import SCALES, instance_params, generate_instance
+
+SOLVERS = ('csp', 'greedy', 'ga', 'hybrid')
+
+# metric -> (better direction, absolute change below which it is noise)
+COMPARED = {
+    'wall_seconds': ('lower', 0.05),
+    'hard_violations': ('lower', 0),
+    'soft_violations': ('lower', 0),
+    'peak_rss_mb': ('lower', 5),
+    'succeeded': ('higher', 0),
+}
+
+
+def score(ga, chromosome):
+    """Hard and soft violations of a solution, by the GA's constraint checker"""
+    chromosome.calculate_fitness(ga.scoring, ga.penalties, ga.fitness_context)
+    return {'hard_violations': chromosome.hard_violations, 'soft_violations': chromosome.soft_violations}
+
+
+def solve_section(solver, section_id, ga_config):
+    """Run one solver on one section; returns its wall time and counters"""
+    from app.scheduler.csp_solver import CSPSolver
+    from app.scheduler.genetic_algorithm import GeneticAlgorithm, Chromosome
+    from app.scheduler.hybrid_scheduler import HybridScheduler
+
+    result = {'success': False}
+    if solver == 'csp':
+        start = time.perf_counter()
+        csp = CSPSolver(section_id)
+        solved = csp.solve()
+        entries = csp.get_solution() if solved else []
+        result['seconds'] = time.perf_counter() - start
+        result.update(success=solved, nodes=csp.nodes, backtracks=csp.backtracks)
+        if solved:
+            ga = GeneticAlgorithm(section_id, ga_config)
+            result.update(score(ga, ga._solution_to_chromosome(entries)))
+
+    elif solver == 'greedy':
+        start = time.perf_counter()
+        greedy = HybridScheduler(section_id)._greedy_schedule()
+        result['seconds'] = time.perf_counter() - start
+        result['success'] = greedy['success']
+        if greedy['success']:
+            genes = [(e['faculty_course_id'], e['timeslot_id'], e['room_id'], e['batch_id'])
+                     for e in greedy['entries']]
+            result.update(score(GeneticAlgorithm(section_id, ga_config), Chromosome(section_id, genes)))
+
+    elif solver == 'ga':
+        csp = CSPSolver(section_id)
+        if not csp.solve():
+            return {'success': False, 'seconds': 0.0}
+        initial = csp.get_solution()
+        start = time.perf_counter()
+        ga = GeneticAlgorithm(section_id, ga_config)
+        final = None
+        for final in ga.run(initial):
+            pass
+        result['seconds'] = time.perf_counter() - start
+        best = final['best_chromosome']
+        result.update(success=best.hard_violations == 0, generations=ga.generation,
+                      hard_violations=best.hard_violations, soft_violations=best.soft_violations,
+                      **{k: v for k, v in ga.stats().items() if k in ('evaluations', 'cache_hits')})
+
+    elif solver == 'hybrid':
+        start = time.perf_counter()
+        final = None
+        for final in HybridScheduler(section_id, dict(ga_config)).generate():
+            pass
+        result['seconds'] = time.perf_counter() - start
+        stats = final.get('stats') or {}
+        result.update(success=bool(final.get('success')),
+                      hard_violations=final.get('hard_violations'),
+                      soft_violations=final.get('soft_violations'),
+                      evaluations=(stats.get('ga') or {}).get('evaluations', 0),
+                      phases=stats.get('phases'))
+    return result
+
+
+def run_solver(db_path, solver, section_ids, ga_config, settings, seed):
+    """Worker process: one solver over the sections on a private copy of the instance"""
+    from app import db
+    from app.scheduler.stats import peak_rss_mb
+
+    copy_path = f"{db_path}.{solver}.db"
+    shutil.copyfile(db_path, copy_path)
+    try:
+        app = open_app(copy_path, **settings)
+        with app.app_context():
+            baseline = peak_rss_mb()
+            runs = []
+            for section_id in section_ids:
+                random.seed(seed + section_id)
+                runs.append(solve_section(solver, section_id, ga_config))
+                db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        return {'runs': runs, 'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(copy_path + suffix):
+                os.remove(copy_path + suffix)
+
+
+def summarize(scale, solver, outcome):
+    runs = outcome['runs']
+    seconds = [r['seconds'] for r in runs]
+    evaluations = sum(r.get('evaluations', 0) for r in runs)
+    ga_seconds = sum(r['phases'].get('ga', 0) for r in runs if r.get('phases')) or sum(seconds)
+    summary = {
+        'scale': scale,
+        'solver': solver,
+        'sections': len(runs),
+        'succeeded': sum(1 for r in runs if r['success']),
+        'wall_seconds': round(sum(seconds), 3),
+        'section_median_seconds': round(statistics.median(seconds), 3) if seconds else None,
+        'section_max_seconds': round(max(seconds), 3) if seconds else None,
+        'evaluations': evaluations,
+        'evaluations_per_second': round(evaluations / ga_seconds, 1) if evaluations and ga_seconds else None,
+        'hard_violations': sum(r.get('hard_violations') or 0 for r in runs),
+        'soft_violations': sum(r.get('soft_violations') or 0 for r in runs),
+        'baseline_rss_mb': outcome['baseline_rss_mb'],
+        'peak_rss_mb': outcome['peak_rss_mb']
+    }
+    if solver == 'csp':
+        summary['nodes'] = sum(r['nodes'] for r in runs)
+        summary['backtracks'] = sum(r['backtracks'] for r in runs)
+    return summary
+
+
+def run(scales=None, solvers=None, sections=3, population=20, generations=50,
+        time_limit=120, seed=0):
+    ga_config = {'population_size': population, 'max_generations': generations}
+    settings = {'GA_TIME_LIMIT_SECONDS': time_limit, 'JOB_WORKERS': 0}
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': seed,
+            'sections_per_scale': sections,
+            'ga_config': ga_config,
+            'time_limit_seconds': time_limit
+        },
+        'instances': {},
+        'results': []
+    }
+    context = multiprocessing.get_context('spawn')
+    print(HEADER)
+    for scale in scales or list(SCALES):
+        from app import db
+
+        app, db_path = temp_app(**settings)
+        try:
+            with app.app_context():
+                instance = generate_instance(**instance_params(scale, seed=seed))
+                for engine in db.engines.values():
+                    engine.dispose()
+            report['instances'][scale] = instance
+            section_ids = list(range(1, min(sections, instance['sections']) + 1))
+            for solver in solvers or SOLVERS:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    outcome = pool.submit(run_solver, db_path, solver, section_ids,
+                                          ga_config, settings, seed).result()
+                summary = summarize(scale, solver, outcome)
+                report['results'].append(summary)
+                print_row(summary)
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+    return report
+
+
+HEADER = (f"{'scale':<8} {'solver':<7} {'ok':>5} {'wall s':>8} {'med s':>7} {'evals':>7} "
+          f"{'evals/s':>8} {'hard':>5} {'soft':>5} {'rss MB':>7}")
+
+
+def print_row(r):
+    print(f"{r['scale']:<8} {r['solver']:<7} {r['succeeded']:>2}/{r['sections']:<2} {r['wall_seconds']:>8} "
+          f"{r['section_median_seconds']:>7} {r['evaluations']:>7} {r['evaluations_per_second'] or '-':>8} "
+          f"{r['hard_violations']:>5} {r['soft_violations']:>5} {r['peak_rss_mb'] or '-':>7}")
+
+
+def compare(base, new, tolerance=0.10):
+    """
+    Regressions of `new` against `base`: metrics that got worse by more
+    than `tolerance` (relative) and their noise floor. Returns a list of
+    (scale, solver, metric, base value, new value).
+    """
+    base_results = {(r['scale'], r['solver']): r for r in base['results']}
+    regressions = []
+    for r in new['results']:
+        b = base_results.get((r['scale'], r['solver']))
+        if b is None:
+            continue
+        for metric, (better, floor) in COMPARED.items():
+            old, value = b.get(metric), r.get(metric)
+            if old is None or value is None:
+                continue
+            change = value - old if better == 'lower' else old - value
+            if change > floor and change > abs(old) * tolerance:
+                regressions.append((r['scale'], r['solver'], metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark')
+    run_parser.add_argument('--scale', action='append', choices=sorted(SCALES), help='run only this scale')
+    run_parser.add_argument('--solver', action='append', choices=SOLVERS, help='run only this solver')
+    run_parser.add_argument('--sections', type=int, default=3, help='sections scheduled per scale')
+    run_parser.add_argument('--population', type=int, default=20, help='GA population size')
+    run_parser.add_argument('--generations', type=int, default=50, help='GA generations')
+    run_parser.add_argument('--time-limit', type=float, default=120, help='seconds per hybrid run')
+    run_parser.add_argument('--seed', type=int, default=0, help='instance and solver seed')
+    run_parser.add_argument('--json', help='also write the report to this file')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two reports')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--tolerance', type=float, default=0.10, help='relative change allowed')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run(args.scale, args.solver, args.sections, args.population, args.generations,
+                     args.time_limit, args.seed)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.tolerance)
+    for scale, solver, metric, old, value in regressions:
+        print(f"REGRESSION {scale}/{solver} {metric}: {old} -> {value}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,7 +28,51 @@ class Config:
     GA_MUTATION_RATE = 0.15
     GA_ELITISM_COUNT = 5
     GA_TOURNAMENT_SIZE = 5
+    # Wall-clock limit per generation run (CSP + GA); a run that hits it saves
+    # the best timetable found so far (see app/scheduler/cancellation.py)
     GA_TIME_LIMIT_SECONDS = 60
+    
+    # Scoring settings (see app/scheduler/scoring.py)
+    SCORING_WEIGHTS = {}  # violation type -> weight, e.g. {'schedule_gap': 5}
+    SCORING_TIME_OF_DAY = {}  # period -> penalty units for theory classes, e.g. {8: 1}
+    SCORING_SECTION_TIME_OF_DAY = {}  # section code -> {period: units}, overrides the above
+    SCORING_BASE_SCORE = 1000
+    SCORING_HARD_SCALE = 100
+    
+    # SQLite concurrency mode (see app/database.py): WAL journaling so reads
+    # and a generation's writes do not block each other, connection pragmas,
+    # and a separate pooled read-only engine for GET requests
+    SQLITE_WAL = True
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_READ_ENGINE = True
+    SQLITE_READ_POOL_SIZE = 10
+    
+    # Timetable generations kept per section, the active one included (see
+    # app/scheduler/generations.py); older ones are compacted away
+    GENERATION_RETENTION = 5
+    
+    # Background generation jobs (see app/jobs.py); JOB_WORKERS = 0 runs
+    # each job inline in the request that submits it. Progress is coalesced
+    # to JOB_PROGRESS_RATE events per second; idle streams get a heartbeat
+    # comment every SSE_HEARTBEAT_SECONDS and clients retry after SSE_RETRY_MS
+    JOB_WORKERS = 2
+    JOB_PROGRESS_RATE = 4
+    JOB_POLL_INTERVAL = 0.5
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_RETRY_MS = 3000
+    
+    # Per-request SQL tracing and N+1 detection (see app/sqltrace.py); a
+    # statement shape repeated SQL_TRACE_N_PLUS_ONE times in one request is
+    # reported as a likely N+1 pattern
+    SQL_TRACE = os.environ.get('SQL_TRACE', '').lower() in ('1', 'true', 'yes')
+    SQL_TRACE_N_PLUS_ONE = 5
+    
+    # Profiled generation runs (config "profile": true, see app/profiling.py)
+    # write their cProfile data and sampled stacks here
+    PROFILE_FOLDER = os.path.join(basedir, 'profiles')
+    PROFILE_SAMPLE_INTERVAL = 0.005
 
 
 class DevelopmentConfig(Config):
@@ -153,6 +153,109 @@ def create_sample_data(app):
         print("Created sample sections with batches")
 
 
+def generate_timetables(argv):
+    """Schedule sections without the web server (see app/batch.py); returns the exit code"""
+    import argparse
+    from app.database import is_sqlite_file
+    from app.batch import scratch_copy
+    
+    parser = argparse.ArgumentParser(
+        prog='run.py generate',
+        description='Generate timetables in parallel worker processes, without the web server. '
+                    'Exits 1 if any section has hard violations or no timetable.'
+    )
+    parser.add_argument('--all', action='store_true', help='every active section')
+    parser.add_argument('--semester', type=int, action='append', help='sections of this semester (repeatable)')
+    parser.add_argument('--section', action='append', help='section code or id (repeatable)')
+    parser.add_argument('--workers', type=int, help='worker processes (default JOB_WORKERS; 0 runs one section at a time here)')
+    parser.add_argument('--time-limit', type=float, help='seconds per section (default GA_TIME_LIMIT_SECONDS)')
+    parser.add_argument('--seed', type=int, help='base random seed, for repeatable runs')
+    parser.add_argument('--population', type=int, help='GA population size')
+    parser.add_argument('--generations', type=int, help='GA generations')
+    parser.add_argument('--no-ga', action='store_true', help='keep the CSP solution, skip GA optimization')
+    parser.add_argument('--config', help='more solver settings as JSON, or @file.json')
+    parser.add_argument('--dry-run', metavar='FILE', help='write the timetables to FILE instead of the database')
+    args = parser.parse_args(argv)
+    if not (args.all or args.semester or args.section):
+        parser.error('choose sections with --all, --semester or --section')
+    
+    config = {}
+    if args.config:
+        if args.config.startswith('@'):
+            with open(args.config[1:]) as f:
+                config = json.load(f)
+        else:
+            config = json.loads(args.config)
+    for key, value in (('time_limit_seconds', args.time_limit), ('population_size', args.population),
+                       ('max_generations', args.generations)):
+        if value is not None:
+            config[key] = value
+    if args.no_ga:
+        config['use_ga'] = False
+    
+    settings = {} if args.workers is None else {'JOB_WORKERS': args.workers}
+    if not args.dry_run:
+        return run_generation(create_app('default', settings), args, config)
+    
+    # Dry run: the same jobs against a throwaway copy of the database
+    with app.app_context():
+        url = db.engine.url
+    if not is_sqlite_file(str(url)):
+        print("A dry run needs a SQLite database.")
+        return 2
+    with scratch_copy(url.database) as path:
+        scratch = create_app('default', dict(settings, SQLALCHEMY_DATABASE_URI='sqlite:///' + path))
+        return run_generation(scratch, args, config, export_to=args.dry_run)
+
+
+def run_generation(batch_app, args, config, export_to=None):
+    """Run the batch on an app, print the summary and return the exit code"""
+    from app.batch import select_sections, partition_sections, run_batch, export_solutions
+    
+    with batch_app.app_context():
+        try:
+            sections = select_sections(args.all, args.semester, args.section)
+        except ValueError as e:
+            print(e)
+            return 2
+        if not sections:
+            print("No active sections selected.")
+            return 2
+        
+        workers = batch_app.config.get('JOB_WORKERS', 2)
+        partitions = partition_sections(sections)
+        print(f"Scheduling {len(sections)} sections in {len(partitions)} independent "
+              f"group{'s' if len(partitions) != 1 else ''} ({workers or 'no'} worker processes)...")
+        
+        def finished(job):
+            name = job.section.display_name if job.section else job.section_id
+            print(f"  {name}: {job.status} ({job.time_taken_seconds or 0:.1f}s)")
+        
+        results = run_batch(sections, config, args.seed, on_finish=finished, partitions=partitions)
+        
+        print()
+        print(f"{'Section':<24} {'Status':<10} {'Entries':>7} {'Hard':>5} {'Soft':>5} {'Score':>8} {'Time s':>7}  Generation")
+        for r in results:
+            score = f"{r['fitness_score']:.1f}" if r['fitness_score'] is not None else '-'
+            hard = r['hard_violations'] if r['hard_violations'] is not None else '-'
+            soft = r['soft_violations'] if r['soft_violations'] is not None else '-'
+            print(f"{r['section']:<24} {r['status']:<10} {r['entries']:>7} {hard:>5} {soft:>5} "
+                  f"{score:>8} {r['seconds'] or 0:>7.1f}  {r['generation_id']}")
+            if r['message']:
+                print(f"{'':<24} {r['message']}")
+        
+        if export_to:
+            export_solutions(results, export_to, {'config': config, 'seed': args.seed})
+            print(f"\nDry run: timetables written to {export_to}; the database is unchanged.")
+        for engine in db.engines.values():
+            engine.dispose()
+    
+    missing = sum(1 for r in results if not r['entries'])
+    hard = sum(r['hard_violations'] or 0 for r in results)
+    print(f"\n{len(results) - missing}/{len(results)} sections scheduled, {hard} hard violations.")
+    return 1 if missing or hard else 0
+
+
 # Create the application
 app = create_app()
 
@@ -176,6 +279,37 @@ if __name__ == '__main__':
         elif command == 'sample-data':
             create_sample_data(app)
             
+        elif command == 'migrate':
+            # Apply pending schema migrations (also done on every app start)
+            from app.migrations import upgrade, current_version
+            with app.app_context():
+                db.create_all()
+                for version, description in upgrade():
+                    print(f"Applied migration {version}: {description}")
+                print(f"Database schema is at version {current_version()}.")
+            
+        elif command == 'compact':
+            # Drop timetable generations beyond the retention limit
+            from app.scheduler.generations import compact
+            keep = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            with app.app_context():
+                removed = compact(keep=keep)
+                print(f"Removed {removed} timetable entries from old generations.")
+            
+        elif command == 'generate':
+            # Schedule sections in worker processes, without the web server
+            sys.exit(generate_timetables(sys.argv[2:]))
+            
+        elif command == 'stream':
+            # Serve job progress streams from an asyncio sidecar (needs uvicorn)
+            try:
+                import uvicorn
+            except ImportError:
+                print("The stream command needs uvicorn: pip install uvicorn")
+                sys.exit(1)
+            port = int(sys.argv[2]) if len(sys.argv) > 2 else 5001
+            uvicorn.run('app.streaming:create_asgi_app', factory=True, host='0.0.0.0', port=port)
+            
         elif command == 'reset':
             # Reset database
             with app.app_context():
@@ -186,7 +320,7 @@ if __name__ == '__main__':
             
         else:
             print(f"Unknown command: {command}")
-            print("Available commands: init, load-courses, sample-data, reset")
+            print("Available commands: init, load-courses, sample-data, migrate, compact, generate, stream, reset")
     else:
         # Run the development server
         print("""